@@ -0,0 +1,330 @@
+# apps/analytics/archive.py
+"""Archive-then-drop retention for the event store.
+
+Expired events are exported per tenant and UTC day into gzipped NDJSON
+segment files, one JSON object per event in id order. Each file is
+recorded as an EventArchiveSegment row (the manifest) once it is stored,
+and only then are its rows removed from AdEvent: in id chunks of
+ANALYTICS_ARCHIVE_DELETE_CHUNK with ANALYTICS_ARCHIVE_DELETE_PAUSE seconds
+between them, or, on a partitioned table, by dropping the expired day
+partitions. A segment stays `purged=False` until its rows are gone, so
+a run interrupted between upload and delete finishes the delete next
+time instead of exporting the rows twice.
+
+Files go to the Django storage alias named by ANALYTICS_ARCHIVE_STORAGE
+(e.g. a GCS bucket from STORAGES), or to ANALYTICS_ARCHIVE_DIR on the
+local filesystem when no alias is set. That location must survive
+restarts, so there is no fallback: with neither set, retention refuses
+to export or remove anything and logs why.
+
+aggregate_history() reads the segments back when a full replay needs
+events that are no longer in the table. The manifest records each
+aggregate's sequence range per segment (EventArchiveAggregate), so only
+the segments holding the aggregate's missing events are read; segments
+written before those were recorded are always read. A segment whose file
+is gone is logged and skipped, so the replay continues without those
+events instead of failing.
+
+With ANALYTICS_EVENT_ARCHIVE off, cleanup removes expired rows the same
+way without exporting them.
+"""
+import gzip
+import json
+import logging
+import tempfile
+import time
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from typing import Any, Dict, Iterator, List, Optional
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from apps.analytics.models import AdEvent, EventArchiveAggregate, EventArchiveSegment
+from apps.analytics.counters import discard_counters
+from apps.analytics.partitions import drop_expired_partitions, is_partitioned
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'analytics_adevent'
+FETCH_SIZE = 2000
+
+
+def archive_enabled() -> bool:
+    return getattr(settings, 'ANALYTICS_EVENT_ARCHIVE', True)
+
+
+def segment_events() -> int:
+    return getattr(settings, 'ANALYTICS_ARCHIVE_SEGMENT_EVENTS', 100000)
+
+
+def delete_chunk() -> int:
+    return getattr(settings, 'ANALYTICS_ARCHIVE_DELETE_CHUNK', 1000)
+
+
+def delete_pause() -> float:
+    return getattr(settings, 'ANALYTICS_ARCHIVE_DELETE_PAUSE', 0.05)
+
+
+def archive_storage():
+    """The configured archive storage, or None when no durable location is set"""
+    alias = getattr(settings, 'ANALYTICS_ARCHIVE_STORAGE', None)
+    if alias:
+        return storages[alias]
+    directory = getattr(settings, 'ANALYTICS_ARCHIVE_DIR', None)
+    if directory:
+        return FileSystemStorage(location=directory)
+    return None
+
+
+def _day(event: AdEvent):
+    return event.timestamp.astimezone(dt_timezone.utc).date()
+
+
+def _line(event: AdEvent) -> bytes:
+    return json.dumps({
+        'id': event.id,
+        'event_type': event.event_type,
+        'aggregate_id': event.aggregate_id,
+        'sequence_number': event.sequence_number,
+        'timestamp': event.timestamp.isoformat(),
+        'payload': dict(event.payload or {}),
+    }, cls=DjangoJSONEncoder, separators=(',', ':')).encode() + b'\n'
+
+
+class _SegmentWriter:
+    """Spools one segment to a temporary file until it is stored"""
+
+    def __init__(self, tenant_id: int, day, cutoff: datetime):
+        self.tenant_id, self.day, self.cutoff = tenant_id, day, cutoff
+        self.first_id = self.last_id = None
+        self.events = 0
+        self.aggregates = {}
+        self.file = tempfile.TemporaryFile()
+        self.gzip = gzip.GzipFile(fileobj=self.file, mode='wb')
+
+    def write(self, event: AdEvent):
+        self.gzip.write(_line(event))
+        self.first_id = self.first_id or event.id
+        self.last_id = event.id
+        self.events += 1
+        first, last, events = self.aggregates.get(event.aggregate_id, (event.sequence_number, 0, 0))
+        self.aggregates[event.aggregate_id] = (
+            min(first, event.sequence_number), max(last, event.sequence_number), events + 1
+        )
+
+    def store(self, storage) -> EventArchiveSegment:
+        self.gzip.close()
+        size = self.file.tell()
+        self.file.seek(0)
+        path = storage.save(
+            f'events/tenant_{self.tenant_id}/{self.day:%Y/%m/%d}/{self.first_id}-{self.last_id}.ndjson.gz',
+            File(self.file),
+        )
+        self.file.close()
+        with transaction.atomic():
+            segment = EventArchiveSegment.objects.create(
+                tenant_id=self.tenant_id, day=self.day, path=path, first_id=self.first_id, last_id=self.last_id,
+                events=self.events, size_bytes=size, cutoff=self.cutoff, aggregates_recorded=True,
+            )
+            EventArchiveAggregate.objects.bulk_create([
+                EventArchiveAggregate(segment=segment, tenant_id=self.tenant_id, aggregate_id=aggregate_id,
+                                      first_sequence=first, last_sequence=last, events=events)
+                for aggregate_id, (first, last, events) in self.aggregates.items()
+            ], batch_size=FETCH_SIZE)
+        return segment
+
+
+def export_segments(tenant_id: int, cutoff: datetime, storage=None) -> List[EventArchiveSegment]:
+    """Write the tenant's not yet archived events older than `cutoff` to segment files"""
+    storage = storage or archive_storage()
+    archived_up_to = EventArchiveSegment.objects.filter(tenant_id=tenant_id).order_by('-last_id').values_list(
+        'last_id', flat=True
+    ).first() or 0
+    expired = AdEvent.objects.filter(tenant_id=tenant_id, timestamp__lt=cutoff).order_by('id')
+    segments, writer, after = [], None, archived_up_to
+    limit = segment_events()
+    while True:
+        events = list(expired.filter(id__gt=after)[:FETCH_SIZE])
+        for event in events:
+            if writer and (writer.day != _day(event) or writer.events >= limit):
+                segments.append(writer.store(storage))
+                writer = None
+            writer = writer or _SegmentWriter(tenant_id, _day(event), cutoff)
+            writer.write(event)
+        if len(events) < FETCH_SIZE:
+            break
+        after = events[-1].id
+    if writer:
+        segments.append(writer.store(storage))
+    return segments
+
+
+def _delete_rows(rows, chunk_size: Optional[int] = None, pause: Optional[float] = None) -> int:
+    """Delete `rows` from AdEvent a small id chunk at a time"""
+    chunk_size = chunk_size or delete_chunk()
+    pause = delete_pause() if pause is None else pause
+    rows = rows.order_by('id')
+    deleted = 0
+    while True:
+        ids = list(rows.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        deleted += AdEvent.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def purge_segment(segment: EventArchiveSegment, chunk_size: Optional[int] = None,
+                  pause: Optional[float] = None) -> int:
+    """Delete the segment's rows from AdEvent"""
+    deleted = _delete_rows(AdEvent.objects.filter(
+        tenant_id=segment.tenant_id, id__gte=segment.first_id, id__lte=segment.last_id,
+        timestamp__lt=segment.cutoff,
+    ), chunk_size, pause)
+    segment.purged = True
+    segment.save(update_fields=['purged'])
+    return deleted
+
+
+def archive_expired_events(cutoff: datetime, tenant_id: Optional[int] = None,
+                           export: bool = True) -> Dict[str, Any]:
+    """Export events older than `cutoff` to segments, then remove them from AdEvent.
+
+    Without a tenant on a partitioned table the cutoff is moved back to
+    midnight UTC, so the archived rows are exactly the day partitions that
+    are then dropped; the partially expired day follows tomorrow. With
+    `export` off the rows are removed without writing segments.
+    """
+    storage = archive_storage() if export else None
+    if export and storage is None:
+        logger.error(
+            "Event retention skipped: set ANALYTICS_ARCHIVE_STORAGE or ANALYTICS_ARCHIVE_DIR to a durable "
+            "location, or turn ANALYTICS_EVENT_ARCHIVE off to delete expired events without archiving"
+        )
+        return {
+            'cutoff': cutoff.isoformat(), 'segments': 0, 'archived_events': 0, 'archived_bytes': 0,
+            'deleted_events': 0, 'dropped_partitions': [], 'skipped': 'no archive storage configured',
+        }
+
+    drop_partitions = tenant_id is None and is_partitioned(TABLE)
+    if drop_partitions:
+        cutoff = datetime.combine(cutoff.astimezone(dt_timezone.utc).date(), dt_time.min, tzinfo=dt_timezone.utc)
+
+    pending = EventArchiveSegment.objects.filter(purged=False)
+    expired = AdEvent.objects.filter(timestamp__lt=cutoff)
+    if tenant_id is not None:
+        pending, expired = pending.filter(tenant_id=tenant_id), expired.filter(tenant_id=tenant_id)
+    deleted = 0
+    if not drop_partitions:
+        # Left over from an interrupted run
+        for segment in pending.order_by('id'):
+            deleted += purge_segment(segment)
+
+    segments = []
+    tenants = sorted(set(expired.values_list('tenant_id', flat=True).distinct()))
+    for tenant in tenants:
+        if not export:
+            if not drop_partitions:
+                deleted += _delete_rows(expired.filter(tenant_id=tenant))
+            continue
+        for segment in export_segments(tenant, cutoff, storage):
+            segments.append(segment)
+            if not drop_partitions:
+                deleted += purge_segment(segment)
+
+    dropped = []
+    if drop_partitions:
+        retired = drop_expired_partitions(TABLE, cutoff)
+        dropped, deleted = retired['dropped'], retired['rows_estimate']
+        pending.filter(cutoff__lte=cutoff).update(purged=True)
+    for tenant in tenants:
+        discard_counters(tenant, cutoff)
+
+    if segments or deleted:
+        logger.info(f"Archived {len(segments)} event segments and removed {deleted} events older than {cutoff}")
+    return {
+        'cutoff': cutoff.isoformat(),
+        'segments': len(segments),
+        'archived_events': sum(segment.events for segment in segments),
+        'archived_bytes': sum(segment.size_bytes for segment in segments),
+        'deleted_events': deleted,
+        'dropped_partitions': dropped,
+        'skipped': None,
+    }
+
+
+def read_segment(segment: EventArchiveSegment, storage=None) -> Iterator[AdEvent]:
+    """The segment's events as unsaved AdEvent instances"""
+    storage = storage or archive_storage()
+    with storage.open(segment.path, 'rb') as handle, gzip.GzipFile(fileobj=handle) as lines:
+        for line in lines:
+            row = json.loads(line)
+            yield AdEvent(
+                id=row['id'], tenant_id=segment.tenant_id, event_type=row['event_type'],
+                aggregate_id=row['aggregate_id'], sequence_number=row['sequence_number'],
+                timestamp=datetime.fromisoformat(row['timestamp']), payload=row['payload'],
+            )
+
+
+def archived_events(tenant_id: int, aggregate_id, after_sequence: int = 0) -> Iterator[AdEvent]:
+    """The aggregate's archived events after `after_sequence`, segment by segment.
+
+    Only segments whose manifest has the aggregate past `after_sequence`
+    are read, plus any without recorded ranges; events are ordered by
+    sequence number within a segment, and segments follow each other in
+    id order.
+    """
+    aggregate_id, storage = str(aggregate_id), archive_storage()
+    holding = EventArchiveAggregate.objects.filter(
+        segment=OuterRef('pk'), aggregate_id=aggregate_id, last_sequence__gt=after_sequence
+    )
+    segments = EventArchiveSegment.objects.filter(tenant_id=tenant_id).filter(
+        Q(aggregates_recorded=False) | Exists(holding)
+    )
+    for segment in segments.order_by('first_id'):
+        try:
+            if storage is None:
+                raise FileNotFoundError('no archive storage configured')
+            events = [
+                event for event in read_segment(segment, storage)
+                if event.aggregate_id == aggregate_id and event.sequence_number > after_sequence
+            ]
+        except FileNotFoundError as e:
+            logger.error(
+                f"Archive segment {segment.path} of tenant {tenant_id} is unavailable ({str(e)}); "
+                f"aggregate {aggregate_id} is replayed without its events"
+            )
+            continue
+        yield from sorted(events, key=lambda event: event.sequence_number)
+
+
+def archived_through(tenant_id: int, aggregate_id) -> Optional[int]:
+    """Highest sequence number of the aggregate in the archive (0 if none).
+
+    None when the tenant has segments without recorded ranges, so it can't
+    be told which aggregates they hold.
+    """
+    if EventArchiveSegment.objects.filter(tenant_id=tenant_id, aggregates_recorded=False).exists():
+        return None
+    return EventArchiveAggregate.objects.filter(tenant_id=tenant_id, aggregate_id=str(aggregate_id)).aggregate(
+        last=Max('last_sequence')
+    )['last'] or 0
+
+
+def aggregate_history(tenant_id: int, aggregate_id, after_sequence: int = 0) -> Iterator[AdEvent]:
+    """The aggregate's events after `after_sequence`, from the archive where the table has a gap"""
+    live = AdEvent.objects.filter(
+        aggregate_id=str(aggregate_id), tenant_id=tenant_id, sequence_number__gt=after_sequence
+    ).order_by('sequence_number', 'timestamp')
+    first = live.values_list('sequence_number', flat=True).first()
+    if first != after_sequence + 1 and EventArchiveSegment.objects.filter(tenant_id=tenant_id).exists():
+        for event in archived_events(tenant_id, aggregate_id, after_sequence):
+            after_sequence = max(after_sequence, event.sequence_number)
+            yield event
+        live = live.filter(sequence_number__gt=after_sequence)
+    yield from live.iterator(chunk_size=FETCH_SIZE)
@@ -0,0 +1,210 @@
+# apps/analytics/attribution.py
+"""Incremental multi-touch attribution.
+
+Conversions are folded a window at a time behind their own watermark. For
+every converting user the impressions inside the lookback window are read
+once, in time order, and each registered model spreads the conversion
+over those touches. Credit is added to AttributionDaily per (model,
+campaign, conversion day), so a GET only reads the aggregate.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Callable, Dict, List, Optional
+from django.conf import settings
+from django.db import transaction
+from apps.analytics.models import AttributionDaily, RollupWatermark
+from .repositories.connection import optimized_analytics_cursor
+from .repositories.query_builder import TimeWindow
+from .rollups import advance_watermark, from_db, get_watermark, to_db
+
+ATTRIBUTION_NAME = 'attribution'
+LOOKBACK_DAYS = getattr(settings, 'ANALYTICS_ATTRIBUTION_LOOKBACK_DAYS', 30)
+HALF_LIFE_DAYS = getattr(settings, 'ANALYTICS_ATTRIBUTION_HALF_LIFE_DAYS', 7)
+DEFAULT_MODEL = getattr(settings, 'ANALYTICS_ATTRIBUTION_DEFAULT_MODEL', 'position_based')
+USER_BATCH_SIZE = 1000
+
+ATTRIBUTION_MODELS: Dict[str, Callable[[List[datetime], datetime], List[float]]] = {}
+
+
+def register_model(name: str):
+    """Register `func(touch_times, conversion_time) -> weights`; weights must sum to 1"""
+    def decorator(func):
+        ATTRIBUTION_MODELS[name] = func
+        return func
+    return decorator
+
+
+@register_model('first_touch')
+def first_touch(touch_times, conversion_time):
+    return [1.0] + [0.0] * (len(touch_times) - 1)
+
+
+@register_model('last_touch')
+def last_touch(touch_times, conversion_time):
+    return [0.0] * (len(touch_times) - 1) + [1.0]
+
+
+@register_model('linear')
+def linear(touch_times, conversion_time):
+    return [1.0 / len(touch_times)] * len(touch_times)
+
+
+@register_model('time_decay')
+def time_decay(touch_times, conversion_time):
+    half_life = HALF_LIFE_DAYS * 86400
+    raw = [math.pow(2, -(conversion_time - t).total_seconds() / half_life) for t in touch_times]
+    total = sum(raw)
+    return [w / total for w in raw]
+
+
+@register_model('position_based')
+def position_based(touch_times, conversion_time):
+    """40% to the first and last touch each, the remaining 20% spread over the middle"""
+    n = len(touch_times)
+    if n <= 2:
+        return [1.0 / n] * n
+    middle = 0.2 / (n - 2)
+    return [0.4] + [middle] * (n - 2) + [0.4]
+
+
+def _attribute_user(touches, conversions, lookback: timedelta, credits):
+    """Credit one user's conversions to touches; both lists are sorted by time"""
+    left = right = 0
+    for conversion_time, value in conversions:
+        while right < len(touches) and touches[right][0] <= conversion_time:
+            right += 1
+        while left < right and touches[left][0] < conversion_time - lookback:
+            left += 1
+        window = touches[left:right]
+        if not window:
+            continue
+
+        touch_times = [t for t, _ in window]
+        journey_days = (conversion_time - touch_times[0]).total_seconds() / 86400
+        day = conversion_time.date()
+        for name, model in ATTRIBUTION_MODELS.items():
+            for (_, campaign_id), weight in zip(window, model(touch_times, conversion_time)):
+                if not weight:
+                    continue
+                credit = credits[(name, campaign_id, day)]
+                credit[0] += weight
+                credit[1] += weight * float(value)
+                credit[2] += 1
+                credit[3] += weight * journey_days
+
+
+def _fold_attribution_window(cursor, tenant_id: int, start: datetime, end: datetime):
+    """Attribute the conversions of [start, end) and add them to AttributionDaily"""
+    cursor.execute("""
+        SELECT ie.user_id, cv.timestamp, cv.conversion_value
+        FROM events_conversionevent cv
+        JOIN events_clickevent cc ON cv.click_id = cc.id
+        JOIN events_impressionevent ie ON cc.impression_id = ie.id
+        WHERE cv.tenant_id = %s
+        AND cv.timestamp >= %s AND cv.timestamp < %s
+        ORDER BY ie.user_id, cv.timestamp
+    """, [tenant_id, to_db(start), to_db(end)])
+    conversions = {
+        user_id: [(from_db(ts), value) for _, ts, value in rows]
+        for user_id, rows in groupby(cursor.fetchall(), key=lambda row: row[0])
+    }
+    if not conversions:
+        return
+
+    lookback = timedelta(days=LOOKBACK_DAYS)
+    credits = defaultdict(lambda: [0.0, 0.0, 0, 0.0])
+    users = sorted(conversions)
+    for i in range(0, len(users), USER_BATCH_SIZE):
+        batch = users[i:i + USER_BATCH_SIZE]
+        cursor.execute(f"""
+            SELECT ci.user_id, ci.timestamp, ad.campaign_id
+            FROM campaigns_impression ci
+            JOIN campaigns_ad ad ON ci.ad_id = ad.id
+            WHERE ci.tenant_id = %s
+            AND ci.user_id IN ({', '.join(['%s'] * len(batch))})
+            AND ci.timestamp >= %s AND ci.timestamp < %s
+            ORDER BY ci.user_id, ci.timestamp
+        """, [tenant_id] + batch + [to_db(start - lookback), to_db(end)])
+        for user_id, rows in groupby(cursor.fetchall(), key=lambda row: row[0]):
+            touches = [(from_db(ts), campaign_id) for _, ts, campaign_id in rows]
+            _attribute_user(touches, conversions[user_id], lookback, credits)
+
+    if credits:
+        cursor.executemany("""
+            INSERT INTO analytics_attributiondaily
+                (tenant_id, model, campaign_id, date, conversions, revenue, touches, journey_days)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                conversions = conversions + VALUES(conversions),
+                revenue = revenue + VALUES(revenue),
+                touches = touches + VALUES(touches),
+                journey_days = journey_days + VALUES(journey_days)
+        """, [
+            (tenant_id, name, campaign_id, day,
+             round(conversions_, 6), round(revenue, 4), touches, round(journey_days, 6))
+            for (name, campaign_id, day), (conversions_, revenue, touches, journey_days) in credits.items()
+        ])
+
+
+def refresh_attribution(tenant_id: int, until: Optional[datetime] = None, progress=None):
+    """Attribute conversions past the attribution watermark.
+
+    Credit is added, not recomputed, so a window can't be re-run in place;
+    use reset_attribution and rebuild after changing models or lookback.
+    Overlapping refreshes are safe: advance_watermark folds each window
+    under the watermark's row lock, so no conversion is credited twice.
+    """
+    return advance_watermark(
+        tenant_id, ATTRIBUTION_NAME, _fold_attribution_window, until=until, progress=progress
+    )
+
+
+def reset_attribution(tenant_id: int):
+    with transaction.atomic():
+        AttributionDaily.objects.filter(tenant_id=tenant_id).delete()
+        RollupWatermark.objects.filter(tenant_id=tenant_id, name=ATTRIBUTION_NAME).delete()
+
+
+class AttributionRepository:
+    """Attribution reads over the precomputed AttributionDaily table"""
+
+    @staticmethod
+    def is_ready(tenant_id: int) -> bool:
+        return get_watermark(tenant_id, ATTRIBUTION_NAME) is not None
+
+    @staticmethod
+    def attribution_analysis_query(tenant_id: int, campaign_id=None, model: str = None,
+                                   days_back: Optional[int] = None):
+        sql = """
+        SELECT
+            campaign_id,
+            model,
+            SUM(conversions) as attributed_conversions,
+            SUM(revenue) as attributed_revenue,
+            ROUND(SUM(journey_days) / NULLIF(SUM(conversions), 0), 2) as avg_journey_days,
+            CAST(SUM(touches) AS SIGNED) as touches
+        FROM analytics_attributiondaily
+        WHERE tenant_id = %s AND model = %s
+        """
+        params = [tenant_id, model or DEFAULT_MODEL]
+        if campaign_id:
+            sql += " AND campaign_id = %s"
+            params.append(campaign_id)
+        if days_back:
+            sql += " AND date >= %s"
+            params.append(TimeWindow.last_n_days(days_back).first_date)
+        sql += """
+        GROUP BY campaign_id, model
+        ORDER BY attributed_revenue DESC
+        """
+        return sql, params
+
+    @staticmethod
+    def attribution_analysis(tenant_id: int, campaign_id=None, model: str = None,
+                             days_back: Optional[int] = None):
+        sql, params = AttributionRepository.attribution_analysis_query(tenant_id, campaign_id, model, days_back)
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
@@ -0,0 +1,250 @@
+# apps/analytics/codec.py
+"""Compact binary encoding of AdEvent payloads.
+
+The first byte of an encoded payload names its layout:
+
+    0x00        compact JSON, for payloads no schema fits
+    0x01..0x7a  a struct-packed schema version from SCHEMAS
+    0x7b ('{')  a legacy JSON document written before this codec
+
+Schemas are chosen by the payload's key set, so the payloads written by
+the record_*_event helpers and the batch ingest endpoint pack into a few
+dozen bytes: integers as int64, decimal strings as mantissa and exponent,
+ISO timestamps as UTC microseconds plus the offset. A payload is only
+packed if it unpacks to an equal dict, so encoding never changes what a
+consumer reads back. New layouts get a new schema id; existing ids are
+never redefined, since rows keep the id they were written with.
+"""
+import json
+import struct
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional
+from django.db import connection, models
+
+JSON_TAG = 0x00
+LEGACY_JSON_TAG = ord('{')
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+EPOCH_NAIVE = datetime(1970, 1, 1)
+NAIVE = -0x8000
+
+FIELD_FORMATS = {'int': 'q', 'decimal': 'qb', 'timestamp': 'qh'}
+_OFFSET_SUFFIXES = {}
+_last_second = (None, None)
+
+
+class PayloadSchema:
+    """A fixed field layout; None values are flagged in a presence byte"""
+
+    def __init__(self, schema_id: int, fields):
+        self.schema_id = schema_id
+        self.fields = fields
+        self.keys = frozenset(name for name, _ in fields)
+        self._structs = {}
+
+    def pack(self, payload: Dict[str, Any]) -> bytes:
+        present, values, formats = 0, [], '<BB'
+        for position, (name, kind) in enumerate(self.fields):
+            value = payload[name]
+            if value is None:
+                continue
+            present |= 1 << position
+            formats += FIELD_FORMATS[kind]
+            values.extend(PACKERS[kind](value))
+        return struct.pack(formats, self.schema_id, present, *values)
+
+    def _struct(self, present: int) -> struct.Struct:
+        compiled = self._structs.get(present)
+        if compiled is None:
+            compiled = self._structs[present] = struct.Struct('<' + ''.join(
+                FIELD_FORMATS[kind] for position, (_, kind) in enumerate(self.fields) if present & (1 << position)
+            ))
+        return compiled
+
+    def unpack(self, data: bytes) -> Dict[str, Any]:
+        present = data[1]
+        values = iter(self._struct(present).unpack_from(data, 2))
+        payload = {}
+        for position, (name, kind) in enumerate(self.fields):
+            payload[name] = UNPACKERS[kind](values) if present & (1 << position) else None
+        return payload
+
+
+def _pack_int(value):
+    if type(value) is not int:
+        raise TypeError(value)
+    return (value,)
+
+
+def _pack_decimal(value):
+    # Only strings that read back identically, e.g. '0.50' but not '.5'
+    if not isinstance(value, str) or str(Decimal(value)) != value:
+        raise ValueError(value)
+    sign, digits, exponent = Decimal(value).as_tuple()
+    mantissa = int(''.join(map(str, digits)))
+    return (-mantissa if sign else mantissa, exponent)
+
+
+def _pack_timestamp(value):
+    if not isinstance(value, str):
+        raise TypeError(value)
+    moment = datetime.fromisoformat(value)
+    if moment.isoformat() != value:
+        raise ValueError(value)
+    offset = moment.utcoffset()
+    if offset is None:
+        return ((moment.replace(tzinfo=dt_timezone.utc) - EPOCH) // timedelta(microseconds=1), NAIVE)
+    return ((moment - EPOCH) // timedelta(microseconds=1), int(offset.total_seconds() // 60))
+
+
+def _unpack_decimal(values):
+    mantissa, exponent = next(values), next(values)
+    return str(Decimal(mantissa).scaleb(exponent))
+
+
+def _offset_suffix(minutes: int) -> str:
+    suffix = _OFFSET_SUFFIXES.get(minutes)
+    if suffix is None:
+        zone = dt_timezone(timedelta(minutes=minutes))
+        suffix = _OFFSET_SUFFIXES[minutes] = datetime(2000, 1, 1, tzinfo=zone).isoformat()[19:]
+    return suffix
+
+
+def _local_isoformat(micros: int) -> str:
+    # Events replay in time order, so consecutive timestamps mostly share a second
+    global _last_second
+    second, micro = divmod(micros, 1000000)
+    cached = _last_second
+    if cached[0] != second:
+        cached = _last_second = (second, (EPOCH_NAIVE + timedelta(seconds=second)).isoformat())
+    return f'{cached[1]}.{micro:06d}' if micro else cached[1]
+
+
+def _unpack_timestamp(values):
+    micros, offset = next(values), next(values)
+    if offset == NAIVE:
+        return _local_isoformat(micros)
+    return _local_isoformat(micros + offset * 60000000) + _offset_suffix(offset)
+
+
+PACKERS = {'int': _pack_int, 'decimal': _pack_decimal, 'timestamp': _pack_timestamp}
+UNPACKERS = {'int': lambda values: next(values), 'decimal': _unpack_decimal, 'timestamp': _unpack_timestamp}
+
+SCHEMAS = {
+    schema.schema_id: schema for schema in (
+        # impression_created
+        PayloadSchema(1, [('campaign_id', 'int'), ('ad_id', 'int'), ('user_id', 'int'),
+                          ('cost', 'decimal'), ('timestamp', 'timestamp')]),
+        # click_registered
+        PayloadSchema(2, [('campaign_id', 'int'), ('ad_id', 'int'), ('user_id', 'int'),
+                          ('impression_id', 'int'), ('timestamp', 'timestamp')]),
+        # conversion_tracked
+        PayloadSchema(3, [('campaign_id', 'int'), ('user_id', 'int'),
+                          ('conversion_value', 'decimal'), ('timestamp', 'timestamp')]),
+    )
+}
+SCHEMAS_BY_KEYS = {schema.keys: schema for schema in SCHEMAS.values()}
+
+
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    schema = SCHEMAS_BY_KEYS.get(frozenset(payload))
+    if schema is not None:
+        try:
+            data = schema.pack(payload)
+            if schema.unpack(data) == payload:
+                return data
+        except (TypeError, ValueError, InvalidOperation, struct.error):
+            pass
+    return bytes([JSON_TAG]) + json.dumps(payload, separators=(',', ':')).encode()
+
+
+def decode_payload(data: bytes) -> Dict[str, Any]:
+    tag = data[0]
+    if tag == LEGACY_JSON_TAG:
+        return json.loads(data)
+    if tag == JSON_TAG:
+        return json.loads(data[1:])
+    return SCHEMAS[tag].unpack(data)
+
+
+def is_legacy(data: bytes) -> bool:
+    return bool(data) and data[0] == LEGACY_JSON_TAG
+
+
+class LazyPayload(Mapping):
+    """Read-only payload that decodes its bytes on first access"""
+    __slots__ = ('data', '_payload')
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._payload: Optional[Dict[str, Any]] = None
+
+    def _decoded(self) -> Dict[str, Any]:
+        if self._payload is None:
+            self._payload = decode_payload(self.data)
+        return self._payload
+
+    def __getitem__(self, key):
+        return self._decoded()[key]
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def __len__(self):
+        return len(self._decoded())
+
+    def __repr__(self):
+        return f'LazyPayload({self._decoded()!r})'
+
+
+class EventPayloadField(models.BinaryField):
+    """Stores dicts through encode_payload and reads them back as LazyPayload"""
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        # SQLite hands back rows copied from the old JSON column as text
+        return LazyPayload(value.encode() if isinstance(value, str) else bytes(value))
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Mapping):
+            return value
+        if isinstance(value, str):
+            return json.loads(value)
+        return LazyPayload(bytes(value))
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, LazyPayload):
+            return value.data
+        return encode_payload(dict(value))
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return None if value is None else json.dumps(dict(value))
+
+
+def reencode_legacy_payloads(batch_size: int = 5000, progress=None) -> int:
+    """Rewrite legacy JSON payloads in the encoded form, walking AdEvent by id"""
+    from apps.analytics.models import AdEvent
+
+    last_id, rewritten = 0, 0
+    while True:
+        rows = list(
+            AdEvent.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'payload')[:batch_size]
+        )
+        if not rows:
+            return rewritten
+        last_id = rows[-1][0]
+        updates = [
+            (encode_payload(dict(payload)), event_id)
+            for event_id, payload in rows if payload is not None and is_legacy(payload.data)
+        ]
+        if updates:
+            with connection.cursor() as cursor:
+                cursor.executemany("UPDATE analytics_adevent SET payload = %s WHERE id = %s", updates)
+            rewritten += len(updates)
+        if progress:
+            progress(last_id, rewritten)
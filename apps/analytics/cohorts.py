@@ -0,0 +1,159 @@
+# apps/analytics/cohorts.py
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from django.db import transaction
+from apps.analytics.models import UserFirstSeen, CohortCell, RollupWatermark
+from .repositories.connection import optimized_analytics_cursor
+from .repositories.query_builder import TimeWindow
+from .rollups import advance_watermark, get_watermark, to_db
+
+COHORT_NAME = 'cohorts'
+MAX_PERIOD_DAYS = 30
+
+
+def _fold_cohort_window(cursor, tenant_id: int, start: datetime, end: datetime):
+    """Add the activity of [start, end) to the cohort matrix.
+
+    Windows never cross midnight and are folded in time order, so a user's
+    activity on a day is new exactly when that day is after the user's
+    `last_active`. Only the cells touched by this window are updated.
+    """
+    window = [to_db(start), to_db(end)]
+
+    cursor.execute("""
+        INSERT IGNORE INTO analytics_userfirstseen (tenant_id, user_id, first_seen, last_active)
+        SELECT %s, user_id, DATE(MIN(timestamp)), NULL
+        FROM campaigns_impression
+        WHERE tenant_id = %s
+        AND timestamp >= %s AND timestamp < %s
+        GROUP BY user_id
+    """, [tenant_id, tenant_id] + window)
+
+    cursor.execute("""
+        INSERT INTO analytics_cohortcell
+            (tenant_id, cohort_date, period_days, active_users, impressions, spend)
+        SELECT
+            %s,
+            u.first_seen,
+            DATEDIFF(a.day, u.first_seen) as period_days,
+            SUM(u.last_active IS NULL OR a.day > u.last_active),
+            SUM(a.impressions),
+            SUM(a.spend)
+        FROM (
+            SELECT user_id, DATE(timestamp) as day, COUNT(*) as impressions, SUM(cost) as spend
+            FROM campaigns_impression
+            WHERE tenant_id = %s
+            AND timestamp >= %s AND timestamp < %s
+            GROUP BY user_id, DATE(timestamp)
+        ) a
+        JOIN analytics_userfirstseen u ON u.tenant_id = %s AND u.user_id = a.user_id
+        WHERE DATEDIFF(a.day, u.first_seen) BETWEEN 0 AND %s
+        GROUP BY u.first_seen, period_days
+        ON DUPLICATE KEY UPDATE
+            active_users = active_users + VALUES(active_users),
+            impressions = impressions + VALUES(impressions),
+            spend = spend + VALUES(spend)
+    """, [tenant_id, tenant_id] + window + [tenant_id, MAX_PERIOD_DAYS])
+
+    cursor.execute("""
+        UPDATE analytics_userfirstseen u
+        JOIN (
+            SELECT user_id, MAX(DATE(timestamp)) as day
+            FROM campaigns_impression
+            WHERE tenant_id = %s
+            AND timestamp >= %s AND timestamp < %s
+            GROUP BY user_id
+        ) a ON a.user_id = u.user_id
+        SET u.last_active = a.day
+        WHERE u.tenant_id = %s
+    """, [tenant_id] + window + [tenant_id])
+
+
+def refresh_cohorts(tenant_id: int, until: Optional[datetime] = None, progress=None) -> Dict[str, Any]:
+    """Fold impressions past the cohort watermark into the matrix.
+
+    Cells are incremented, not recomputed, so unlike the rollups a window
+    can't be re-run in place; use reset_cohorts and rebuild instead.
+    """
+    return advance_watermark(
+        tenant_id, COHORT_NAME, _fold_cohort_window, until=until, progress=progress
+    )
+
+
+def reset_cohorts(tenant_id: int):
+    with transaction.atomic():
+        UserFirstSeen.objects.filter(tenant_id=tenant_id).delete()
+        CohortCell.objects.filter(tenant_id=tenant_id).delete()
+        RollupWatermark.objects.filter(tenant_id=tenant_id, name=COHORT_NAME).delete()
+
+
+class CohortRepository:
+    """Cohort queries over the precomputed matrix.
+
+    The matrix covers impressions before the cohort watermark; rows come
+    back in the shape of the matching AnalyticsRepository method.
+    """
+
+    @staticmethod
+    def is_ready(tenant_id: int) -> bool:
+        return get_watermark(tenant_id, COHORT_NAME) is not None
+
+    @staticmethod
+    def cohort_analysis_query(tenant_id):
+        sql = """
+        SELECT
+            cohort_date as cohort_month,
+            period_days,
+            active_users as users,
+            impressions as total_impressions,
+            ROUND(active_users * 100.0 /
+                  FIRST_VALUE(active_users) OVER (
+                      PARTITION BY cohort_date ORDER BY period_days
+                  ), 2) as retention_rate
+        FROM analytics_cohortcell
+        WHERE tenant_id = %s AND active_users > 0
+        ORDER BY cohort_month, period_days
+        """
+        return sql, [tenant_id]
+
+    @staticmethod
+    def cohort_analysis(tenant_id):
+        sql, params = CohortRepository.cohort_analysis_query(tenant_id)
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    @staticmethod
+    def advanced_cohort_analysis(tenant_id: int, days_back: int = 30) -> List[Dict]:
+        sql = """
+        WITH cohort_metrics AS (
+            SELECT
+                cohort_date as cohort_month,
+                period_days,
+                active_users,
+                impressions as total_impressions,
+                spend as cohort_spend,
+                FIRST_VALUE(active_users) OVER (
+                    PARTITION BY cohort_date ORDER BY period_days
+                ) as cohort_size
+            FROM analytics_cohortcell
+            WHERE tenant_id = %s
+            AND cohort_date >= %s
+            AND active_users > 0
+        )
+        SELECT
+            cohort_month,
+            period_days,
+            active_users,
+            total_impressions,
+            cohort_spend,
+            cohort_size,
+            ROUND(active_users * 100.0 / cohort_size, 2) as retention_rate,
+            ROUND(cohort_spend / active_users, 4) as revenue_per_user
+        FROM cohort_metrics
+        ORDER BY cohort_month, period_days
+        """
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(sql, [tenant_id, TimeWindow.last_n_days(days_back).first_date])
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,301 @@
+# apps/analytics/columnar.py
+"""Columnar impression snapshots and an in-process engine over them.
+
+A snapshot is one typed .npy file per column plus a manifest, written by
+the snapshot_impressions command. The engine memory-maps the columns and
+answers the all-time dashboard queries with vectorized group-bys, in the
+row shapes of the matching AnalyticsRepository methods. A snapshot is
+fresh while the tenant data version it was taken at is still current,
+i.e. nothing has been ingested since.
+"""
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from apps.campaigns.models import Campaign
+from .repositories.cached import get_tenant_version
+from .repositories.streaming import streaming_cursor, EXPORT_CHUNK_SIZE
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+# (name, SQL expression); all columns are int64, cost in 1/10000 units
+COLUMNS = [
+    ('ts', "TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', ci.timestamp)"),
+    ('campaign_id', 'ad.campaign_id'),
+    ('ad_id', 'ci.ad_id'),
+    ('user_id', 'ci.user_id'),
+    ('cost', 'CAST(ci.cost * 10000 AS SIGNED)'),
+]
+COST_SCALE = 10000
+SECONDS_PER_DAY = 86400
+EPOCH = date(1970, 1, 1)
+MAX_PERIOD_DAYS = 30
+
+
+def snapshot_dir() -> Path:
+    return Path(getattr(settings, 'ANALYTICS_SNAPSHOT_DIR',
+                        os.path.join(tempfile.gettempdir(), 'analytics_snapshots')))
+
+
+def snapshot_path(tenant_id: int) -> Path:
+    return snapshot_dir() / f'tenant_{tenant_id}'
+
+
+def read_manifest(tenant_id: int) -> Optional[Dict[str, Any]]:
+    try:
+        with open(snapshot_path(tenant_id) / 'manifest.json') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_snapshot(tenant_id: int, chunk_size: Optional[int] = None, progress=None) -> Dict[str, Any]:
+    """Dump the tenant's impressions into column files, replacing any previous snapshot.
+
+    The tenant version is read before scanning, so anything ingested while
+    the snapshot is written leaves it stale rather than silently incomplete.
+    """
+    if np is None:
+        raise RuntimeError('Columnar snapshots require NumPy')
+
+    version = get_tenant_version(tenant_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*), MAX(id) FROM campaigns_impression WHERE tenant_id = %s",
+            [tenant_id]
+        )
+        count, max_id = cursor.fetchone()
+    campaigns = dict(Campaign.objects.filter(tenant_id=tenant_id).values_list('id', 'name'))
+
+    target = snapshot_path(tenant_id)
+    staging = target.with_name(f'{target.name}.tmp-{os.getpid()}')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    columns = {
+        name: np.lib.format.open_memmap(staging / f'{name}.npy', mode='w+', dtype=np.int64, shape=(count,))
+        for name, _ in COLUMNS
+    }
+    rows = 0
+    if count:
+        sql = f"""
+            SELECT {', '.join(expression for _, expression in COLUMNS)}
+            FROM campaigns_impression ci
+            JOIN campaigns_ad ad ON ci.ad_id = ad.id
+            WHERE ci.tenant_id = %s AND ci.id <= %s
+        """
+        with streaming_cursor() as cursor:
+            cursor.execute(sql, [tenant_id, max_id])
+            while rows < count:
+                chunk = cursor.fetchmany(chunk_size or EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                block = np.asarray(chunk, dtype=np.int64)[:count - rows]
+                for i, (name, _) in enumerate(COLUMNS):
+                    columns[name][rows:rows + len(block)] = block[:, i]
+                rows += len(block)
+                if progress:
+                    progress(rows, count)
+            # Drain anything past `count` so the connection is usable again
+            while cursor.fetchmany(chunk_size or EXPORT_CHUNK_SIZE):
+                pass
+
+    for column in columns.values():
+        column.flush()
+    del columns
+
+    manifest = {
+        'tenant_id': tenant_id,
+        'rows': rows,
+        'version': version,
+        'created_at': timezone.now().isoformat(),
+        'campaigns': {str(campaign_id): name for campaign_id, name in campaigns.items()},
+    }
+    with open(staging / 'manifest.json', 'w') as f:
+        json.dump(manifest, f)
+
+    # Open memory maps keep reading the replaced files until they are closed
+    retired = target.with_name(f'{target.name}.old-{os.getpid()}')
+    if target.exists():
+        target.rename(retired)
+    staging.rename(target)
+    shutil.rmtree(retired, ignore_errors=True)
+    return manifest
+
+
+def _to_date(day) -> date:
+    return EPOCH + timedelta(days=int(day))
+
+
+def _money(units) -> Decimal:
+    return (Decimal(int(units)) / COST_SCALE).quantize(Decimal('0.0001'))
+
+
+def _ratio(numerator, denominator, places: str) -> Optional[Decimal]:
+    if not denominator:
+        return None
+    return (Decimal(int(numerator)) / Decimal(int(denominator))).quantize(Decimal(places), ROUND_HALF_UP)
+
+
+def _sorted_unique(values):
+    """np.unique via sort + diff, which stays fast on large int64 columns"""
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]] if len(values) else values
+
+
+def _distinct_per_group(group_ids, user_ids, groups: int):
+    """COUNT(DISTINCT user_id) per group"""
+    _, users = np.unique(user_ids, return_inverse=True)
+    radix = int(users.max()) + 1
+    pairs = _sorted_unique(group_ids.astype(np.int64) * radix + users)
+    return np.bincount(pairs // radix, minlength=groups)
+
+
+class ColumnarEngine:
+    """Vectorized twins of the all-time AnalyticsRepository queries"""
+
+    def __init__(self, tenant_id: int, manifest: Dict[str, Any]):
+        self.tenant_id = tenant_id
+        self.manifest = manifest
+        self.campaigns = {int(campaign_id): name for campaign_id, name in manifest['campaigns'].items()}
+        rows = manifest['rows']
+        path = snapshot_path(tenant_id)
+        # An empty column can't be memory-mapped
+        self.columns = {
+            name: np.load(path / f'{name}.npy', mmap_mode='r' if rows else None)[:rows]
+            for name, _ in COLUMNS
+        }
+
+    @classmethod
+    def load(cls, tenant_id: int) -> Optional['ColumnarEngine']:
+        if np is None:
+            return None
+        manifest = read_manifest(tenant_id)
+        return cls(tenant_id, manifest) if manifest else None
+
+    @classmethod
+    def fresh(cls, tenant_id: int) -> Optional['ColumnarEngine']:
+        """Engine over the tenant's snapshot if nothing was ingested since it was taken"""
+        if np is None:
+            return None
+        manifest = read_manifest(tenant_id)
+        if not manifest or manifest['version'] != get_tenant_version(tenant_id):
+            return None
+        return cls(tenant_id, manifest)
+
+    def _known_campaigns(self):
+        """Row mask restricting impressions to campaigns that still belong to the tenant"""
+        return np.isin(self.columns['campaign_id'], list(self.campaigns))
+
+    def cohort_analysis(self) -> List[tuple]:
+        day = self.columns['ts'] // SECONDS_PER_DAY
+        user_ids = self.columns['user_id']
+        if not len(day):
+            return []
+
+        _, users = np.unique(user_ids, return_inverse=True)
+        first_day = np.full(users.max() + 1, day.max(), dtype=np.int64)
+        np.minimum.at(first_day, users, day)
+        cohort = first_day[users]
+        period = day - cohort
+
+        keep = period <= MAX_PERIOD_DAYS
+        cohort, period, users = cohort[keep], period[keep], users[keep]
+        groups, group_ids = np.unique(cohort * (MAX_PERIOD_DAYS + 1) + period, return_inverse=True)
+        impressions = np.bincount(group_ids, minlength=len(groups))
+        active = _distinct_per_group(group_ids, users, len(groups))
+
+        rows, cohort_size = [], {}
+        for key, users_count, impression_count in zip(groups, active, impressions):
+            cohort_day, period_days = divmod(int(key), MAX_PERIOD_DAYS + 1)
+            cohort_size.setdefault(cohort_day, int(users_count))
+            rows.append((
+                _to_date(cohort_day),
+                period_days,
+                int(users_count),
+                int(impression_count),
+                _ratio(int(users_count) * 100, cohort_size[cohort_day], '0.01'),
+            ))
+        return rows
+
+    def campaign_performance_window(self) -> List[tuple]:
+        mask = self._known_campaigns()
+        campaign_ids = self.columns['campaign_id'][mask]
+        if not len(campaign_ids):
+            return []
+        day = self.columns['ts'][mask] // SECONDS_PER_DAY
+        cost = self.columns['cost'][mask]
+
+        # campaign_id and day are non-negative and far below 2**31
+        groups, group_ids = np.unique(campaign_ids * (1 << 32) + day, return_inverse=True)
+        impressions = np.bincount(group_ids, minlength=len(groups))
+        spend = np.bincount(group_ids, weights=cost, minlength=len(groups)).round().astype(np.int64)
+        unique_users = _distinct_per_group(group_ids, self.columns['user_id'][mask], len(groups))
+        group_campaigns, group_days = groups >> 32, groups & ((1 << 32) - 1)
+
+        # ROW_NUMBER() OVER (PARTITION BY campaign ORDER BY impressions DESC)
+        order = np.lexsort((group_days, -impressions, group_campaigns))
+        daily_rank = np.empty(len(groups), dtype=np.int64)
+        starts = np.r_[0, np.flatnonzero(np.diff(group_campaigns[order])) + 1]
+        positions = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        daily_rank[order] = positions + 1
+
+        rows = []
+        # Groups are sorted by (campaign, day), so LAG is the previous group of the same campaign
+        for i in range(len(groups)):
+            campaign_id = int(group_campaigns[i])
+            prev = int(impressions[i - 1]) if i and group_campaigns[i - 1] == campaign_id else None
+            rows.append((
+                campaign_id,
+                self.campaigns[campaign_id],
+                _to_date(group_days[i]),
+                int(impressions[i]),
+                _money(spend[i]),
+                _ratio(spend[i], impressions[i] * COST_SCALE, '0.00000001'),
+                int(unique_users[i]),
+                int(daily_rank[i]),
+                prev,
+                _ratio((int(impressions[i]) - prev) * 100, prev, '0.01') if prev is not None else None,
+            ))
+        rows.sort(key=lambda row: (row[0], -row[2].toordinal()))
+        return rows
+
+    def top_performing_campaigns(self, limit: int = 10) -> List[tuple]:
+        mask = self._known_campaigns()
+        campaign_ids = self.columns['campaign_id'][mask]
+        if not len(campaign_ids):
+            return []
+
+        groups, group_ids = np.unique(campaign_ids, return_inverse=True)
+        impressions = np.bincount(group_ids, minlength=len(groups))
+        spend = np.bincount(group_ids, weights=self.columns['cost'][mask], minlength=len(groups)).round().astype(np.int64)
+        unique_users = _distinct_per_group(group_ids, self.columns['user_id'][mask], len(groups))
+        # ROUND(spend / impressions, 4) in cost units, half up
+        avg_cpm = np.floor(spend / impressions + 0.5).astype(np.int64)
+
+        # RANK(): 1 + number of strictly better rows
+        sorted_impressions = np.sort(impressions)
+        impression_rank = len(groups) - np.searchsorted(sorted_impressions, impressions, side='right') + 1
+        efficiency_rank = np.searchsorted(np.sort(avg_cpm), avg_cpm, side='left') + 1
+
+        order = np.argsort(-impressions, kind='stable')[:limit]
+        return [(
+            int(groups[i]),
+            self.campaigns[int(groups[i])],
+            int(impressions[i]),
+            _money(spend[i]),
+            int(unique_users[i]),
+            _money(avg_cpm[i]),
+            int(impression_rank[i]),
+            int(efficiency_rank[i]),
+        ) for i in order]
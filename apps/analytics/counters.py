@@ -0,0 +1,153 @@
+# apps/analytics/counters.py
+"""Pre-aggregated AdEvent counts per tenant, event_type and time bucket.
+
+Every path that writes AdEvent rows calls count_events(), which adds to
+a per-minute EventCounter bucket. compact_counters() periodically folds
+minute buckets into hourly ones once the hour is more than an hour old,
+so the last hour is always still available at minute resolution.
+Totals and last-hour counts are then a single aggregate over a tenant's
+few hundred buckets instead of COUNT(*) over the event table.
+
+Counters can drift (writes outside these paths, a crash between insert
+and increment); reconcile_counters() recounts closed hours from AdEvent
+and replaces their buckets. Migration 0016 seeded the counters for
+events that predate them; event_totals() falls back to COUNT(*) for a
+tenant without any buckets.
+"""
+import logging
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from apps.analytics.models import AdEvent, EventCounter
+from .rollups import floor_hour
+
+logger = logging.getLogger(__name__)
+
+
+def counter_slots() -> int:
+    return getattr(settings, 'ANALYTICS_EVENT_COUNTER_SLOTS', 4)
+
+
+def floor_minute(value: datetime) -> datetime:
+    return value.replace(second=0, microsecond=0)
+
+
+def _add(tenant_id: int, event_type: str, granularity: str, bucket: datetime, slot: int, count: int):
+    counter = EventCounter.objects.filter(
+        tenant_id=tenant_id, event_type=event_type, granularity=granularity, bucket=bucket, slot=slot
+    )
+    # Update first: the row usually exists, and compaction may delete it between the two steps
+    while not counter.update(count=F('count') + count):
+        EventCounter.objects.bulk_create([EventCounter(
+            tenant_id=tenant_id, event_type=event_type, granularity=granularity, bucket=bucket, slot=slot
+        )], ignore_conflicts=True)
+
+
+def count_events(events: Iterable[AdEvent]):
+    """Add freshly written events to their minute buckets"""
+    buckets = Counter(
+        (event.tenant_id, event.event_type, floor_minute(event.timestamp or timezone.now()))
+        for event in events
+    )
+    slot = random.randrange(counter_slots())
+    for (tenant_id, event_type, minute), count in sorted(buckets.items()):
+        _add(tenant_id, event_type, EventCounter.MINUTE, minute, slot, count)
+
+
+def event_totals(tenant_id: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Events per type, in total and over the last hour (to the minute)"""
+    since = floor_minute((now or timezone.now()) - timedelta(hours=1))
+    rows = EventCounter.objects.filter(tenant_id=tenant_id).values('event_type').annotate(
+        total=Sum('count'),
+        last_hour=Sum('count', filter=Q(granularity=EventCounter.MINUTE, bucket__gte=since)),
+    )
+    if not rows:
+        # Nothing counted for the tenant yet (e.g. events restored outside the write paths): count the table
+        rows = AdEvent.objects.filter(tenant_id=tenant_id).order_by().values('event_type').annotate(
+            total=Count('id'),
+            last_hour=Count('id', filter=Q(timestamp__gte=since)),
+        )
+    by_type = {row['event_type']: row['total'] for row in rows}
+    return {
+        'total': sum(by_type.values()),
+        'last_hour': sum(row['last_hour'] or 0 for row in rows),
+        'by_type': by_type,
+    }
+
+
+def compaction_horizon(now: Optional[datetime] = None) -> datetime:
+    """Minute buckets before this are folded into hours"""
+    return floor_hour((now or timezone.now()) - timedelta(hours=1))
+
+
+def compact_counters(now: Optional[datetime] = None) -> int:
+    """Fold minute buckets of closed hours into hourly buckets; returns minute rows folded"""
+    horizon = compaction_horizon(now)
+    with transaction.atomic():
+        minutes = list(EventCounter.objects.select_for_update().filter(
+            granularity=EventCounter.MINUTE, bucket__lt=horizon
+        ).values_list('id', 'tenant_id', 'event_type', 'bucket', 'count'))
+        hours = Counter()
+        for _, tenant_id, event_type, bucket, count in minutes:
+            hours[(tenant_id, event_type, floor_hour(bucket))] += count
+        for (tenant_id, event_type, hour), count in sorted(hours.items()):
+            _add(tenant_id, event_type, EventCounter.HOUR, hour, 0, count)
+        EventCounter.objects.filter(id__in=[row[0] for row in minutes]).delete()
+    if minutes:
+        logger.info(f"Compacted {len(minutes)} minute counters into {len(hours)} hourly buckets")
+    return len(minutes)
+
+
+def reconcile_counters(tenant_id: int, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> Dict[str, Any]:
+    """Recount the hours in [start, end) from AdEvent and replace their buckets.
+
+    Without `start` every hour since the tenant's oldest event is
+    recounted. `end` never goes past the compaction horizon, so buckets
+    writers are still adding to are left alone.
+    """
+    horizon = compaction_horizon()
+    end = min(floor_hour(end), horizon) if end else horizon
+    if start is None:
+        oldest = AdEvent.objects.filter(tenant_id=tenant_id).aggregate(oldest=Min('timestamp'))['oldest']
+        start = oldest or end
+    start = floor_hour(start)
+    if start >= end:
+        return {'tenant_id': tenant_id, 'hours': 0, 'drift': 0}
+
+    with transaction.atomic():
+        buckets = EventCounter.objects.filter(tenant_id=tenant_id, bucket__gte=start, bucket__lt=end)
+        before = Counter()
+        for event_type, bucket, count in buckets.values_list('event_type', 'bucket', 'count'):
+            before[(event_type, floor_hour(bucket))] += count
+        actual = Counter({
+            (row['event_type'], row['hour']): row['events']
+            for row in AdEvent.objects.filter(
+                tenant_id=tenant_id, timestamp__gte=start, timestamp__lt=end
+            ).annotate(hour=TruncHour('timestamp')).values('event_type', 'hour').annotate(events=Count('id'))
+        })
+        buckets.delete()
+        EventCounter.objects.bulk_create([
+            EventCounter(tenant_id=tenant_id, event_type=event_type, granularity=EventCounter.HOUR,
+                         bucket=hour, count=count)
+            for (event_type, hour), count in actual.items()
+        ])
+
+    drift = sum(abs(actual[key] - before[key]) for key in set(actual) | set(before))
+    if drift:
+        logger.warning(f"Corrected event counter drift of {drift} for tenant {tenant_id} in [{start}, {end})")
+    return {'tenant_id': tenant_id, 'hours': int((end - start).total_seconds() // 3600), 'drift': drift}
+
+
+def discard_counters(tenant_id: int, cutoff: datetime):
+    """Drop the buckets of events removed by retention, recounting the hour `cutoff` falls in"""
+    hour = floor_hour(cutoff)
+    EventCounter.objects.filter(tenant_id=tenant_id, bucket__lt=hour).delete()
+    if hour != cutoff:
+        reconcile_counters(tenant_id, hour, hour + timedelta(hours=1))
@@ -1,109 +1,49 @@
 # apps/analytics/events.py
-from apps.analytics.models import AdEvent, CampaignMetrics
+from apps.analytics.models import AdEvent
 from apps.campaigns.models import Campaign, Impression
-from django.db import transaction
+from apps.analytics.repositories.cached import bump_tenant_version
+from apps.analytics.sequences import next_sequence
+from apps.analytics.aggregates import fold_events, write_campaign_metrics
+from apps.analytics.archive import archived_through
+from apps.analytics.counters import count_events
+from apps.analytics.projections import settle_seconds
+from apps.realtime.pubsub import delta, publish_deltas
+from datetime import timedelta
+from django.db import connection
+from django.db.models import Min
 from django.utils import timezone
-from collections import defaultdict
-from decimal import Decimal
+import base64
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-def replay_events(campaign_id, tenant_id):
-    """Rebuild metrics from events - functional implementation"""
+EVENT_PAGE_MAX = 1000
+
+def replay_events(campaign_id, tenant_id, use_snapshot=True):
+    """Rebuild metrics from events, starting at the newest aggregate snapshot"""
     try:
-        campaign_id_str = str(campaign_id)
-        
-        # Get all events for this campaign, ordered by sequence
-        events = AdEvent.objects.filter(
-            aggregate_id=campaign_id_str,
-            tenant_id=tenant_id
-        ).order_by('sequence_number', 'timestamp')
-        
-        if not events.exists():
-            logger.info(f"No events found for campaign {campaign_id}")
-            return []
-        
-        # Initialize metrics
-        metrics = {
-            'total_impressions': 0,
-            'total_clicks': 0,
-            'total_conversions': 0,
-            'total_spend': Decimal('0.00'),
-            'unique_users': set(),
-            'daily_metrics': defaultdict(lambda: {
-                'impressions': 0,
-                'clicks': 0,
-                'spend': Decimal('0.00'),
-                'users': set()
-            })
-        }
-        
-        # Replay events in sequence
         replayed_events = []
-        for event in events:
-            event_date = event.timestamp.date()
-            payload = event.payload or {}
-            
-            if event.event_type == 'impression_created':
-                metrics['total_impressions'] += 1
-                metrics['daily_metrics'][event_date]['impressions'] += 1
-                
-                # Extract cost and user_id from payload
-                cost = Decimal(str(payload.get('cost', '0.00')))
-                metrics['total_spend'] += cost
-                metrics['daily_metrics'][event_date]['spend'] += cost
-                
-                user_id = payload.get('user_id')
-                if user_id:
-                    metrics['unique_users'].add(user_id)
-                    metrics['daily_metrics'][event_date]['users'].add(user_id)
-                    
-            elif event.event_type == 'click_registered':
-                metrics['total_clicks'] += 1
-                metrics['daily_metrics'][event_date]['clicks'] += 1
-                
-                user_id = payload.get('user_id')
-                if user_id:
-                    metrics['unique_users'].add(user_id)
-                    metrics['daily_metrics'][event_date]['users'].add(user_id)
-                    
-            elif event.event_type == 'conversion_tracked':
-                metrics['total_conversions'] += 1
-                
-                user_id = payload.get('user_id')
-                if user_id:
-                    metrics['unique_users'].add(user_id)
-            
+
+        def collect(event):
             replayed_events.append({
                 'event_id': event.id,
                 'event_type': event.event_type,
                 'timestamp': event.timestamp,
                 'processed': True
             })
+
+        aggregate, since = fold_events(tenant_id, campaign_id, use_snapshot=use_snapshot, on_event=collect)
+        if not aggregate.events:
+            logger.info(f"No events found for campaign {campaign_id}")
+            return []
+
+        write_campaign_metrics(tenant_id, campaign_id, aggregate)
         
-        # Update or create campaign metrics
-        with transaction.atomic():
-            # Clear existing metrics for this campaign
-            CampaignMetrics.objects.filter(
-                campaign_id=campaign_id,
-                tenant_id=tenant_id
-            ).delete()
-            
-            # Create daily metrics
-            for date, daily_data in metrics['daily_metrics'].items():
-                CampaignMetrics.objects.create(
-                    tenant_id=tenant_id,
-                    campaign_id=campaign_id,
-                    date=date,
-                    impressions=daily_data['impressions'],
-                    clicks=daily_data['clicks'],
-                    conversions=0,  # Will be calculated separately
-                    spend=daily_data['spend'],
-                    unique_users=len(daily_data['users'])
-                )
-        
-        logger.info(f"Replayed {len(replayed_events)} events for campaign {campaign_id}")
+        logger.info(
+            f"Replayed {len(replayed_events)} events for campaign {campaign_id}"
+            + (f" on top of the snapshot at sequence {since}" if since else "")
+        )
         return replayed_events
         
     except Exception as e:
@@ -114,23 +54,17 @@ def replay_events(campaign_id, tenant_id):
 def emit_event(event_type, aggregate_id, payload, tenant_id):
     """Emit new event to event store"""
     try:
-        # Get next sequence number for this aggregate
-        last_sequence = AdEvent.objects.filter(
-            aggregate_id=str(aggregate_id),
-            tenant_id=tenant_id
-        ).aggregate(
-            max_seq=models.Max('sequence_number')
-        )['max_seq'] or 0
-        
         # Create the event
         event = AdEvent.objects.create(
             tenant_id=tenant_id,
             event_type=event_type,
             aggregate_id=str(aggregate_id),
             payload=payload,
-            sequence_number=last_sequence + 1,
+            sequence_number=next_sequence(tenant_id, aggregate_id),
             timestamp=timezone.now()
         )
+        count_events([event])
+        bump_tenant_version(tenant_id)
         
         logger.info(f"Event emitted: {event_type} for {aggregate_id}")
         return event
@@ -165,6 +99,8 @@ def record_impression_event(campaign_id, ad_id, user_id, cost, tenant_id):
             cost=cost,
             timestamp=timezone.now()
         )
+        bump_tenant_version(tenant_id)
+        publish_deltas(tenant_id, [delta(campaign_id, impressions=1, spend=cost, users=[user_id])])
     except Exception as e:
         logger.error(f"Error creating impression record: {str(e)}")
     
@@ -181,7 +117,10 @@ def record_click_event(campaign_id, ad_id, user_id, tenant_id, impression_id=Non
         'timestamp': timezone.now().isoformat()
     }
     
-    return emit_event('click_registered', campaign_id, payload, tenant_id)
+    event = emit_event('click_registered', campaign_id, payload, tenant_id)
+    if event:
+        publish_deltas(tenant_id, [delta(campaign_id, clicks=1)])
+    return event
 
 
 def record_conversion_event(campaign_id, user_id, conversion_value, tenant_id):
@@ -196,48 +135,136 @@ def record_conversion_event(campaign_id, user_id, conversion_value, tenant_id):
     return emit_event('conversion_tracked', campaign_id, payload, tenant_id)
 
 
+def encode_cursor(sequence_number, order):
+    """Opaque continuation token: the last sequence number served and the direction"""
+    raw = json.dumps({'s': sequence_number, 'o': order}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if data['o'] not in ('asc', 'desc'):
+            raise ValueError(data['o'])
+        return int(data['s']), data['o']
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f'Invalid cursor: {token}') from e
+
+
+def get_event_page(campaign_id, tenant_id, limit=100, cursor=None, since_sequence=None):
+    """One page of an aggregate's events, keyset-paginated on sequence_number.
+
+    Without `since_sequence` pages run newest first. With it they run oldest
+    first from just after that number, and the returned cursor keeps
+    tailing the aggregate even once it is exhausted. Both are range scans
+    of the (tenant_id, aggregate_id, sequence_number) index.
+
+    Numbers are reserved before the insert commits, so a lower number can
+    become visible after a higher one. Oldest-first pages therefore stop
+    before the first event younger than the projections' settle window,
+    the same horizon run_projection uses, so a tail never moves its cursor
+    past a number that is still on its way.
+    """
+    limit = max(1, min(int(limit), EVENT_PAGE_MAX))
+    if cursor:
+        position, order = decode_cursor(cursor)
+    elif since_sequence is not None:
+        position, order = int(since_sequence), 'asc'
+    else:
+        position, order = None, 'desc'
+
+    events = AdEvent.objects.filter(aggregate_id=str(campaign_id), tenant_id=tenant_id)
+    if order == 'asc':
+        events = events.filter(sequence_number__gt=position)
+        horizon = timezone.now() - timedelta(seconds=settle_seconds())
+        unsettled = events.filter(timestamp__gte=horizon).aggregate(first=Min('sequence_number'))['first']
+        if unsettled is not None:
+            events = events.filter(sequence_number__lt=unsettled)
+        events = events.order_by('sequence_number')
+    else:
+        if position is not None:
+            events = events.filter(sequence_number__lt=position)
+        events = events.order_by('-sequence_number')
+    page = list(events[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    if page and (has_more or order == 'asc'):
+        next_cursor = encode_cursor(page[-1].sequence_number, order)
+    elif order == 'asc':
+        next_cursor = encode_cursor(position, order)
+    else:
+        next_cursor = None
+
+    return {
+        'events': [{
+            'event_id': event.id,
+            'event_type': event.event_type,
+            'timestamp': event.timestamp,
+            'payload': dict(event.payload),
+            'sequence_number': event.sequence_number
+        } for event in page],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'limit': limit,
+    }
+
+
 def get_event_stream(campaign_id, tenant_id, limit=100):
     """Get event stream for real-time monitoring"""
-    events = AdEvent.objects.filter(
-        aggregate_id=str(campaign_id),
-        tenant_id=tenant_id
-    ).order_by('-timestamp')[:limit]
-    
-    return [{
-        'event_id': event.id,
-        'event_type': event.event_type,
-        'timestamp': event.timestamp,
-        'payload': event.payload,
-        'sequence_number': event.sequence_number
-    } for event in events]
+    return get_event_page(campaign_id, tenant_id, limit)['events']
+
 
+# Only the rows that break the run of +1 steps, plus the last one for the totals
+SEQUENCE_BREAKS_SQL = """
+    SELECT id, sequence_number, previous, total FROM (
+        SELECT id, sequence_number,
+               LAG(sequence_number) OVER w AS previous,
+               ROW_NUMBER() OVER w AS position,
+               COUNT(*) OVER () AS total
+        FROM analytics_adevent
+        WHERE tenant_id = %s AND aggregate_id = %s
+        WINDOW w AS (ORDER BY sequence_number, id)
+    ) breaks
+    WHERE previous IS NULL OR sequence_number <> previous + 1 OR position = total
+    ORDER BY sequence_number, id
+"""
 
 def validate_event_sequence(campaign_id, tenant_id):
-    """Validate event sequence integrity"""
-    events = AdEvent.objects.filter(
-        aggregate_id=str(campaign_id),
-        tenant_id=tenant_id
-    ).order_by('sequence_number')
-    
-    expected_sequence = 1
-    gaps = []
-    
-    for event in events:
-        if event.sequence_number != expected_sequence:
+    """Validate event sequence integrity in one pass over the aggregate's sequence index.
+
+    A gap reports the first missing number (`expected`) and the number
+    found instead; numbers before the oldest event are not a gap as far as
+    the archive holds the aggregate's older events.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SEQUENCE_BREAKS_SQL, [tenant_id, str(campaign_id)])
+        rows = cursor.fetchall()
+
+    gaps, duplicates, total, last_sequence = [], [], 0, 0
+    for event_id, sequence, previous, total in rows:
+        last_sequence = sequence
+        if previous is None:
+            if sequence == 1:
+                continue
+            through = archived_through(tenant_id, campaign_id)
+            if through is None or through >= sequence - 1:
+                continue
+            previous = through
+        if sequence == previous:
+            duplicates.append({'sequence_number': sequence, 'event_id': event_id})
+        elif sequence != previous + 1:
             gaps.append({
-                'expected': expected_sequence,
-                'found': event.sequence_number,
-                'event_id': event.id
+                'expected': previous + 1,
+                'found': sequence,
+                'missing': sequence - previous - 1,
+                'event_id': event_id
             })
-        expected_sequence = event.sequence_number + 1
-    
+
     return {
-        'valid': len(gaps) == 0,
+        'valid': not gaps and not duplicates,
         'gaps': gaps,
-        'total_events': events.count(),
-        'last_sequence': expected_sequence - 1
+        'duplicates': duplicates,
+        'total_events': total,
+        'last_sequence': last_sequence
     }
-
-
-# Import here to avoid circular imports
-from django.db import models
\ No newline at end of file
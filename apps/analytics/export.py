@@ -0,0 +1,49 @@
+# apps/analytics/export.py
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from .renderers import NDJSONRenderer, CSVRenderer
+from .repositories.streaming import stream_query
+
+EXPORT_RENDERERS = [NDJSONRenderer, CSVRenderer]
+EXPORT_FORMATS = {renderer.format for renderer in EXPORT_RENDERERS}
+
+
+class _Echo:
+    """csv.writer target that hands each formatted line back instead of buffering it"""
+    def write(self, value):
+        return value
+
+
+def wants_export(request):
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.format in EXPORT_FORMATS
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def _csv_lines(rows):
+    writer = None
+    echo = _Echo()
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(echo, fieldnames=list(row))
+            yield writer.writeheader()
+        yield writer.writerow(row)
+
+
+def export_response(request, sql, params, name, transform=None):
+    """Stream the rows of `sql` in the negotiated export format"""
+    rows = stream_query(sql, params)
+    if transform:
+        rows = map(transform, rows)
+
+    renderer = request.accepted_renderer
+    lines = _csv_lines(rows) if renderer.format == 'csv' else _ndjson_lines(rows)
+    response = StreamingHttpResponse(lines, content_type=f'{renderer.media_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{name}.{renderer.format}"'
+    return response
@@ -0,0 +1,73 @@
+# apps/analytics/fanout.py
+"""Run independent dashboard queries concurrently on a bounded thread pool.
+
+Every branch runs in a pool thread with its own database connection. On
+MySQL the branch's statements are capped with MAX_EXECUTION_TIME so a slow
+query is killed server side instead of holding a worker after the request
+has given up on it; the request itself waits at most `timeout` seconds and
+returns whatever finished.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+FANOUT_WORKERS = getattr(settings, 'ANALYTICS_FANOUT_WORKERS', 8)
+FANOUT_TIMEOUT = getattr(settings, 'ANALYTICS_FANOUT_TIMEOUT', 5.0)
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='analytics-fanout')
+
+
+def _run_branch(func: Callable[[], Any], timeout: float):
+    close_old_connections()
+    try:
+        if connection.vendor == 'mysql':
+            # Pool threads only ever run branches, so the session limit is
+            # simply overwritten by the next one
+            with connection.cursor() as cursor:
+                cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", [int(timeout * 1000)])
+        started = time.perf_counter()
+        result = func()
+        return result, (time.perf_counter() - started) * 1000
+    finally:
+        close_old_connections()
+
+
+def fan_out(branches: Dict[str, Callable[[], Any]], timeout: float = None) -> Dict[str, Any]:
+    """Run each zero-argument callable concurrently.
+
+    Returns {'results', 'timings_ms', 'errors', 'partial'}; a branch that
+    failed or missed the deadline has a None result and an entry in
+    `errors`.
+    """
+    timeout = timeout or FANOUT_TIMEOUT
+    futures = {name: _executor.submit(_run_branch, func, timeout) for name, func in branches.items()}
+    wait(futures.values(), timeout=timeout)
+
+    results, timings, errors = {}, {}, {}
+    for name, future in futures.items():
+        results[name] = None
+        if not future.done():
+            future.cancel()
+            errors[name] = 'timeout'
+            timings[name] = None
+            logger.warning(f"Dashboard branch {name} exceeded {timeout}s")
+            continue
+        try:
+            results[name], elapsed = future.result()
+            timings[name] = round(elapsed, 2)
+        except Exception as e:
+            errors[name] = str(e)
+            timings[name] = None
+            logger.error(f"Dashboard branch {name} failed: {e}")
+
+    return {
+        'results': results,
+        'timings_ms': timings,
+        'errors': errors,
+        'partial': bool(errors),
+    }
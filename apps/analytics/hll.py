@@ -0,0 +1,116 @@
+# apps/analytics/hll.py
+"""HyperLogLog sketches for approximate distinct user counts.
+
+Pure Python with a NumPy fast path; both produce identical registers, so
+sketches written by one can be merged by the other. With the default
+precision (p=12, 4096 one-byte registers) the relative standard error is
+1.04 / sqrt(4096) ≈ 1.6%, i.e. ~95% of estimates land within ±3.3%.
+"""
+import math
+import zlib
+from typing import Iterable
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+PRECISION = 12
+MASK64 = (1 << 64) - 1
+
+
+def standard_error(precision: int = PRECISION) -> float:
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def hash64(value: int) -> int:
+    """splitmix64 finalizer: cheap, well mixed and reproducible across processes"""
+    z = (value + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def _hash64_array(values):
+    z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = PRECISION, registers: bytes = None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError(f"Expected {self.m} registers, got {len(self.registers)}")
+
+    def add(self, user_id: int):
+        h = hash64(int(user_id))
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, user_ids: Iterable[int]):
+        if np is None:
+            for user_id in user_ids:
+                self.add(user_id)
+            return
+
+        values = np.fromiter(user_ids, dtype=np.int64)
+        if not len(values):
+            return
+        hashes = _hash64_array(values)
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # rest < 2**52 converts to float64 exactly, so frexp's exponent is its bit length
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (bits - bit_length + 1).astype(np.uint8)
+
+        registers = np.frombuffer(self.registers, dtype=np.uint8).copy()
+        np.maximum.at(registers, index, rank)
+        self.registers = bytearray(registers.tobytes())
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        if np is not None:
+            merged = np.maximum(
+                np.frombuffer(self.registers, dtype=np.uint8),
+                np.frombuffer(other.registers, dtype=np.uint8)
+            )
+            self.registers = bytearray(merged.tobytes())
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        if np is not None:
+            registers = np.frombuffer(self.registers, dtype=np.uint8)
+            harmonic = float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+            zeros = int(np.count_nonzero(registers == 0))
+        else:
+            harmonic = sum(math.ldexp(1.0, -r) for r in self.registers)
+            zeros = self.registers.count(0)
+
+        estimate = alpha * m * m / harmonic
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is far more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = PRECISION) -> 'HyperLogLog':
+        return cls(precision, zlib.decompress(data))
+
+    def __len__(self):
+        return self.count()
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.analytics.archive import archive_expired_events
+from apps.analytics.models import EventArchiveSegment
+
+
+class Command(BaseCommand):
+    help = 'Archive events past retention to segment files, then delete them from AdEvent'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep this many days of events in the table')
+        parser.add_argument('--tenant_id', type=int, help='Only this tenant (rows are deleted, partitions kept)')
+        parser.add_argument('--list', action='store_true', help='Only print the archive manifest')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            segments = EventArchiveSegment.objects.order_by('tenant_id', 'first_id')
+            if options['tenant_id'] is not None:
+                segments = segments.filter(tenant_id=options['tenant_id'])
+            for segment in segments:
+                state = 'purged' if segment.purged else 'pending delete'
+                self.stdout.write(
+                    f'🗄️  tenant {segment.tenant_id} {segment.day}: {segment.events:,} events, '
+                    f'{segment.size_bytes:,} bytes, {state} -> {segment.path}'
+                )
+            return
+
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        result = archive_expired_events(timezone.now() - timedelta(days=options['days']), options['tenant_id'])
+        if result['skipped']:
+            raise CommandError(
+                f'Nothing archived or removed: {result["skipped"]} '
+                '(set ANALYTICS_ARCHIVE_STORAGE or ANALYTICS_ARCHIVE_DIR)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Archived {result["archived_events"]:,} events in {result["segments"]} segments '
+            f'({result["archived_bytes"]:,} bytes), removed {result["deleted_events"]:,}'
+        ))
+        if result['dropped_partitions']:
+            self.stdout.write(f'🧹 Dropped partitions {result["dropped_partitions"]}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from apps.analytics.cohorts import refresh_cohorts, reset_cohorts
+
+
+class Command(BaseCommand):
+    help = 'Build the incremental cohort retention matrix for a tenant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, required=True, help='Tenant to backfill')
+        parser.add_argument('--reset', action='store_true', help='Drop the existing matrix and rebuild from the first impression')
+
+    def handle(self, *args, **options):
+        tenant_id = options['tenant_id']
+
+        if options['reset']:
+            reset_cohorts(tenant_id)
+            self.stdout.write(f'🧹 Cleared cohort matrix for tenant {tenant_id}')
+
+        def progress(window_start, window_end):
+            self.stdout.write(f'   {window_start:%Y-%m-%d %H:%M} → {window_end:%Y-%m-%d %H:%M}')
+
+        result = refresh_cohorts(tenant_id, progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Folded {result["windows"]} windows, watermark at {result["position"]}'
+            )
+        )
@@ -0,0 +1,42 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.analytics.rollups import refresh_rollups, reset_rollups, get_watermark
+
+
+class Command(BaseCommand):
+    help = 'Backfill hourly/daily impression rollups for a tenant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, required=True, help='Tenant to backfill')
+        parser.add_argument('--since', type=str, help='Recompute from this date (YYYY-MM-DD) instead of the watermark')
+        parser.add_argument('--reset', action='store_true', help='Drop existing rollups and rebuild from the first impression')
+
+    def handle(self, *args, **options):
+        tenant_id = options['tenant_id']
+
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--since must be in YYYY-MM-DD format')
+
+        if options['reset']:
+            reset_rollups(tenant_id)
+            self.stdout.write(f'🧹 Cleared rollups for tenant {tenant_id}')
+
+        self.stdout.write(
+            f'🚀 Rolling up tenant {tenant_id} from {since or get_watermark(tenant_id) or "first impression"}'
+        )
+
+        def progress(window_start, window_end):
+            self.stdout.write(f'   {window_start:%Y-%m-%d %H:%M} → {window_end:%Y-%m-%d %H:%M}')
+
+        result = refresh_rollups(tenant_id, since=since, progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Rolled up {result["windows"]} windows, watermark at {result["position"]}'
+            )
+        )
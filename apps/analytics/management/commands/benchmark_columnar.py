@@ -0,0 +1,53 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from apps.analytics.columnar import ColumnarEngine
+from apps.analytics.repository import AnalyticsRepository
+
+QUERIES = [
+    ('cohort_analysis', lambda tenant_id: AnalyticsRepository.cohort_analysis(tenant_id),
+     lambda engine: engine.cohort_analysis()),
+    ('campaign_performance_window', lambda tenant_id: AnalyticsRepository.campaign_performance_window(tenant_id),
+     lambda engine: engine.campaign_performance_window()),
+    ('top_performing_campaigns', lambda tenant_id: AnalyticsRepository.top_performing_campaigns(tenant_id),
+     lambda engine: engine.top_performing_campaigns()),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare the columnar snapshot engine with the SQL repository paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, default=1, help='Tenant to benchmark')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per query; the best time is reported')
+
+    def handle(self, *args, **options):
+        tenant_id = options['tenant_id']
+        engine = ColumnarEngine.load(tenant_id)
+        if engine is None:
+            raise CommandError(f'No snapshot for tenant {tenant_id}; run snapshot_impressions first')
+
+        self.stdout.write(f'🚀 Benchmarking {engine.manifest["rows"]:,} snapshot rows (best of {options["repeat"]})')
+        self.stdout.write(f'{"query":<30} {"sql ms":>10} {"columnar ms":>12} {"speedup":>8} {"rows":>8}')
+
+        # Time the SQL paths themselves, not cache hits or the snapshot route
+        with override_settings(ANALYTICS_QUERY_CACHE_ENABLED=False, ANALYTICS_COLUMNAR_ROUTING=False):
+            for name, run_sql, run_columnar in QUERIES:
+                sql_ms, sql_rows = self.best_of(options['repeat'], lambda: run_sql(tenant_id))
+                columnar_ms, columnar_rows = self.best_of(options['repeat'], lambda: run_columnar(engine))
+                mismatch = '' if len(sql_rows) == len(columnar_rows) else f'  ⚠️ {len(sql_rows)} SQL rows'
+                self.stdout.write(
+                    f'{name:<30} {sql_ms:>10.1f} {columnar_ms:>12.1f} '
+                    f'{sql_ms / columnar_ms if columnar_ms else 0:>7.1f}x {len(columnar_rows):>8}{mismatch}'
+                )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
+
+    def best_of(self, repeat, func):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import override_settings
+from apps.analytics.events import validate_event_sequence
+from apps.analytics.models import AdEvent, EventSequence
+from apps.analytics.sequences import next_sequence, reset_blocks
+from apps.campaigns.models import Campaign
+
+
+class Command(BaseCommand):
+    help = 'Measure event ingest throughput with parallel writers sharing aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, required=True,
+                            help='Scratch tenant without real data; its events are wiped before and after each run')
+        parser.add_argument('--writers', type=int, default=32, help='Parallel writer threads')
+        parser.add_argument('--events', type=int, default=200, help='Events per writer')
+        parser.add_argument('--aggregates', type=int, default=4, help='Aggregates the writers spread over')
+        parser.add_argument('--block_sizes', type=str, default='1,64', help='Comma separated ANALYTICS_SEQUENCE_BLOCK_SIZE values')
+        parser.add_argument('--force', action='store_true', help='Run even though DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is off; pass --force to benchmark against this database')
+        tenant_id = options['tenant_id']
+        if (Campaign.objects.filter(tenant_id=tenant_id).exists()
+                or AdEvent.objects.filter(tenant_id=tenant_id).exclude(event_type='benchmark').exists()):
+            raise CommandError(f'Tenant {tenant_id} has real campaigns or events; pick an unused tenant id')
+        if connection.vendor != 'mysql':
+            raise CommandError('The concurrency benchmark needs MySQL row locking')
+        total = options['writers'] * options['events']
+        self.stdout.write(
+            f'🚀 {options["writers"]} writers x {options["events"]} events over {options["aggregates"]} aggregates'
+        )
+        self.stdout.write(f'{"block":>6} {"seconds":>8} {"events/s":>10} {"dupes":>6} {"gaps":>6}')
+
+        for size in [int(s) for s in options['block_sizes'].split(',')]:
+            self.wipe(tenant_id)
+            reset_blocks()
+
+            def writer(index):
+                try:
+                    for i in range(options['events']):
+                        aggregate_id = str((index + i) % options['aggregates'])
+                        AdEvent.objects.create(
+                            tenant_id=tenant_id,
+                            event_type='benchmark',
+                            aggregate_id=aggregate_id,
+                            payload={'writer': index},
+                            sequence_number=next_sequence(tenant_id, aggregate_id)
+                        )
+                finally:
+                    close_old_connections()
+
+            with override_settings(ANALYTICS_SEQUENCE_BLOCK_SIZE=size):
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['writers']) as pool:
+                    list(pool.map(writer, range(options['writers'])))
+                elapsed = time.perf_counter() - started
+
+            dupes = self.duplicates(tenant_id)
+            gaps = sum(
+                len(validate_event_sequence(aggregate, tenant_id)['gaps'])
+                for aggregate in range(options['aggregates'])
+            )
+            self.stdout.write(f'{size:>6} {elapsed:>8.2f} {total / elapsed:>10,.0f} {dupes:>6} {gaps:>6}')
+
+        self.wipe(tenant_id)
+        reset_blocks()
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
+
+    def wipe(self, tenant_id):
+        AdEvent.objects.filter(tenant_id=tenant_id, event_type='benchmark').delete()
+        EventSequence.objects.filter(tenant_id=tenant_id).delete()
+
+    def duplicates(self, tenant_id):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM analytics_adevent
+                    WHERE tenant_id = %s
+                    GROUP BY aggregate_id, sequence_number
+                    HAVING COUNT(*) > 1
+                ) d
+            """, [tenant_id])
+            return cursor.fetchone()[0]
@@ -0,0 +1,68 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.analytics.repositories.connection import optimized_analytics_cursor
+from apps.analytics.rollups import to_db
+from apps.analytics.sketches import SketchRepository, STANDARD_ERROR
+from apps.campaigns.models import Campaign
+
+
+class Command(BaseCommand):
+    help = 'Compare sketch unions against exact COUNT(DISTINCT user_id)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, default=1, help='Tenant to benchmark')
+        parser.add_argument('--days', type=str, default='1,7,30,90', help='Comma separated look-back windows in days')
+        parser.add_argument('--campaigns', type=int, default=0, help='Union over the first N campaigns (0 = all)')
+
+    def handle(self, *args, **options):
+        tenant_id = options['tenant_id']
+        if not SketchRepository.is_ready(tenant_id):
+            raise CommandError(f'No sketches for tenant {tenant_id}; run backfill_sketches first')
+
+        campaign_ids = list(
+            Campaign.objects.filter(tenant_id=tenant_id).order_by('id').values_list('id', flat=True)
+        )
+        if options['campaigns']:
+            campaign_ids = campaign_ids[:options['campaigns']]
+
+        self.stdout.write(
+            f'🚀 Benchmarking {len(campaign_ids)} campaigns, '
+            f'expected relative error ±{STANDARD_ERROR:.2%} (1σ)'
+        )
+        self.stdout.write(f'{"days":>6} {"exact":>10} {"exact ms":>10} {"approx":>10} {"approx ms":>10} {"error":>8}')
+
+        now = timezone.now()
+        for days in [int(d) for d in options['days'].split(',')]:
+            start = now - timedelta(days=days)
+
+            started = time.perf_counter()
+            exact = self.exact_unique_users(tenant_id, start, now, campaign_ids)
+            exact_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            approx = SketchRepository.unique_users(tenant_id, start, now, campaign_ids)
+            approx_ms = (time.perf_counter() - started) * 1000
+
+            error = (approx - exact) / exact if exact else 0.0
+            self.stdout.write(
+                f'{days:>6} {exact:>10,} {exact_ms:>10.1f} {approx:>10,} {approx_ms:>10.1f} {error:>8.2%}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
+
+    def exact_unique_users(self, tenant_id, start, end, campaign_ids):
+        if not campaign_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(campaign_ids))
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT ci.user_id)
+                FROM campaigns_impression ci
+                JOIN campaigns_ad ad ON ci.ad_id = ad.id
+                WHERE ci.tenant_id = %s
+                AND ci.timestamp >= %s AND ci.timestamp < %s
+                AND ad.campaign_id IN ({placeholders})
+            """, [tenant_id, to_db(start), to_db(end)] + campaign_ids)
+            return cursor.fetchone()[0]
@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.rollups import verify_rollups, get_watermark
+
+
+class Command(BaseCommand):
+    help = 'Diff impression rollups against raw impressions for a sample window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, required=True, help='Tenant to check')
+        parser.add_argument('--hours', type=int, default=24, help='Closed hours before the watermark to check')
+
+    def handle(self, *args, **options):
+        tenant_id = options['tenant_id']
+        watermark = get_watermark(tenant_id)
+        if watermark is None:
+            raise CommandError(f'No rollups for tenant {tenant_id}; run backfill_rollups first')
+
+        start = watermark - timedelta(hours=options['hours'])
+        mismatches = verify_rollups(tenant_id, start, watermark)
+
+        if mismatches:
+            for mismatch in mismatches[:50]:
+                self.stdout.write(self.style.ERROR(
+                    f'❌ campaign {mismatch["campaign_id"]} ad {mismatch["ad_id"]} {mismatch["hour"]}: '
+                    f'expected {mismatch["expected"]} got {mismatch["actual"]}'
+                ))
+            raise CommandError(f'{len(mismatches)} rollup buckets differ from raw data')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Rollups match raw impressions for {start:%Y-%m-%d %H:%M} → {watermark:%Y-%m-%d %H:%M}'
+        ))
@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.analytics.aggregates import CampaignAggregate, FETCH_SIZE
+from apps.analytics.codec import reencode_legacy_payloads
+from apps.analytics.models import AdEvent
+
+
+class Command(BaseCommand):
+    help = 'Re-encode legacy JSON event payloads in batches, reporting bytes per event and replay speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Events rewritten per UPDATE batch')
+        parser.add_argument('--sample', type=int, default=100000, help='Events folded to measure replay speed')
+        parser.add_argument('--report-only', action='store_true', help='Measure without rewriting anything')
+
+    def measure(self, sample):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), COALESCE(AVG(LENGTH(payload)), 0) FROM analytics_adevent")
+            count, avg_bytes = cursor.fetchone()
+
+        aggregate, folded = CampaignAggregate(), 0
+        started = time.perf_counter()
+        for event in AdEvent.objects.order_by('id')[:sample].iterator(chunk_size=FETCH_SIZE):
+            aggregate.apply(event)
+            folded += 1
+        elapsed = time.perf_counter() - started
+        return count, float(avg_bytes), folded / elapsed if elapsed else 0.0
+
+    def report(self, label, measurement):
+        count, avg_bytes, rate = measurement
+        self.stdout.write(f'📊 {label:<7} {count:>12,} events {avg_bytes:>8.1f} bytes/event {rate:>12,.0f} events/s replayed')
+
+    def handle(self, *args, **options):
+        before = self.measure(options['sample'])
+        self.report('before', before)
+        if options['report_only']:
+            return
+
+        def progress(last_id, rewritten):
+            self.stdout.write(f'   ⏳ up to id {last_id:,}: {rewritten:,} rewritten')
+
+        rewritten = reencode_legacy_payloads(options['batch_size'], progress)
+        after = self.measure(options['sample'])
+        self.report('after', after)
+
+        saved = 1 - after[1] / before[1] if before[1] else 0.0
+        self.stdout.write(self.style.SUCCESS(f'✅ Re-encoded {rewritten:,} payloads, {saved:.0%} fewer payload bytes'))
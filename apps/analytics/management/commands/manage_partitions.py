@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from apps.analytics.partitions import PARTITIONED_TABLES, maintain_partitions, partition_status
+
+
+class Command(BaseCommand):
+    help = 'Pre-create future partitions and drop or archive expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=sorted(PARTITIONED_TABLES), help='Only maintain this table')
+        parser.add_argument('--archive', action='store_true', help='Exchange expired partitions into archive tables instead of dropping them')
+        parser.add_argument('--status', action='store_true', help='Only print the partition layout')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'mysql':
+            raise CommandError('Table partitioning requires MySQL')
+
+        if options['status']:
+            for table, status in partition_status().items():
+                self.stdout.write(f'📦 {table} ({status["period"]}, retention {status["retention_days"]} days)')
+                for partition in status['partitions']:
+                    self.stdout.write(f'   {partition["name"]} < {partition["less_than"]}: ~{partition["rows"]:,} rows')
+            return
+
+        tables = [options['table']] if options['table'] else None
+        for table, result in maintain_partitions(tables, archive=options['archive']).items():
+            if not result['partitioned']:
+                self.stdout.write(self.style.WARNING(f'⚠️  {table} is not partitioned, run migrate first'))
+                continue
+            self.stdout.write(f'📦 {table}: created {result["created"] or "nothing"}')
+            if result['retired']:
+                action = 'archived' if options['archive'] else 'dropped'
+                self.stdout.write(
+                    f'   {action} {result["retired"]["dropped"] or "nothing"} '
+                    f'(~{result["retired"]["rows_estimate"]:,} rows)'
+                )
+
+        self.stdout.write(self.style.SUCCESS('✅ Partition maintenance complete'))
@@ -0,0 +1,64 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.rebuild import (
+    campaign_ids_with_events, dispatch_rebuild, rebuild_campaigns, run_progress, start_run
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every campaign\'s metrics of a tenant from the event store, in parallel Celery tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', '--tenant_id', dest='tenant_id', type=int, required=True, help='Tenant to rebuild')
+        parser.add_argument('--workers', type=int, default=4, help='Number of parallel rebuild tasks')
+        parser.add_argument('--full', action='store_true', help='Ignore snapshots and replay from the first event')
+        parser.add_argument('--inline', action='store_true', help='Rebuild in this process instead of on Celery workers')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds between progress reports')
+
+    def handle(self, *args, **options):
+        tenant_id, workers = options['tenant_id'], options['workers']
+        use_snapshot = not options['full']
+        if workers < 1:
+            raise CommandError('--workers must be at least 1')
+
+        started = time.time()
+        if options['inline']:
+            campaign_ids = campaign_ids_with_events(tenant_id)
+            run_id = start_run(tenant_id, len(campaign_ids))
+            self.stdout.write(f'🔄 Rebuilding {len(campaign_ids)} campaigns of tenant {tenant_id} inline')
+            results = [rebuild_campaigns(tenant_id, campaign_ids, run_id, use_snapshot)]
+        else:
+            run_id, result = dispatch_rebuild(tenant_id, workers, use_snapshot)
+            self.stdout.write(f'🚀 Dispatched rebuild {run_id} to {workers} workers')
+            while not result.ready():
+                time.sleep(options['poll'])
+                progress = run_progress(run_id)
+                if progress:
+                    self.stdout.write(
+                        f'   ⏳ {progress["done"] + progress["failed"]}/{progress["total"]} campaigns, '
+                        f'{progress["events"]:,} events, {progress["elapsed_seconds"]}s'
+                    )
+            results = result.get(propagate=False)
+
+        progress = run_progress(run_id) or self.summarize(results, started)
+        if progress['failed']:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️  {progress["failed"]} of {progress["total"]} campaigns failed; see the worker logs'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Rebuilt {progress["done"]} campaigns ({progress["events"]:,} events) '
+            f'in {progress["elapsed_seconds"]}s'
+        ))
+
+    def summarize(self, results, started):
+        """Progress rebuilt from the task results, when the run's cache counters are gone"""
+        results = [result for result in results if isinstance(result, dict)]
+        done = sum(result['rebuilt'] for result in results)
+        failed = sum(len(result['failed']) for result in results)
+        return {
+            'total': done + failed,
+            'done': done,
+            'failed': failed,
+            'events': sum(result['events'] for result in results),
+            'elapsed_seconds': round(time.time() - started, 1),
+        }
@@ -0,0 +1,31 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.analytics.counters import compact_counters, reconcile_counters
+from apps.analytics.models import AdEvent
+
+
+class Command(BaseCommand):
+    help = 'Recount the pre-aggregated event counters from AdEvent (also seeds them for existing events)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, help='Only this tenant (default: every tenant with events)')
+        parser.add_argument('--hours', type=int, default=48, help='Recount this many closed hours')
+        parser.add_argument('--full', action='store_true', help='Recount every hour since the oldest event')
+
+    def handle(self, *args, **options):
+        compacted = compact_counters()
+        self.stdout.write(f'🗜️  Compacted {compacted:,} minute counters')
+
+        if options['tenant_id'] is not None:
+            tenants = [options['tenant_id']]
+        else:
+            tenants = sorted(set(AdEvent.objects.values_list('tenant_id', flat=True).distinct()))
+        start = None if options['full'] else timezone.now() - timedelta(hours=options['hours'])
+
+        for tenant_id in tenants:
+            result = reconcile_counters(tenant_id, start)
+            style = self.style.WARNING if result['drift'] else self.style.SUCCESS
+            self.stdout.write(style(
+                f'✅ Tenant {tenant_id}: {result["hours"]:,} hours recounted, drift {result["drift"]:,}'
+            ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from apps.analytics.aggregates import verify_replay
+from apps.analytics.events import replay_events
+
+
+class Command(BaseCommand):
+    help = 'Rebuild a campaign\'s metrics from its events, or verify snapshots against a full replay'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, required=True, help='Tenant of the campaign')
+        parser.add_argument('--campaign_id', type=int, required=True, help='Campaign aggregate to replay')
+        parser.add_argument('--full', action='store_true', help='Ignore snapshots and replay from the first event')
+        parser.add_argument('--verify', action='store_true', help='Compare snapshot-based and full replays without writing')
+
+    def handle(self, *args, **options):
+        tenant_id, campaign_id = options['tenant_id'], options['campaign_id']
+
+        if options['verify']:
+            result = verify_replay(tenant_id, campaign_id)
+            self.stdout.write(
+                f'🔍 {result["events"]:,} events, last sequence {result["last_sequence"]}, '
+                f'snapshot at {result["snapshot_sequence"]}'
+            )
+            if result['match']:
+                self.stdout.write(self.style.SUCCESS('✅ Snapshot replay matches the full replay'))
+            else:
+                self.stdout.write(self.style.ERROR(f'❌ Mismatched fields: {", ".join(result["differences"])}'))
+            return
+
+        replayed = replay_events(campaign_id, tenant_id, use_snapshot=not options['full'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Replayed {len(replayed):,} events for campaign {campaign_id}'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.projections import PROJECTIONS, projection_lag, reset_projection, run_projections
+
+
+class Command(BaseCommand):
+    help = 'Run, reset or inspect the checkpointed AdEvent projections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projection', action='append', choices=sorted(PROJECTIONS), help='Only this projection (repeatable)')
+        parser.add_argument('--shard', type=int, default=0, help='Shard handled by this worker')
+        parser.add_argument('--shards', type=int, default=1, help='Total number of shards')
+        parser.add_argument('--tenant_id', type=int, help='Limit --reset and --lag to one tenant')
+        parser.add_argument('--reset', action='store_true', help='Clear the read model and rewind the checkpoint, then exit')
+        parser.add_argument('--lag', action='store_true', help='Only print how far each projection trails')
+
+    def handle(self, *args, **options):
+        names = options['projection']
+        if not 0 <= options['shard'] < options['shards']:
+            raise CommandError('--shard must be between 0 and --shards - 1')
+
+        if options['lag']:
+            for row in projection_lag(options['tenant_id'], names):
+                self.stdout.write(
+                    f'📏 {row["projection"]} tenant {row["tenant_id"]}: at {row["position"]} of {row["head"]}, '
+                    f'{row["events_behind"]:,} events / {row["seconds_behind"]}s behind'
+                )
+            return
+
+        if options['reset']:
+            if not names:
+                raise CommandError('--reset needs --projection')
+            for name in names:
+                tenants = reset_projection(name, options['tenant_id'])
+                self.stdout.write(f'🧹 Reset {name} for {tenants} tenants')
+            return
+
+        report = run_projections(options['shard'], options['shards'], names)
+        if report['busy']:
+            self.stdout.write(self.style.WARNING(f'⚠️  Skipped, held by another worker: {report["busy"]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Projected {report["events"]:,} events on shard {options["shard"]}/{options["shards"]}'
+        ))
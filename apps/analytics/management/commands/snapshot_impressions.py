@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.columnar import write_snapshot, snapshot_path, np
+
+
+class Command(BaseCommand):
+    help = 'Dump a tenant\'s impressions into memory-mappable NumPy column files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant_id', type=int, required=True, help='Tenant to snapshot')
+        parser.add_argument('--chunk_size', type=int, default=10000, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('NumPy is required for columnar snapshots')
+
+        tenant_id = options['tenant_id']
+        self.stdout.write(f'🚀 Snapshotting impressions for tenant {tenant_id}')
+
+        def progress(rows, total):
+            if rows == total or rows % (options['chunk_size'] * 50) == 0:
+                self.stdout.write(f'Progress: {rows / total * 100:.1f}% ({rows:,}/{total:,})')
+
+        manifest = write_snapshot(tenant_id, chunk_size=options['chunk_size'], progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Wrote {manifest["rows"]:,} rows to {snapshot_path(tenant_id)}'
+            )
+        )
@@ -0,0 +1,133 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CampaignReach",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("campaign_id", models.BigIntegerField()),
+                ("user_id", models.BigIntegerField()),
+                ("first_seen", models.DateTimeField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "campaign_id", "user_id"),
+                        name="unique_campaign_reach_user",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ImpressionDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("campaign_id", models.BigIntegerField()),
+                ("date", models.DateField()),
+                ("impressions", models.BigIntegerField(default=0)),
+                (
+                    "spend",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=16),
+                ),
+                ("unique_users", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "campaign_id", "date"),
+                        name="unique_daily_rollup_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ImpressionHourlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("campaign_id", models.BigIntegerField()),
+                ("ad_id", models.BigIntegerField()),
+                ("hour", models.DateTimeField()),
+                ("impressions", models.BigIntegerField(default=0)),
+                (
+                    "spend",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=16),
+                ),
+                ("unique_users", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tenant_id", "hour"],
+                        name="analytics_i_tenant__05b774_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "campaign_id", "ad_id", "hour"),
+                        name="unique_hourly_rollup_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("name", models.CharField(max_length=50)),
+                ("position", models.DateTimeField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "name"), name="unique_rollup_watermark"
+                    )
+                ],
+            },
+        ),
+    ]
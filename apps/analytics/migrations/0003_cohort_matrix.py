@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0002_impression_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CohortCell",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("cohort_date", models.DateField()),
+                ("period_days", models.IntegerField()),
+                ("active_users", models.BigIntegerField(default=0)),
+                ("impressions", models.BigIntegerField(default=0)),
+                (
+                    "spend",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=16),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "cohort_date", "period_days"),
+                        name="unique_cohort_cell",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="UserFirstSeen",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("user_id", models.BigIntegerField()),
+                ("first_seen", models.DateField()),
+                ("last_active", models.DateField(null=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "user_id"), name="unique_user_first_seen"
+                    )
+                ],
+            },
+        ),
+    ]
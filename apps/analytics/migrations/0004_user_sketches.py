@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0003_cohort_matrix"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UniqueUserSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("campaign_id", models.BigIntegerField()),
+                ("hour", models.DateTimeField()),
+                ("registers", models.BinaryField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tenant_id", "hour"],
+                        name="analytics_u_tenant__20c94f_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "campaign_id", "hour"),
+                        name="unique_user_sketch_bucket",
+                    )
+                ],
+            },
+        ),
+    ]
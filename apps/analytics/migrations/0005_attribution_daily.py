@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0004_user_sketches"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AttributionDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("model", models.CharField(max_length=30)),
+                ("campaign_id", models.BigIntegerField()),
+                ("date", models.DateField()),
+                (
+                    "conversions",
+                    models.DecimalField(decimal_places=6, default=0, max_digits=16),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=16),
+                ),
+                ("touches", models.BigIntegerField(default=0)),
+                (
+                    "journey_days",
+                    models.DecimalField(decimal_places=6, default=0, max_digits=16),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "model", "campaign_id", "date"),
+                        name="unique_attribution_daily",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+TABLES = ['campaigns_impression', 'analytics_adevent']
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    from apps.analytics.partitions import is_partitioned, partition_table
+
+    for table in TABLES:
+        if not is_partitioned(table):
+            partition_table(table)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    from apps.analytics.partitions import is_partitioned, unpartition_table
+
+    for table in TABLES:
+        if is_partitioned(table):
+            unpartition_table(table)
+
+
+class Migration(migrations.Migration):
+    # MySQL commits DDL implicitly, so there is no transaction to wrap this in
+    atomic = False
+
+    dependencies = [
+        ("analytics", "0005_attribution_daily"),
+        ("campaigns", "0004_impression_ad_no_constraint"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """Start each aggregate's counter after its highest existing number.
+
+    History is left as it is: events used to be numbered with a table-wide
+    COUNT(*) + 1, so old numbers may collide or skip within an aggregate,
+    and renumbering them would rewrite the whole table in one statement.
+    validate_event_sequence reports those as duplicates and gaps.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO analytics_eventsequence (tenant_id, aggregate_id, last_value)
+            SELECT tenant_id, aggregate_id, MAX(sequence_number)
+            FROM analytics_adevent
+            GROUP BY tenant_id, aggregate_id
+        """)
+
+
+def add_sequence_key(apps, schema_editor):
+    """Key AdEvent on (tenant_id, aggregate_id, sequence_number).
+
+    The key is UNIQUE unless the table is partitioned on MySQL, which only
+    accepts unique keys containing the partition column, or already holds
+    duplicate numbers; both get a plain index, which event pages still
+    need for their range scans. Where it is not unique, nothing in the
+    database stops duplicate numbers: the EventSequence row lock is the
+    only guard. The SQL is kept here, not imported, so this migration
+    keeps doing the same thing whatever the app code becomes.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if "unique_event_sequence" in connection.introspection.get_constraints(cursor, "analytics_adevent"):
+            return
+        cursor.execute("""
+            SELECT 1 FROM analytics_adevent
+            GROUP BY tenant_id, aggregate_id, sequence_number
+            HAVING COUNT(*) > 1
+            LIMIT 1
+        """)
+        duplicates = cursor.fetchone() is not None
+        partitioned = False
+        if connection.vendor == "mysql":
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'analytics_adevent'
+                AND PARTITION_NAME IS NOT NULL
+            """)
+            partitioned = cursor.fetchone()[0] > 0
+    unique = "" if partitioned or duplicates else "UNIQUE "
+    schema_editor.execute(
+        f"CREATE {unique}INDEX unique_event_sequence ON analytics_adevent (tenant_id, aggregate_id, sequence_number)"
+    )
+
+
+def remove_sequence_key(apps, schema_editor):
+    on_table = " ON analytics_adevent" if schema_editor.connection.vendor == "mysql" else ""
+    schema_editor.execute(f"DROP INDEX unique_event_sequence{on_table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0006_partition_event_tables"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("aggregate_id", models.CharField(max_length=100)),
+                ("last_value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="eventsequence",
+            constraint=models.UniqueConstraint(
+                fields=("tenant_id", "aggregate_id"),
+                name="unique_event_sequence_counter",
+            ),
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+        migrations.RunPython(add_sequence_key, remove_sequence_key),
+    ]
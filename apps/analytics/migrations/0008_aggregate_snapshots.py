@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0007_event_sequences"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="campaignmetrics",
+            name="unique_users",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="AggregateSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("aggregate_id", models.CharField(max_length=100)),
+                ("sequence_number", models.BigIntegerField()),
+                ("event_count", models.BigIntegerField()),
+                ("state", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant_id", "aggregate_id", "sequence_number"),
+                        name="unique_aggregate_snapshot",
+                    )
+                ],
+            },
+        ),
+    ]
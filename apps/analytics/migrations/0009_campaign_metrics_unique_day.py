@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:08
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_days(apps, schema_editor):
+    """Keep the newest row of each (tenant, campaign, day) written before the key existed"""
+    CampaignMetrics = apps.get_model("analytics", "CampaignMetrics")
+    duplicates = (
+        CampaignMetrics.objects.values("tenant_id", "campaign_id", "date")
+        .annotate(rows=Count("id"), keep=Max("id"))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        CampaignMetrics.objects.filter(
+            tenant_id=row["tenant_id"], campaign_id=row["campaign_id"], date=row["date"]
+        ).exclude(id=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0008_aggregate_snapshots"),
+        ("campaigns", "0004_impression_ad_no_constraint"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="campaignmetrics",
+            constraint=models.UniqueConstraint(
+                fields=("tenant_id", "campaign", "date"),
+                name="unique_campaign_metrics_day",
+            ),
+        ),
+    ]
@@ -0,0 +1,14 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Used to (re)create the sequence key; 0007 creates it now, and this
+    # migration is kept only so the migration graph stays the same
+
+    dependencies = [
+        ("analytics", "0009_campaign_metrics_unique_day"),
+    ]
+
+    operations = []
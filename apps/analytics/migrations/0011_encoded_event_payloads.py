@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:12
+
+import apps.analytics.codec
+from django.db import migrations
+
+
+def restore_sequence_key(apps, schema_editor):
+    # SQLite rebuilds the table for AlterField and drops keys outside the
+    # state; other databases keep the key 0007 created
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if "unique_event_sequence" in connection.introspection.get_constraints(cursor, "analytics_adevent"):
+            return
+        cursor.execute("""
+            SELECT 1 FROM analytics_adevent
+            GROUP BY tenant_id, aggregate_id, sequence_number
+            HAVING COUNT(*) > 1
+            LIMIT 1
+        """)
+        unique = "" if cursor.fetchone() is not None else "UNIQUE "
+    schema_editor.execute(
+        f"CREATE {unique}INDEX unique_event_sequence ON analytics_adevent (tenant_id, aggregate_id, sequence_number)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0010_event_sequence_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="adevent",
+            name="payload",
+            field=apps.analytics.codec.EventPayloadField(),
+        ),
+        migrations.RunPython(restore_sequence_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0011_encoded_event_payloads"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectionCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50)),
+                ("tenant_id", models.IntegerField()),
+                ("position", models.BigIntegerField(default=0)),
+                ("events", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("name", "tenant_id"),
+                        name="unique_projection_checkpoint",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0012_projection_checkpoints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventArchiveSegment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("day", models.DateField()),
+                ("path", models.CharField(max_length=255, unique=True)),
+                ("first_id", models.BigIntegerField()),
+                ("last_id", models.BigIntegerField()),
+                ("events", models.IntegerField()),
+                ("size_bytes", models.BigIntegerField()),
+                ("cutoff", models.DateTimeField()),
+                ("purged", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tenant_id", "day"],
+                        name="analytics_e_tenant__e5963b_idx",
+                    )
+                ],
+            },
+        ),
+    ]
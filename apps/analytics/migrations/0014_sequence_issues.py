@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0013_event_archive_segments"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SequenceIssue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("aggregate_id", models.CharField(max_length=100)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("gap", "Gap"), ("duplicate", "Duplicate")],
+                        max_length=10,
+                    ),
+                ),
+                ("first_sequence", models.BigIntegerField()),
+                ("last_sequence", models.BigIntegerField()),
+                ("event_id", models.BigIntegerField()),
+                ("detected_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tenant_id", "aggregate_id"],
+                        name="analytics_s_tenant__339710_idx",
+                    )
+                ],
+            },
+        ),
+    ]
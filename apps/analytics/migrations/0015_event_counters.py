@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0014_sequence_issues"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("event_type", models.CharField(max_length=50)),
+                ("granularity", models.CharField(max_length=6)),
+                ("bucket", models.DateTimeField()),
+                ("slot", models.SmallIntegerField(default=0)),
+                ("count", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["granularity", "bucket"],
+                        name="analytics_e_granula_c68a3f_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "tenant_id",
+                            "event_type",
+                            "granularity",
+                            "bucket",
+                            "slot",
+                        ),
+                        name="unique_event_counter_bucket",
+                    )
+                ],
+            },
+        ),
+    ]
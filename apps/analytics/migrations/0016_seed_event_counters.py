@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def seed_counters(apps, schema_editor):
+    """Count the events written before the counters existed into hourly buckets.
+
+    Events written from here on are counted as they are inserted, and
+    compaction and reconciliation add to or replace these buckets.
+    """
+    AdEvent = apps.get_model("analytics", "AdEvent")
+    EventCounter = apps.get_model("analytics", "EventCounter")
+    rows = (
+        AdEvent.objects.order_by()
+        .annotate(hour=TruncHour("timestamp"))
+        .values("tenant_id", "event_type", "hour")
+        .annotate(events=Count("id"))
+    )
+    EventCounter.objects.bulk_create(
+        [
+            EventCounter(
+                tenant_id=row["tenant_id"],
+                event_type=row["event_type"],
+                granularity="hour",
+                bucket=row["hour"],
+                count=row["events"],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+def clear_counters(apps, schema_editor):
+    apps.get_model("analytics", "EventCounter").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0015_event_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, clear_counters),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0016_seed_event_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventarchivesegment",
+            name="aggregates_recorded",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name="EventArchiveAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.IntegerField()),
+                ("aggregate_id", models.CharField(max_length=100)),
+                ("first_sequence", models.BigIntegerField()),
+                ("last_sequence", models.BigIntegerField()),
+                ("events", models.IntegerField()),
+                (
+                    "segment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="aggregates",
+                        to="analytics.eventarchivesegment",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tenant_id", "aggregate_id", "last_sequence"],
+                        name="analytics_e_tenant__4ab5d9_idx",
+                    )
+                ],
+            },
+        ),
+    ]
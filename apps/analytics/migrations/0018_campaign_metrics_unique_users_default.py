@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0017_event_archive_aggregates"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="campaignmetrics",
+            name="unique_users",
+            field=models.BigIntegerField(db_default=0, default=0),
+        ),
+    ]
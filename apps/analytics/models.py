@@ -1,7 +1,17 @@
 from django.db import models
+from .codec import EventPayloadField
 
 # Create your models here.
 class CampaignMetrics(models.Model):
+    class Meta:
+        constraints = [
+            # One row per campaign and day; rebuilds and the daily job upsert into it
+            models.UniqueConstraint(
+                fields=['tenant_id', 'campaign', 'date'],
+                name='unique_campaign_metrics_day'
+            )
+        ]
+
     tenant_id = models.IntegerField(db_index=True)
     campaign = models.ForeignKey('campaigns.Campaign', on_delete=models.CASCADE)
     date = models.DateField()
@@ -9,13 +19,18 @@ class CampaignMetrics(models.Model):
     clicks = models.BigIntegerField(default=0)
     conversions = models.BigIntegerField(default=0)
     spend = models.DecimalField(max_digits=12, decimal_places=2)
+    unique_users = models.BigIntegerField(default=0, db_default=0)
 
 
 class AdEvent(models.Model):
+    # (tenant_id, aggregate_id, sequence_number) is keyed by migration 0007
+    # rather than declared here: unique on an unpartitioned table, a plain
+    # index on the partitioned MySQL table, where the database does not stop
+    # duplicates and only the EventSequence row lock keeps them out
     tenant_id = models.IntegerField(db_index=True)
     event_type = models.CharField(max_length=50)  # impression, click, conversion
     aggregate_id = models.CharField(max_length=100)  # campaign_id
-    payload = models.JSONField()
+    payload = EventPayloadField()  # Encoded by apps.analytics.codec
     timestamp = models.DateTimeField(auto_now_add=True)
     sequence_number = models.BigIntegerField()
 
@@ -27,4 +42,290 @@ class AdvertiserAccount(models.Model):
 class Creative(models.Model):
     tenant_id = models.IntegerField(db_index=True)
     name = models.CharField(max_length=100)
-    asset_url = models.URLField()
\ No newline at end of file
+    asset_url = models.URLField()
+
+
+class ImpressionHourlyRollup(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'campaign_id', 'ad_id', 'hour'],
+                name='unique_hourly_rollup_bucket'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['tenant_id', 'hour']),
+        ]
+
+    # ad_id = 0 rows hold the campaign-wide totals for the hour, so distinct
+    # users stay exact at campaign level instead of being summed across ads.
+    tenant_id = models.IntegerField()
+    campaign_id = models.BigIntegerField()
+    ad_id = models.BigIntegerField()
+    hour = models.DateTimeField()
+    impressions = models.BigIntegerField(default=0)
+    spend = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    unique_users = models.BigIntegerField(default=0)
+
+
+class ImpressionDailyRollup(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'campaign_id', 'date'],
+                name='unique_daily_rollup_bucket'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    campaign_id = models.BigIntegerField()
+    date = models.DateField()
+    impressions = models.BigIntegerField(default=0)
+    spend = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    unique_users = models.BigIntegerField(default=0)
+
+
+class CampaignReach(models.Model):
+    """Distinct (campaign, user) pairs seen before the rollup watermark"""
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'campaign_id', 'user_id'],
+                name='unique_campaign_reach_user'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    campaign_id = models.BigIntegerField()
+    user_id = models.BigIntegerField()
+    first_seen = models.DateTimeField()
+
+
+class RollupWatermark(models.Model):
+    """Everything strictly before `position` has been folded into the aggregate"""
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'name'],
+                name='unique_rollup_watermark'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    name = models.CharField(max_length=50)
+    position = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class UserFirstSeen(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'user_id'],
+                name='unique_user_first_seen'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    user_id = models.BigIntegerField()
+    first_seen = models.DateField()
+    # Last day already counted as active in the cohort matrix
+    last_active = models.DateField(null=True)
+
+
+class CohortCell(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'cohort_date', 'period_days'],
+                name='unique_cohort_cell'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    cohort_date = models.DateField()
+    period_days = models.IntegerField()
+    active_users = models.BigIntegerField(default=0)
+    impressions = models.BigIntegerField(default=0)
+    spend = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+
+
+class UniqueUserSketch(models.Model):
+    """HyperLogLog registers (zlib-compressed) of the users a campaign reached in an hour"""
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'campaign_id', 'hour'],
+                name='unique_user_sketch_bucket'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['tenant_id', 'hour']),
+        ]
+
+    tenant_id = models.IntegerField()
+    campaign_id = models.BigIntegerField()
+    hour = models.DateTimeField()
+    registers = models.BinaryField()
+
+
+class AttributionDaily(models.Model):
+    """Conversion credit per campaign and conversion day under one attribution model.
+
+    Credit is fractional: a conversion spreads a total weight of 1 over the
+    campaigns of the touches in its lookback window.
+    """
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'model', 'campaign_id', 'date'],
+                name='unique_attribution_daily'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    model = models.CharField(max_length=30)
+    campaign_id = models.BigIntegerField()
+    date = models.DateField()
+    conversions = models.DecimalField(max_digits=16, decimal_places=6, default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    touches = models.BigIntegerField(default=0)
+    # Weighted sum of days from first touch to conversion
+    journey_days = models.DecimalField(max_digits=16, decimal_places=6, default=0)
+
+
+class EventSequence(models.Model):
+    """Highest sequence number handed out for an event-store aggregate"""
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'aggregate_id'],
+                name='unique_event_sequence_counter'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    aggregate_id = models.CharField(max_length=100)
+    last_value = models.BigIntegerField(default=0)
+
+
+class AggregateSnapshot(models.Model):
+    """Serialized aggregate state after folding every event up to `sequence_number`"""
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'aggregate_id', 'sequence_number'],
+                name='unique_aggregate_snapshot'
+            )
+        ]
+
+    tenant_id = models.IntegerField()
+    aggregate_id = models.CharField(max_length=100)
+    sequence_number = models.BigIntegerField()
+    event_count = models.BigIntegerField()
+    state = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class ProjectionCheckpoint(models.Model):
+    """A projection has applied every AdEvent of the tenant up to id `position`"""
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'tenant_id'],
+                name='unique_projection_checkpoint'
+            )
+        ]
+
+    name = models.CharField(max_length=50)
+    tenant_id = models.IntegerField()
+    position = models.BigIntegerField(default=0)
+    events = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class EventArchiveSegment(models.Model):
+    """A compressed NDJSON file holding a tenant's events first_id..last_id of one day"""
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant_id', 'day']),
+        ]
+
+    tenant_id = models.IntegerField()
+    day = models.DateField()
+    path = models.CharField(max_length=255, unique=True)
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    events = models.IntegerField()
+    size_bytes = models.BigIntegerField()
+    # Events in the id range older than this were exported
+    cutoff = models.DateTimeField()
+    # The exported rows are gone from AdEvent
+    purged = models.BooleanField(default=False)
+    # Sequence ranges per aggregate were recorded (segments written before them have none)
+    aggregates_recorded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class EventArchiveAggregate(models.Model):
+    """The sequence range of one aggregate's events in an archive segment"""
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant_id', 'aggregate_id', 'last_sequence']),
+        ]
+
+    segment = models.ForeignKey(EventArchiveSegment, on_delete=models.CASCADE, related_name='aggregates')
+    tenant_id = models.IntegerField()
+    aggregate_id = models.CharField(max_length=100)
+    first_sequence = models.BigIntegerField()
+    last_sequence = models.BigIntegerField()
+    events = models.IntegerField()
+
+
+class SequenceIssue(models.Model):
+    """A gap or duplicate found in an aggregate's sequence numbers by the integrity monitor"""
+    GAP = 'gap'
+    DUPLICATE = 'duplicate'
+    KINDS = [(GAP, 'Gap'), (DUPLICATE, 'Duplicate')]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant_id', 'aggregate_id']),
+        ]
+
+    tenant_id = models.IntegerField()
+    aggregate_id = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # Missing numbers for a gap, the repeated number for a duplicate
+    first_sequence = models.BigIntegerField()
+    last_sequence = models.BigIntegerField()
+    event_id = models.BigIntegerField()  # The event found after the gap, or the repeat
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+
+class EventCounter(models.Model):
+    """AdEvents per tenant, event_type and minute or hour, maintained as events are written.
+
+    Writers add to one of ANALYTICS_EVENT_COUNTER_SLOTS rows of a bucket
+    so they do not all queue on the same row lock; readers sum the slots.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant_id', 'event_type', 'granularity', 'bucket', 'slot'],
+                name='unique_event_counter_bucket'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket']),
+        ]
+
+    tenant_id = models.IntegerField()
+    event_type = models.CharField(max_length=50)
+    granularity = models.CharField(max_length=6)
+    bucket = models.DateTimeField()
+    slot = models.SmallIntegerField(default=0)
+    count = models.BigIntegerField(default=0)
@@ -0,0 +1,234 @@
+# apps/analytics/partitions.py
+"""Native RANGE partitioning for the append-only event tables.
+
+Each partitioned table is split on RANGE COLUMNS(timestamp) into
+calendar periods named after the first day they hold (p20240301), plus a
+`pmax` catch-all that should stay empty. Maintenance carves upcoming
+periods out of `pmax` ahead of time and retires whole expired periods
+with DROP PARTITION, or EXCHANGE PARTITION into an archive table. Both are
+metadata operations, unlike a DELETE over millions of rows.
+
+MySQL refuses foreign keys on partitioned tables and requires the
+partition column in every unique key. The partitioned tables therefore
+have no FK constraints and a (id, timestamp) primary key; Django still
+treats `id` as the primary key, and the auto-increment keeps it unique.
+Other unique keys are kept as plain indexes, so they still serve lookups
+but no longer enforce uniqueness.
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CATCH_ALL = 'pmax'
+
+# table -> (period, retention setting, default retention in days; None keeps everything)
+PARTITIONED_TABLES = {
+    'campaigns_impression': ('month', 'ANALYTICS_IMPRESSION_RETENTION_DAYS', None),
+    'analytics_adevent': ('day', 'ANALYTICS_EVENT_RETENTION_DAYS', 30),
+}
+
+# How many periods past the current one always exist
+PREMAKE_PERIODS = {'month': 3, 'day': 14}
+
+
+def retention_days(table: str) -> Optional[int]:
+    _, setting, default = PARTITIONED_TABLES[table]
+    return getattr(settings, setting, default)
+
+
+def period_start(value: date, period: str) -> date:
+    return value.replace(day=1) if period == 'month' else value
+
+
+def next_period(value: date, period: str) -> date:
+    if period == 'month':
+        return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return value + timedelta(days=1)
+
+
+def partition_name(start: date) -> str:
+    return f'p{start:%Y%m%d}'
+
+
+def _partition_clause(start: date, period: str) -> str:
+    return f"PARTITION {partition_name(start)} VALUES LESS THAN ('{next_period(start, period):%Y-%m-%d}')"
+
+
+def _today() -> date:
+    # Timestamps are stored in UTC, so period boundaries are UTC days
+    return timezone.now().astimezone(dt_timezone.utc).date()
+
+
+def list_partitions(table: str) -> List[Tuple[str, Optional[date], int]]:
+    """(name, exclusive upper bound or None for MAXVALUE, estimated rows) in range order"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """, [table])
+        rows = cursor.fetchall()
+    partitions = []
+    for name, description, table_rows in rows:
+        bound = None
+        if description != 'MAXVALUE':
+            bound = datetime.strptime(description.strip("'")[:10], '%Y-%m-%d').date()
+        partitions.append((name, bound, table_rows or 0))
+    return partitions
+
+
+def is_partitioned(table: str) -> bool:
+    return connection.vendor == 'mysql' and bool(list_partitions(table))
+
+
+def partition_table(table: str, today: Optional[date] = None):
+    """One-off conversion of an existing table; copies the table once"""
+    period = PARTITIONED_TABLES[table][0]
+    today = today or _today()
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(timestamp) FROM {table}")
+        oldest = cursor.fetchone()[0]
+        start = period_start(oldest.date() if oldest else today, period)
+
+        clauses = []
+        horizon = today
+        for _ in range(PREMAKE_PERIODS[period]):
+            horizon = next_period(horizon, period)
+        while start <= horizon:
+            clauses.append(_partition_clause(start, period))
+            start = next_period(start, period)
+        clauses.append(f"PARTITION {CATCH_ALL} VALUES LESS THAN (MAXVALUE)")
+
+        cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+        _demote_unique_keys(cursor, table)
+        cursor.execute(
+            f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS(timestamp) ({', '.join(clauses)})"
+        )
+    logger.info(f"Partitioned {table} into {len(clauses)} partitions")
+
+
+def _demote_unique_keys(cursor, table: str):
+    """Replace unique keys lacking the partition column with plain indexes of the same name"""
+    cursor.execute("""
+        SELECT INDEX_NAME, GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX)
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'
+        GROUP BY INDEX_NAME
+    """, [table])
+    for name, columns in cursor.fetchall():
+        if 'timestamp' not in columns.split(','):
+            cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}, ADD INDEX {name} ({columns})")
+            logger.info(f"Unique key {name} of {table} is a plain index while partitioned")
+
+
+def unpartition_table(table: str):
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} REMOVE PARTITIONING")
+        cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+
+
+def create_future_partitions(table: str, today: Optional[date] = None) -> List[str]:
+    """Split upcoming periods off the (empty) catch-all partition"""
+    period = PARTITIONED_TABLES[table][0]
+    today = today or _today()
+    bounds = [bound for _, bound, _ in list_partitions(table) if bound]
+    if not bounds:
+        return []
+
+    horizon = today
+    for _ in range(PREMAKE_PERIODS[period]):
+        horizon = next_period(horizon, period)
+    start, created = bounds[-1], []
+    while start <= horizon:
+        created.append(start)
+        start = next_period(start, period)
+    if not created:
+        return []
+
+    clauses = [_partition_clause(start, period) for start in created]
+    clauses.append(f"PARTITION {CATCH_ALL} VALUES LESS THAN (MAXVALUE)")
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {CATCH_ALL} INTO ({', '.join(clauses)})")
+    names = [partition_name(start) for start in created]
+    logger.info(f"Created partitions {names} on {table}")
+    return names
+
+
+def _archive_partition(cursor, table: str, name: str) -> str:
+    archive = f'{table}_archive_{name[1:]}'
+    cursor.execute(f"CREATE TABLE {archive} LIKE {table}")
+    cursor.execute(f"ALTER TABLE {archive} REMOVE PARTITIONING")
+    cursor.execute(f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {archive}")
+    return archive
+
+
+def drop_expired_partitions(table: str, cutoff: datetime, archive: bool = False) -> Dict[str, Any]:
+    """Retire every partition holding only rows older than `cutoff`.
+
+    With `archive` the rows are swapped into a standalone
+    `<table>_archive_<yyyymmdd>` table before the emptied partition is
+    dropped. The oldest partition also holds anything older than its own
+    period, so it is only retired once its upper bound has expired too.
+    """
+    cutoff_date = cutoff.astimezone(dt_timezone.utc).date() if timezone.is_aware(cutoff) else cutoff.date()
+    expired = [
+        (name, rows) for name, bound, rows in list_partitions(table)
+        if bound is not None and bound <= cutoff_date
+    ]
+    archived = []
+    with connection.cursor() as cursor:
+        for name, _ in expired:
+            if archive:
+                archived.append(_archive_partition(cursor, table, name))
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+    if expired:
+        logger.info(f"Retired partitions {[name for name, _ in expired]} of {table}")
+    return {
+        'dropped': [name for name, _ in expired],
+        'archived': archived,
+        'rows_estimate': sum(rows for _, rows in expired),
+    }
+
+
+def maintain_partitions(tables=None, archive: bool = False, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Pre-create upcoming partitions and retire expired ones on every partitioned table"""
+    from .archive import archive_enabled, archive_expired_events
+    now = now or timezone.now()
+    report = {}
+    for table in tables or PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            report[table] = {'partitioned': False}
+            continue
+        created = create_future_partitions(table, now.astimezone(dt_timezone.utc).date())
+        days = retention_days(table)
+        if days and table == 'analytics_adevent' and not archive and archive_enabled():
+            # Export the expiring days to segment files before their partitions go
+            retired = archive_expired_events(now - timedelta(days=days))
+        else:
+            retired = drop_expired_partitions(table, now - timedelta(days=days), archive) if days else None
+        report[table] = {'partitioned': True, 'created': created, 'retired': retired}
+    return report
+
+
+def partition_status() -> Dict[str, Any]:
+    """Partition layout of every managed table, for diagnostics"""
+    status = {}
+    for table, (period, _, _) in PARTITIONED_TABLES.items():
+        partitions = list_partitions(table) if connection.vendor == 'mysql' else []
+        status[table] = {
+            'period': period,
+            'retention_days': retention_days(table),
+            'partitions': [
+                {'name': name, 'less_than': bound.isoformat() if bound else 'MAXVALUE', 'rows': rows}
+                for name, bound, rows in partitions
+            ],
+        }
+    return status
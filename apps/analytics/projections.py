@@ -0,0 +1,299 @@
+# apps/analytics/projections.py
+"""Checkpointed projections of the AdEvent stream into read models.
+
+A projection declares handlers per event_type and is fed each tenant's
+events in id order, a batch at a time. Every batch runs in one
+transaction that also moves the projection's ProjectionCheckpoint, so
+read models kept in the database are updated exactly once per event even
+when a worker dies mid-run. The checkpoint row is locked for the batch;
+a second worker reaching a tenant that is already being projected skips
+it rather than waiting.
+
+Workers split tenants by `tenant_id % shards`. Rebuilding a projection
+is a reset: its read model is cleared and the checkpoint goes back to 0.
+
+Auto-increment ids are handed out before commit, so an event can become
+visible after a higher id has been projected. Only events older than
+ANALYTICS_PROJECTION_SETTLE_SECONDS are consumed to close that window.
+"""
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from apps.analytics.models import AdEvent, CampaignMetrics, ProjectionCheckpoint, SequenceIssue
+from apps.analytics.archive import archived_through
+from apps.campaigns.models import Campaign
+
+logger = logging.getLogger(__name__)
+
+PROJECTIONS = {}
+
+
+def settle_seconds() -> int:
+    return getattr(settings, 'ANALYTICS_PROJECTION_SETTLE_SECONDS', 5)
+
+
+def handles(*event_types):
+    """Mark a Projection method as the handler of `event_types`"""
+    def decorator(method):
+        method.handles = event_types
+        return method
+    return decorator
+
+
+def register_projection(cls):
+    PROJECTIONS[cls.name] = cls()
+    return cls
+
+
+class Projection:
+    """Base class; subclasses set `name` and decorate handlers with @handles.
+
+    Handlers are called as handler(batch, event), where `batch` is the
+    object returned by start_batch and later passed to finish_batch, so a
+    projection can fold a whole batch into a few writes.
+    """
+    name = ''
+    batch_size = 1000
+    handlers: Dict[str, Any] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.handlers = {
+            event_type: attr
+            for attr in dir(cls) for event_type in getattr(getattr(cls, attr), 'handles', ())
+        }
+
+    def start_batch(self, tenant_id: int):
+        return {}
+
+    def finish_batch(self, tenant_id: int, batch):
+        pass
+
+    def reset(self, tenant_id: int):
+        """Clear the tenant's read model before it is projected again from the start"""
+
+    def apply(self, tenant_id: int, events: List[AdEvent]):
+        batch = self.start_batch(tenant_id)
+        for event in events:
+            handler = self.handlers.get(event.event_type)
+            if handler:
+                getattr(self, handler)(batch, event)
+        self.finish_batch(tenant_id, batch)
+
+
+@register_projection
+class CampaignConversionsProjection(Projection):
+    """CampaignMetrics.conversions per campaign and day, which replays leave alone"""
+    name = 'campaign_conversions'
+
+    def start_batch(self, tenant_id):
+        return Counter()
+
+    @handles('conversion_tracked')
+    def on_conversion(self, batch, event):
+        if event.aggregate_id.isdigit():
+            batch[(int(event.aggregate_id), event.timestamp.date())] += 1
+
+    def finish_batch(self, tenant_id, batch):
+        if not batch:
+            return
+        campaigns = set(Campaign.objects.filter(
+            tenant_id=tenant_id, id__in={campaign_id for campaign_id, _ in batch}
+        ).values_list('id', flat=True))
+        counts = {key: count for key, count in batch.items() if key[0] in campaigns}
+        CampaignMetrics.objects.bulk_create([
+            CampaignMetrics(tenant_id=tenant_id, campaign_id=campaign_id, date=day, spend=Decimal('0.00'))
+            for campaign_id, day in counts
+        ], ignore_conflicts=True)
+        for (campaign_id, day), count in counts.items():
+            CampaignMetrics.objects.filter(tenant_id=tenant_id, campaign_id=campaign_id, date=day).update(
+                conversions=F('conversions') + count
+            )
+
+    def reset(self, tenant_id):
+        CampaignMetrics.objects.filter(tenant_id=tenant_id).update(conversions=0)
+
+
+@register_projection
+class SequenceIntegrityProjection(Projection):
+    """Records SequenceIssue rows for gaps and duplicates in newly appended events.
+
+    Each batch is only compared with the highest sequence number its
+    aggregates had before the batch, so the check costs one indexed
+    lookup per aggregate rather than a scan of its history. A number that
+    arrives late (block allocation, ANALYTICS_SEQUENCE_BLOCK_SIZE > 1)
+    closes the part of the gap it fills.
+    """
+    name = 'sequence_integrity'
+
+    def apply(self, tenant_id, events):
+        first_id = events[0].id
+        appended = defaultdict(list)
+        for event in events:
+            appended[event.aggregate_id].append((event.sequence_number, event.id))
+        earlier = AdEvent.objects.filter(tenant_id=tenant_id, id__lt=first_id)
+
+        issues = []
+        for aggregate_id, numbers in appended.items():
+            previous = earlier.filter(aggregate_id=aggregate_id).order_by('-sequence_number').values_list(
+                'sequence_number', flat=True
+            ).first()
+            last = previous
+            if last is None:
+                # Older events may have been moved to the archive; a gap before them is still a gap
+                first = min(sequence for sequence, _ in numbers)
+                through = archived_through(tenant_id, aggregate_id)
+                last = first - 1 if through is None else min(through, first - 1)
+
+            late = [sequence for sequence, _ in numbers if sequence <= last]
+            seen = set(earlier.filter(aggregate_id=aggregate_id, sequence_number__in=late).values_list(
+                'sequence_number', flat=True
+            )) if late else set()
+            for sequence, event_id in sorted(numbers):
+                if sequence in seen or sequence == last:
+                    issues.append(SequenceIssue(
+                        tenant_id=tenant_id, aggregate_id=aggregate_id, kind=SequenceIssue.DUPLICATE,
+                        first_sequence=sequence, last_sequence=sequence, event_id=event_id,
+                    ))
+                elif sequence < last:
+                    self.fill_gap(tenant_id, aggregate_id, sequence)
+                    seen.add(sequence)
+                else:
+                    if sequence > last + 1:
+                        issues.append(SequenceIssue(
+                            tenant_id=tenant_id, aggregate_id=aggregate_id, kind=SequenceIssue.GAP,
+                            first_sequence=last + 1, last_sequence=sequence - 1, event_id=event_id,
+                        ))
+                    last = sequence
+        SequenceIssue.objects.bulk_create(issues)
+
+    def fill_gap(self, tenant_id, aggregate_id, sequence):
+        gap = SequenceIssue.objects.filter(
+            tenant_id=tenant_id, aggregate_id=aggregate_id, kind=SequenceIssue.GAP,
+            first_sequence__lte=sequence, last_sequence__gte=sequence,
+        ).first()
+        if gap is None:
+            return
+        if gap.first_sequence < sequence < gap.last_sequence:
+            SequenceIssue.objects.create(
+                tenant_id=tenant_id, aggregate_id=aggregate_id, kind=SequenceIssue.GAP,
+                first_sequence=sequence + 1, last_sequence=gap.last_sequence, event_id=gap.event_id,
+            )
+            gap.last_sequence = sequence - 1
+        elif gap.first_sequence == gap.last_sequence:
+            gap.delete()
+            return
+        elif sequence == gap.first_sequence:
+            gap.first_sequence += 1
+        else:
+            gap.last_sequence -= 1
+        gap.save(update_fields=['first_sequence', 'last_sequence'])
+
+    def reset(self, tenant_id):
+        SequenceIssue.objects.filter(tenant_id=tenant_id).delete()
+
+
+def _lock_checkpoint(name: str, tenant_id: int) -> Optional[ProjectionCheckpoint]:
+    """The locked checkpoint, or None while another worker holds it"""
+    try:
+        with transaction.atomic():
+            ProjectionCheckpoint.objects.get_or_create(name=name, tenant_id=tenant_id)
+    except IntegrityError:
+        pass  # Created concurrently
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    return ProjectionCheckpoint.objects.select_for_update(skip_locked=skip_locked).filter(
+        name=name, tenant_id=tenant_id
+    ).first()
+
+
+def run_projection(name: str, tenant_id: int, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """Apply the tenant's unprojected events, one committed batch at a time"""
+    projection = PROJECTIONS[name]
+    horizon = timezone.now() - timedelta(seconds=settle_seconds())
+    batches, applied, position = 0, 0, None
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            checkpoint = _lock_checkpoint(name, tenant_id)
+            if checkpoint is None:
+                return {'projection': name, 'tenant_id': tenant_id, 'busy': True, 'events': applied}
+            events = list(AdEvent.objects.filter(
+                tenant_id=tenant_id, id__gt=checkpoint.position, timestamp__lt=horizon
+            ).order_by('id')[:projection.batch_size])
+            position = checkpoint.position
+            if not events:
+                break
+            projection.apply(tenant_id, events)
+            checkpoint.position = position = events[-1].id
+            checkpoint.events += len(events)
+            checkpoint.save(update_fields=['position', 'events', 'updated_at'])
+        batches += 1
+        applied += len(events)
+        if len(events) < projection.batch_size:
+            break
+    if applied:
+        logger.info(f"Projected {applied} events into {name} for tenant {tenant_id}")
+    return {'projection': name, 'tenant_id': tenant_id, 'busy': False, 'events': applied, 'position': position}
+
+
+def shard_tenants(shard: int = 0, shards: int = 1) -> List[int]:
+    tenant_ids = AdEvent.objects.values_list('tenant_id', flat=True).distinct()
+    return sorted(tenant_id for tenant_id in tenant_ids if tenant_id % shards == shard)
+
+
+def run_projections(shard: int = 0, shards: int = 1, names=None) -> Dict[str, Any]:
+    """Run every projection (or `names`) for the tenants of one shard"""
+    results = [
+        run_projection(name, tenant_id)
+        for tenant_id in shard_tenants(shard, shards)
+        for name in names or PROJECTIONS
+    ]
+    return {
+        'shard': shard,
+        'shards': shards,
+        'events': sum(result['events'] for result in results),
+        'busy': [(result['projection'], result['tenant_id']) for result in results if result['busy']],
+    }
+
+
+def reset_projection(name: str, tenant_id: Optional[int] = None) -> int:
+    """Clear the read model and rewind the checkpoint; returns how many tenants were reset"""
+    projection = PROJECTIONS[name]
+    checkpoints = ProjectionCheckpoint.objects.filter(name=name)
+    if tenant_id is not None:
+        checkpoints = checkpoints.filter(tenant_id=tenant_id)
+    tenant_ids = list(checkpoints.values_list('tenant_id', flat=True))
+    with transaction.atomic():
+        for tenant in tenant_ids:
+            projection.reset(tenant)
+        checkpoints.update(position=0, events=0)
+    logger.info(f"Reset projection {name} for tenants {tenant_ids}")
+    return len(tenant_ids)
+
+
+def projection_lag(tenant_id: Optional[int] = None, names=None) -> List[Dict[str, Any]]:
+    """How far each projection's checkpoint trails the tenant's newest event"""
+    checkpoints = ProjectionCheckpoint.objects.filter(name__in=names or list(PROJECTIONS))
+    if tenant_id is not None:
+        checkpoints = checkpoints.filter(tenant_id=tenant_id)
+    now = timezone.now()
+    lag = []
+    for checkpoint in checkpoints.order_by('name', 'tenant_id'):
+        pending = AdEvent.objects.filter(tenant_id=checkpoint.tenant_id, id__gt=checkpoint.position)
+        oldest = pending.order_by('id').values_list('timestamp', flat=True).first()
+        lag.append({
+            'projection': checkpoint.name,
+            'tenant_id': checkpoint.tenant_id,
+            'position': checkpoint.position,
+            'head': AdEvent.objects.filter(tenant_id=checkpoint.tenant_id).aggregate(head=Max('id'))['head'] or 0,
+            'events_behind': pending.count(),
+            'seconds_behind': round((now - oldest).total_seconds(), 1) if oldest else 0.0,
+            'events_applied': checkpoint.events,
+            'updated_at': checkpoint.updated_at,
+        })
+    return lag
@@ -0,0 +1,115 @@
+# apps/analytics/rebuild.py
+"""Tenant-wide rebuild of CampaignMetrics from the event store.
+
+Every campaign is folded by fold_events, which streams its events with
+chunked iterator() reads into per-day counters and HyperLogLog sketches,
+so a rebuild holds one aggregate's days in memory rather than its events
+or users. The resulting days are upserted in bulk.
+
+A tenant's campaigns are split round-robin into one chunk per worker and
+dispatched as a Celery group. Each task reports to per-run counters in
+the cache, which is what `rebuild_metrics` polls for progress; if those
+expire, the command falls back to the totals the tasks return.
+"""
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from django.core.cache import cache
+from apps.analytics.aggregates import fold_events, write_campaign_metrics
+from apps.analytics.models import AdEvent
+from apps.campaigns.models import Campaign
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_TTL = 24 * 3600
+PROGRESS_FIELDS = ('tenant_id', 'total', 'done', 'failed', 'events', 'started_at')
+
+
+def campaign_ids_with_events(tenant_id: int) -> List[int]:
+    aggregate_ids = AdEvent.objects.filter(tenant_id=tenant_id).values_list('aggregate_id', flat=True).distinct()
+    ids = {int(aggregate_id) for aggregate_id in aggregate_ids if aggregate_id.isdigit()}
+    return sorted(Campaign.objects.filter(tenant_id=tenant_id, id__in=ids).values_list('id', flat=True))
+
+
+def rebuild_campaign(tenant_id: int, campaign_id: int, use_snapshot: bool = True) -> Dict[str, Any]:
+    aggregate, since = fold_events(tenant_id, campaign_id, use_snapshot=use_snapshot)
+    write_campaign_metrics(tenant_id, campaign_id, aggregate)
+    return {
+        'campaign_id': campaign_id,
+        'events': aggregate.events,
+        'days': len(aggregate.daily),
+        'snapshot_sequence': since,
+    }
+
+
+def _key(run_id: str, field: str) -> str:
+    return f'metrics_rebuild:{run_id}:{field}'
+
+
+def start_run(tenant_id: int, total: int) -> str:
+    run_id = uuid.uuid4().hex
+    cache.set_many({
+        _key(run_id, 'tenant_id'): tenant_id,
+        _key(run_id, 'total'): total,
+        _key(run_id, 'done'): 0,
+        _key(run_id, 'failed'): 0,
+        _key(run_id, 'events'): 0,
+        _key(run_id, 'started_at'): time.time(),
+    }, PROGRESS_TTL)
+    return run_id
+
+
+def run_progress(run_id: str) -> Optional[Dict[str, Any]]:
+    values = cache.get_many([_key(run_id, field) for field in PROGRESS_FIELDS])
+    if not values:
+        return None
+    progress = {field: values.get(_key(run_id, field), 0) for field in PROGRESS_FIELDS}
+    progress['run_id'] = run_id
+    progress['finished'] = progress['done'] + progress['failed'] >= progress['total']
+    progress['elapsed_seconds'] = round(time.time() - progress.pop('started_at'), 1)
+    return progress
+
+
+def _advance(run_id: Optional[str], field: str, delta: int = 1):
+    if not run_id:
+        return
+    try:
+        cache.incr(_key(run_id, field), delta)
+    except ValueError:
+        # The run's counters expired or were evicted; the task result still carries the counts
+        pass
+
+
+def rebuild_campaigns(tenant_id: int, campaign_ids: List[int], run_id: Optional[str] = None,
+                      use_snapshot: bool = True) -> Dict[str, Any]:
+    """Rebuild campaigns one after another; a failing campaign doesn't stop the rest"""
+    rebuilt, failed, events = 0, [], 0
+    for campaign_id in campaign_ids:
+        try:
+            result = rebuild_campaign(tenant_id, campaign_id, use_snapshot)
+        except Exception as e:
+            logger.error(f"Error rebuilding metrics for campaign {campaign_id}: {str(e)}")
+            failed.append(campaign_id)
+            _advance(run_id, 'failed')
+            continue
+        rebuilt += 1
+        events += result['events']
+        _advance(run_id, 'done')
+        _advance(run_id, 'events', result['events'])
+    return {'tenant_id': tenant_id, 'rebuilt': rebuilt, 'failed': failed, 'events': events}
+
+
+def dispatch_rebuild(tenant_id: int, workers: int = 4, use_snapshot: bool = True):
+    """Fan the tenant's campaigns out as a Celery group; returns (run_id, GroupResult)"""
+    from celery import group
+    from tasks.analytics import rebuild_metrics_batch
+
+    campaign_ids = campaign_ids_with_events(tenant_id)
+    run_id = start_run(tenant_id, len(campaign_ids))
+    chunks = [chunk for chunk in (campaign_ids[i::workers] for i in range(workers)) if chunk]
+    result = group(
+        rebuild_metrics_batch.s(tenant_id, chunk, run_id, use_snapshot) for chunk in chunks
+    ).apply_async()
+    logger.info(f"Dispatched metrics rebuild {run_id} of {len(campaign_ids)} campaigns in {len(chunks)} tasks")
+    return run_id, result
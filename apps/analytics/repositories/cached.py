@@ -1,16 +1,129 @@
 # apps/analytics/repositories/cached.py
-from django.core.cache import cache
+"""Tenant-versioned result cache for analytics queries.
+
+Keys are derived from (query name, normalized params, tenant data version),
+so every worker and instance computes the same key for the same question.
+Ingestion bumps the tenant version, which orphans all of the tenant's
+entries at once; the timeout only bounds staleness of queries relative to
+NOW() between writes.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import pickle
+import time
+import zlib
 from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'analytics:q'
+STATS_KEY = 'analytics:qstats'
+VERSION_KEY = 'analytics:version:{tenant_id}'
+
+
+def _enabled():
+    return getattr(settings, 'ANALYTICS_QUERY_CACHE_ENABLED', True)
+
+
+def _max_bytes():
+    return getattr(settings, 'ANALYTICS_QUERY_CACHE_MAX_BYTES', 1024 * 1024)
+
+
+def get_tenant_version(tenant_id) -> int:
+    key = VERSION_KEY.format(tenant_id=tenant_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version evicted from the cache never
+        # restarts at a number that older entries were stored under
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_tenant_version(tenant_id):
+    """Invalidate every cached result of a tenant once the current transaction commits"""
+    def bump():
+        key = VERSION_KEY.format(tenant_id=tenant_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+    transaction.on_commit(bump)
 
-def cache_heavy_query(timeout=300):
+
+def _count(name, outcome):
+    key = f'{STATS_KEY}:{name}:{outcome}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_stats(names):
+    """Hit/miss/oversize counters for the given query names"""
+    outcomes = ('hit', 'miss', 'oversize')
+    keys = {f'{STATS_KEY}:{name}:{outcome}': (name, outcome) for name in names for outcome in outcomes}
+    values = cache.get_many(list(keys))
+    stats = {name: {outcome: 0 for outcome in outcomes} for name in names}
+    for key, value in values.items():
+        name, outcome = keys[key]
+        stats[name][outcome] = value
+    for counters in stats.values():
+        lookups = counters['hit'] + counters['miss']
+        counters['hit_rate'] = round(counters['hit'] / lookups, 4) if lookups else None
+    return stats
+
+
+def make_cache_key(name, tenant_id, version, params) -> str:
+    normalized = json.dumps(params, sort_keys=True, default=str, separators=(',', ':'))
+    digest = hashlib.sha256(normalized.encode()).hexdigest()[:32]
+    return f'{KEY_PREFIX}:{name}:{tenant_id}:{version}:{digest}'
+
+
+def tenant_cached_query(timeout=300):
+    """Cache a repository query whose first `tenant_id` argument scopes its data.
+
+    Results are pickled and zlib-compressed; results larger than
+    ANALYTICS_QUERY_CACHE_MAX_BYTES after compression are not cached.
+    """
     def decorator(func):
+        signature = inspect.signature(func)
+        name = func.__name__
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            cache_key = f"analytics:{func.__name__}:{hash(str(args) + str(kwargs))}"
-            result = cache.get(cache_key)
-            if result is None:
-                result = func(*args, **kwargs)
-                cache.set(cache_key, result, timeout)
+            if not _enabled():
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            tenant_id = params.pop('tenant_id')
+
+            try:
+                key = make_cache_key(name, tenant_id, get_tenant_version(tenant_id), params)
+                cached = cache.get(key)
+            except Exception as e:
+                logger.warning(f"Query cache unavailable for {name}: {e}")
+                return func(*args, **kwargs)
+
+            if cached is not None:
+                _count(name, 'hit')
+                return pickle.loads(zlib.decompress(cached))
+
+            _count(name, 'miss')
+            result = func(*args, **kwargs)
+            payload = zlib.compress(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+            if len(payload) > _max_bytes():
+                _count(name, 'oversize')
+            else:
+                cache.set(key, payload, timeout)
             return result
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
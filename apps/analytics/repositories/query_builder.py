@@ -1,21 +1,138 @@
 # apps/analytics/repositories/query_builder.py
+"""Parameterized SQL assembly and named time windows.
+
+Time filters compile to half-open ranges on the bare column
+(`col >= start AND col < end`), which MySQL can answer with a range scan
+of the (tenant_id, timestamp) indexes. Wrapping the column instead, as in
+DATE(timestamp) = CURDATE(), evaluates the function on every row of the
+tenant. Truncation belongs in SELECT / GROUP BY only, via the bucket
+expressions below.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.utils import timezone
+
+BUCKETS = {
+    'hour': "DATE_FORMAT({column}, '%%Y-%%m-%%d %%H:00:00')",
+    'day': "DATE({column})",
+}
+
+
+def bucket_expression(column: str, grain: str = 'hour', offset_seconds: int = 0) -> str:
+    """Expression truncating `column` to `grain`, shifted by a fixed UTC offset"""
+    if offset_seconds:
+        column = f"({column} + INTERVAL {int(offset_seconds)} SECOND)"
+    return BUCKETS[grain].format(column=column)
+
+
+def tenant_timezone(tenant_id: int):
+    """Reporting time zone of a tenant, from ANALYTICS_TENANT_TIMEZONES"""
+    zones = getattr(settings, 'ANALYTICS_TENANT_TIMEZONES', {})
+    return ZoneInfo(zones.get(tenant_id, settings.TIME_ZONE))
+
+
+def _to_db(value: datetime) -> datetime:
+    """Naive UTC, the way DateTimeField values are stored with USE_TZ"""
+    if timezone.is_aware(value):
+        return timezone.make_naive(value, dt_timezone.utc)
+    return value
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    """The half-open range [start, end) of aware datetimes"""
+    start: datetime
+    end: datetime
+
+    @classmethod
+    def trailing(cls, now: Optional[datetime] = None, **delta) -> 'TimeWindow':
+        now = now or timezone.now()
+        return cls(now - timedelta(**delta), now)
+
+    @classmethod
+    def last_hour(cls, now: Optional[datetime] = None) -> 'TimeWindow':
+        return cls.trailing(now, hours=1)
+
+    @classmethod
+    def last_minutes(cls, minutes: int, now: Optional[datetime] = None) -> 'TimeWindow':
+        return cls.trailing(now, minutes=minutes)
+
+    @classmethod
+    def last_hours(cls, hours: int, now: Optional[datetime] = None) -> 'TimeWindow':
+        return cls.trailing(now, hours=hours)
+
+    @classmethod
+    def last_n_days(cls, days: int, now: Optional[datetime] = None) -> 'TimeWindow':
+        return cls.trailing(now, days=days)
+
+    @classmethod
+    def day(cls, day: date, tz=dt_timezone.utc) -> 'TimeWindow':
+        """The calendar day `day` in `tz`; 23 or 25 hours long across DST changes"""
+        start = datetime.combine(day, time.min).replace(tzinfo=tz)
+        end = datetime.combine(day + timedelta(days=1), time.min).replace(tzinfo=tz)
+        return cls(start, end)
+
+    @classmethod
+    def today(cls, tz=dt_timezone.utc, now: Optional[datetime] = None) -> 'TimeWindow':
+        """The current calendar day in `tz`; UTC matches CURDATE() on our connections"""
+        now = now or timezone.now()
+        return cls.day(now.astimezone(tz).date(), tz)
+
+    @classmethod
+    def tenant_day(cls, tenant_id: int, day: Optional[date] = None,
+                   now: Optional[datetime] = None) -> 'TimeWindow':
+        """A calendar day (today by default) in the tenant's reporting time zone"""
+        tz = tenant_timezone(tenant_id)
+        if day is None:
+            return cls.today(tz, now)
+        return cls.day(day, tz)
+
+    @property
+    def params(self) -> List[datetime]:
+        return [_to_db(self.start), _to_db(self.end)]
+
+    @property
+    def first_date(self) -> date:
+        """Calendar date of `start` in the window's own time zone, for DATE columns"""
+        return self.start.date()
+
+    def predicate(self, column: str = 'timestamp') -> Tuple[str, List[datetime]]:
+        return f"{column} >= %s AND {column} < %s", self.params
+
+    def bucket(self, column: str, grain: str = 'hour') -> str:
+        """Bucket expression in the window's time zone (offset taken at `start`)"""
+        offset = self.start.utcoffset()
+        return bucket_expression(column, grain, int(offset.total_seconds()) if offset else 0)
+
+
 class SQLQueryBuilder:
-    def __init__(self):
-        self.base_query = ""
+    def __init__(self, base_query: str = ""):
+        self.base_query = base_query
         self.filters = []
         self.params = []
-    
-    def add_tenant_filter(self, tenant_id: int):
-        self.filters.append("tenant_id = %s")
+
+    def add_tenant_filter(self, tenant_id: int, column: str = "tenant_id"):
+        self.filters.append(f"{column} = %s")
         self.params.append(tenant_id)
         return self
-    
-    def add_date_range(self, start_date, end_date):
-        self.filters.append("timestamp BETWEEN %s AND %s")
-        self.params.extend([start_date, end_date])
+
+    def add_filter(self, clause: str, *params):
+        self.filters.append(clause)
+        self.params.extend(params)
         return self
-    
+
+    def add_time_window(self, window: TimeWindow, column: str = "timestamp"):
+        clause, params = window.predicate(column)
+        return self.add_filter(clause, *params)
+
+    def add_date_range(self, start_date, end_date):
+        """Half-open [start_date, end_date), so adjacent ranges never share a row"""
+        return self.add_time_window(TimeWindow(start_date, end_date))
+
     def build(self) -> tuple:
         where_clause = " AND ".join(self.filters) if self.filters else "1=1"
         final_query = f"{self.base_query} WHERE {where_clause}"
-        return final_query, self.params
\ No newline at end of file
+        return final_query, self.params
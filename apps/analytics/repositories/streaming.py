@@ -0,0 +1,40 @@
+# apps/analytics/repositories/streaming.py
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'ANALYTICS_EXPORT_CHUNK_SIZE', 2000)
+
+
+@contextmanager
+def streaming_cursor():
+    """Unbuffered server-side cursor; rows stay on the server until fetched.
+
+    The connection can't run other statements until the cursor is closed,
+    so only use it for a single query that is read to the end.
+    """
+    connection = connections['default']
+    connection.ensure_connection()
+    if connection.vendor == 'mysql':
+        from MySQLdb.cursors import SSCursor
+        cursor = connection.connection.cursor(SSCursor)
+    else:
+        cursor = connection.cursor()
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+def stream_query(sql, params, chunk_size=None):
+    """Yield rows of `sql` as dicts, holding at most one chunk in memory"""
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    with streaming_cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
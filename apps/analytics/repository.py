@@ -1,12 +1,50 @@
+from django.conf import settings
 from django.db import connection
 from typing import List, Dict, Any
+from apps.realtime.windows import window_totals
 from .repositories.connection import optimized_analytics_cursor
 from .repositories.performance import monitor_query_performance
+from .repositories.cached import tenant_cached_query, cache_stats
+from .repositories.query_builder import TimeWindow
+from .rollups import RollupRepository
+from .cohorts import CohortRepository
+from .sketches import SketchRepository
+from .columnar import ColumnarEngine
 
 class AnalyticsRepository:
     @staticmethod
-    @monitor_query_performance
-    def cohort_analysis(tenant_id):
+    def _columnar(tenant_id):
+        """Engine over a fresh columnar snapshot, when routing to snapshots is enabled"""
+        if not getattr(settings, 'ANALYTICS_COLUMNAR_ROUTING', False):
+            return None
+        return ColumnarEngine.fresh(tenant_id)
+
+    @staticmethod
+    def unique_users_method(tenant_id, approx=False, columnar=False):
+        """How the campaign rankings count unique_users: 'hyperloglog' or 'exact'.
+
+        Sketch estimates are only used on the rollup path, once sketches
+        exist; `columnar` accounts for top_performing_campaigns preferring
+        a fresh columnar snapshot, which counts exactly.
+        """
+        if not approx or (columnar and AnalyticsRepository._columnar(tenant_id)):
+            return 'exact'
+        if RollupRepository.is_ready(tenant_id) and SketchRepository.is_ready(tenant_id):
+            return 'hyperloglog'
+        return 'exact'
+
+    @staticmethod
+    def _approx_reach(tenant_id):
+        """Sketch-estimated users per campaign, or None when no sketches exist yet"""
+        if not SketchRepository.is_ready(tenant_id):
+            return None
+        return SketchRepository.campaign_unique_users(tenant_id)
+
+    @staticmethod
+    def cohort_analysis_query(tenant_id):
+        if CohortRepository.is_ready(tenant_id):
+            return CohortRepository.cohort_analysis_query(tenant_id)
+
         sql = """
         WITH user_first_impression AS (
             SELECT user_id, 
@@ -41,13 +79,26 @@ class AnalyticsRepository:
         GROUP BY cohort_month, period_days
         ORDER BY cohort_month, period_days
         """
+        return sql, [tenant_id, tenant_id]
+
+    @staticmethod
+    @tenant_cached_query()
+    @monitor_query_performance
+    def cohort_analysis(tenant_id):
+        engine = AnalyticsRepository._columnar(tenant_id)
+        if engine:
+            return engine.cohort_analysis()
+
+        sql, params = AnalyticsRepository.cohort_analysis_query(tenant_id)
         with optimized_analytics_cursor() as cursor:
-            cursor.execute(sql, [tenant_id, tenant_id])
+            cursor.execute(sql, params)
             return cursor.fetchall()
     
     @staticmethod
-    @monitor_query_performance
-    def campaign_performance_window(tenant_id):
+    def campaign_performance_window_query(tenant_id):
+        if RollupRepository.is_ready(tenant_id):
+            return RollupRepository.campaign_performance_window_query(tenant_id)
+
         sql = """
         SELECT 
             ca.id as campaign_id,
@@ -78,13 +129,33 @@ class AnalyticsRepository:
         HAVING COUNT(*) > 0
         ORDER BY ca.id, date DESC
         """
+        return sql, [tenant_id]
+
+    @staticmethod
+    @tenant_cached_query()
+    @monitor_query_performance
+    def campaign_performance_window(tenant_id):
+        engine = AnalyticsRepository._columnar(tenant_id)
+        if engine:
+            return engine.campaign_performance_window()
+
+        sql, params = AnalyticsRepository.campaign_performance_window_query(tenant_id)
         with optimized_analytics_cursor() as cursor:
-            cursor.execute(sql, [tenant_id])
+            cursor.execute(sql, params)
             return cursor.fetchall()
 
     @staticmethod
+    @tenant_cached_query()
     @monitor_query_performance
-    def top_performing_campaigns(tenant_id, limit=10):
+    def top_performing_campaigns(tenant_id, limit=10, approx=False):
+        engine = AnalyticsRepository._columnar(tenant_id)
+        if engine:
+            return engine.top_performing_campaigns(limit)
+
+        if RollupRepository.is_ready(tenant_id):
+            reach = AnalyticsRepository._approx_reach(tenant_id) if approx else None
+            return RollupRepository.top_performing_campaigns(tenant_id, limit, reach)
+
         sql = """
         WITH campaign_metrics AS (
             SELECT 
@@ -112,8 +183,7 @@ class AnalyticsRepository:
             return cursor.fetchall()
         
     @staticmethod
-    @monitor_query_performance
-    def attribution_analysis(tenant_id, campaign_id=None):
+    def attribution_analysis_query(tenant_id, campaign_id=None):
         """Multi-level CTE for attribution modeling"""
         sql = """
         WITH user_journeys AS (
@@ -178,16 +248,37 @@ class AnalyticsRepository:
             sql += " HAVING campaign_id = %s"
             params.append(campaign_id)
         
+        return sql, params
+
+    @staticmethod
+    @tenant_cached_query()
+    @monitor_query_performance
+    def attribution_analysis(tenant_id, campaign_id=None):
+        """Multi-level CTE for attribution modeling"""
+        sql, params = AnalyticsRepository.attribution_analysis_query(tenant_id, campaign_id)
         with optimized_analytics_cursor() as cursor:
             cursor.execute(sql, params)
             return cursor.fetchall()
         
     
     @staticmethod
+    @tenant_cached_query(timeout=30)
     @monitor_query_performance
     def get_real_time_metrics(tenant_id: int, campaign_id: int = None) -> Dict[str, Any]:
-        """Sub-100ms real-time metrics query"""
-        sql = """
+        """Sub-100ms real-time metrics, from the live Redis window once it is warm"""
+        live = window_totals(tenant_id, campaign_id)
+        if live is not None:
+            users = live['unique_users']
+            return {
+                'impressions_last_hour': live['impressions'],
+                'unique_users': users,
+                'spend_last_hour': live['spend'],
+                'avg_cpm': live['spend'] / live['impressions'] if live['impressions'] else 0.0,
+                'frequency': live['impressions'] / users if users else 0.0
+            }
+
+        last_hour, window_params = TimeWindow.last_hour().predicate('ci.timestamp')
+        sql = f"""
         SELECT 
             COUNT(*) as impressions_last_hour,
             COUNT(DISTINCT ci.user_id) as unique_users,
@@ -197,10 +288,10 @@ class AnalyticsRepository:
         FROM campaigns_impression ci
         JOIN campaigns_ad ad ON ci.ad_id = ad.id
         WHERE ci.tenant_id = %s 
-        AND ci.timestamp >= NOW() - INTERVAL 1 HOUR
+        AND {last_hour}
         """ + (" AND ad.campaign_id = %s" if campaign_id else "")
         
-        params = [tenant_id]
+        params = [tenant_id, *window_params]
         if campaign_id:
             params.append(campaign_id)
             
@@ -216,10 +307,15 @@ class AnalyticsRepository:
             }
 
     @staticmethod
+    @tenant_cached_query()
     @monitor_query_performance
     def advanced_cohort_analysis(tenant_id: int, days_back: int = 30) -> List[Dict]:
         """Production-level cohort analysis with window functions"""
-        sql = """
+        if CohortRepository.is_ready(tenant_id):
+            return CohortRepository.advanced_cohort_analysis(tenant_id, days_back)
+
+        recent, window_params = TimeWindow.last_n_days(days_back).predicate('timestamp')
+        sql = f"""
         WITH user_first_impression AS (
             SELECT 
                 user_id,
@@ -227,7 +323,7 @@ class AnalyticsRepository:
                 MIN(timestamp) as first_impression_time
             FROM campaigns_impression 
             WHERE tenant_id = %s
-            AND timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
+            AND {recent}
             GROUP BY user_id
         ),
         user_activities AS (
@@ -270,13 +366,18 @@ class AnalyticsRepository:
         """
         
         with optimized_analytics_cursor() as cursor:
-            cursor.execute(sql, [tenant_id, days_back, tenant_id])
+            cursor.execute(sql, [tenant_id, *window_params, tenant_id])
             columns = [col[0] for col in cursor.description]
             return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
     @staticmethod
-    def campaign_performance_ranking(tenant_id: int, limit: int = 20) -> List[Dict]:
+    @tenant_cached_query()
+    def campaign_performance_ranking(tenant_id: int, limit: int = 20, approx: bool = False) -> List[Dict]:
         """Advanced campaign ranking with multiple metrics"""
+        if RollupRepository.is_ready(tenant_id):
+            reach = AnalyticsRepository._approx_reach(tenant_id) if approx else None
+            return RollupRepository.campaign_performance_ranking(tenant_id, limit, reach)
+
         sql = """
         WITH campaign_metrics AS (
             SELECT 
@@ -318,35 +419,51 @@ class AnalyticsRepository:
             return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
     @staticmethod
+    @tenant_cached_query(timeout=60)
     def hourly_performance_trend(tenant_id: int, campaign_id: int, hours_back: int = 24) -> List[Dict]:
         """Hourly performance analysis for real-time monitoring"""
-        sql = """
+        if RollupRepository.is_ready(tenant_id):
+            return RollupRepository.hourly_performance_trend(tenant_id, campaign_id, hours_back)
+
+        window = TimeWindow.last_hours(hours_back)
+        recent, window_params = window.predicate('ci.timestamp')
+        hour_bucket = window.bucket('ci.timestamp', 'hour')
+        sql = f"""
         SELECT 
-            DATE_FORMAT(ci.timestamp, '%%Y-%%m-%%d %%H:00:00') as hour_bucket,
+            {hour_bucket} as hour_bucket,
             COUNT(*) as impressions,
             COUNT(DISTINCT ci.user_id) as unique_users,
             SUM(ci.cost) as spend,
             AVG(ci.cost) as avg_cost,
-            LAG(COUNT(*)) OVER (ORDER BY DATE_FORMAT(ci.timestamp, '%%Y-%%m-%%d %%H:00:00')) as prev_hour_impressions,
+            LAG(COUNT(*)) OVER (ORDER BY {hour_bucket}) as prev_hour_impressions,
             CASE 
-                WHEN LAG(COUNT(*)) OVER (ORDER BY DATE_FORMAT(ci.timestamp, '%%Y-%%m-%%d %%H:00:00')) IS NULL THEN 0
-                ELSE ROUND((COUNT(*) - LAG(COUNT(*)) OVER (ORDER BY DATE_FORMAT(ci.timestamp, '%%Y-%%m-%%d %%H:00:00'))) * 100.0 / 
-                     NULLIF(LAG(COUNT(*)) OVER (ORDER BY DATE_FORMAT(ci.timestamp, '%%Y-%%m-%%d %%H:00:00')), 0), 2)
+                WHEN LAG(COUNT(*)) OVER (ORDER BY {hour_bucket}) IS NULL THEN 0
+                ELSE ROUND((COUNT(*) - LAG(COUNT(*)) OVER (ORDER BY {hour_bucket})) * 100.0 / 
+                     NULLIF(LAG(COUNT(*)) OVER (ORDER BY {hour_bucket}), 0), 2)
             END as growth_rate
         FROM campaigns_impression ci
         JOIN campaigns_ad ad ON ci.ad_id = ad.id
         WHERE ci.tenant_id = %s 
         AND ad.campaign_id = %s
-        AND ci.timestamp >= NOW() - INTERVAL %s HOUR
-        GROUP BY DATE_FORMAT(ci.timestamp, '%%Y-%%m-%%d %%H:00:00')
+        AND {recent}
+        GROUP BY {hour_bucket}
         ORDER BY hour_bucket DESC
         """
         
         with optimized_analytics_cursor() as cursor:
-            cursor.execute(sql, [tenant_id, campaign_id, hours_back])
+            cursor.execute(sql, [tenant_id, campaign_id, *window_params])
             columns = [col[0] for col in cursor.description]
             return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
+    @staticmethod
+    def get_query_cache_stats() -> Dict[str, Any]:
+        """Hit/miss counters of the tenant-versioned result cache"""
+        return cache_stats([
+            'cohort_analysis', 'campaign_performance_window', 'top_performing_campaigns',
+            'attribution_analysis', 'get_real_time_metrics', 'advanced_cohort_analysis',
+            'campaign_performance_ranking', 'hourly_performance_trend',
+        ])
+
     @staticmethod
     def get_query_performance_stats() -> Dict[str, Any]:
         """Monitor query performance for optimization"""
@@ -0,0 +1,574 @@
+# apps/analytics/rollups.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import List, Dict, Any, Optional
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.analytics.models import (
+    ImpressionHourlyRollup,
+    ImpressionDailyRollup,
+    CampaignReach,
+    RollupWatermark,
+)
+from .repositories.connection import optimized_analytics_cursor
+from .repositories.query_builder import bucket_expression
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = 'impressions'
+ALL_ADS = 0  # ad_id of the campaign-wide row in ImpressionHourlyRollup
+
+# Hours are only rolled up once they have been closed for this many seconds,
+# so impressions arriving a little late still land in their bucket.
+ROLLUP_CLOSE_DELAY = getattr(settings, 'ANALYTICS_ROLLUP_CLOSE_DELAY', 300)
+
+HOUR_BUCKET = bucket_expression('ci.timestamp', 'hour')
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def to_db(value: datetime) -> datetime:
+    """Naive UTC datetime, the way MySQL stores DateTimeField with USE_TZ"""
+    if timezone.is_aware(value):
+        return timezone.make_naive(value, dt_timezone.utc)
+    return value
+
+
+def from_db(value: datetime) -> datetime:
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def day_windows(start: datetime, end: datetime):
+    """Split [start, end) into windows that never cross midnight"""
+    current = start
+    while current < end:
+        next_midnight = floor_day(current) + timedelta(days=1)
+        window_end = min(next_midnight, end)
+        yield current, window_end
+        current = window_end
+
+
+def get_watermark(tenant_id: int, name: str = ROLLUP_NAME) -> Optional[datetime]:
+    watermark = RollupWatermark.objects.filter(tenant_id=tenant_id, name=name).first()
+    return watermark.position if watermark else None
+
+
+def rollup_horizon(now: Optional[datetime] = None) -> datetime:
+    """Start of the oldest hour that is still considered open"""
+    now = now or timezone.now()
+    return floor_hour(now - timedelta(seconds=ROLLUP_CLOSE_DELAY))
+
+
+def first_impression_time(tenant_id: int) -> Optional[datetime]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT MIN(timestamp) FROM campaigns_impression WHERE tenant_id = %s",
+            [tenant_id]
+        )
+        row = cursor.fetchone()
+    return from_db(row[0]) if row and row[0] else None
+
+
+def _lock_watermark(tenant_id: int, name: str, position: datetime) -> RollupWatermark:
+    """The `name` watermark row, created at `position` if missing and locked until commit"""
+    watermark, _ = RollupWatermark.objects.get_or_create(
+        tenant_id=tenant_id, name=name, defaults={'position': position}
+    )
+    return RollupWatermark.objects.select_for_update().get(pk=watermark.pk)
+
+
+def advance_watermark(tenant_id: int, name: str, fold_window, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None, progress=None) -> Dict[str, Any]:
+    """Fold closed hours after the `name` watermark, one day-sized window at a time.
+
+    `fold_window(cursor, tenant_id, start, end)` runs inside the same
+    transaction that locks the watermark row and moves it to `end`, so an
+    interrupted run resumes from the last committed window and concurrent
+    runs never fold a window twice: each window is clipped to the position
+    read under the lock, and skipped once another run has folded past it.
+    With `since` the windows are folded again regardless (only safe for
+    folds that recompute rather than increment), and the watermark never
+    moves back.
+    """
+    until = floor_hour(until) if until else rollup_horizon()
+    start = since or get_watermark(tenant_id, name)
+    if start is None:
+        start = first_impression_time(tenant_id)
+        if start is None:
+            return {'tenant_id': tenant_id, 'windows': 0, 'position': None}
+    start = floor_hour(start)
+
+    windows = 0
+    for window_start, window_end in day_windows(start, until):
+        with transaction.atomic():
+            watermark = _lock_watermark(tenant_id, name, window_start)
+            if since is None:
+                window_start = max(window_start, watermark.position)
+                if window_start >= window_end:
+                    continue
+            with connection.cursor() as cursor:
+                fold_window(cursor, tenant_id, window_start, window_end)
+            watermark.position = max(watermark.position, window_end)
+            watermark.save(update_fields=['position', 'updated_at'])
+        windows += 1
+        if progress:
+            progress(window_start, window_end)
+
+    if windows:
+        logger.info(f"Folded {windows} {name} windows for tenant {tenant_id} up to {until}")
+    return {
+        'tenant_id': tenant_id,
+        'windows': windows,
+        'position': get_watermark(tenant_id, name)
+    }
+
+
+def _rollup_window(cursor, tenant_id: int, start: datetime, end: datetime):
+    """Recompute hourly buckets for [start, end) from raw impressions"""
+    params = [tenant_id, tenant_id, to_db(start), to_db(end)]
+
+    # Per-ad buckets
+    cursor.execute(f"""
+        INSERT INTO analytics_impressionhourlyrollup
+            (tenant_id, campaign_id, ad_id, hour, impressions, spend, unique_users)
+        SELECT
+            %s,
+            ad.campaign_id,
+            ci.ad_id,
+            {HOUR_BUCKET},
+            COUNT(*),
+            SUM(ci.cost),
+            COUNT(DISTINCT ci.user_id)
+        FROM campaigns_impression ci
+        JOIN campaigns_ad ad ON ci.ad_id = ad.id
+        WHERE ci.tenant_id = %s
+        AND ci.timestamp >= %s AND ci.timestamp < %s
+        GROUP BY ad.campaign_id, ci.ad_id, {HOUR_BUCKET}
+        ON DUPLICATE KEY UPDATE
+            impressions = VALUES(impressions),
+            spend = VALUES(spend),
+            unique_users = VALUES(unique_users)
+    """, params)
+
+    # Campaign-wide buckets (ad_id = 0)
+    cursor.execute(f"""
+        INSERT INTO analytics_impressionhourlyrollup
+            (tenant_id, campaign_id, ad_id, hour, impressions, spend, unique_users)
+        SELECT
+            %s,
+            ad.campaign_id,
+            {ALL_ADS},
+            {HOUR_BUCKET},
+            COUNT(*),
+            SUM(ci.cost),
+            COUNT(DISTINCT ci.user_id)
+        FROM campaigns_impression ci
+        JOIN campaigns_ad ad ON ci.ad_id = ad.id
+        WHERE ci.tenant_id = %s
+        AND ci.timestamp >= %s AND ci.timestamp < %s
+        GROUP BY ad.campaign_id, {HOUR_BUCKET}
+        ON DUPLICATE KEY UPDATE
+            impressions = VALUES(impressions),
+            spend = VALUES(spend),
+            unique_users = VALUES(unique_users)
+    """, params)
+
+    # Reach only ever grows; INSERT IGNORE keeps the earliest first_seen
+    cursor.execute("""
+        INSERT IGNORE INTO analytics_campaignreach
+            (tenant_id, campaign_id, user_id, first_seen)
+        SELECT %s, ad.campaign_id, ci.user_id, MIN(ci.timestamp)
+        FROM campaigns_impression ci
+        JOIN campaigns_ad ad ON ci.ad_id = ad.id
+        WHERE ci.tenant_id = %s
+        AND ci.timestamp >= %s AND ci.timestamp < %s
+        GROUP BY ad.campaign_id, ci.user_id
+    """, params)
+
+
+def _rollup_day(cursor, tenant_id: int, day_start: datetime):
+    """Recompute the daily bucket of a fully closed day"""
+    day_end = day_start + timedelta(days=1)
+    cursor.execute("""
+        INSERT INTO analytics_impressiondailyrollup
+            (tenant_id, campaign_id, date, impressions, spend, unique_users)
+        SELECT
+            %s,
+            ad.campaign_id,
+            DATE(ci.timestamp),
+            COUNT(*),
+            SUM(ci.cost),
+            COUNT(DISTINCT ci.user_id)
+        FROM campaigns_impression ci
+        JOIN campaigns_ad ad ON ci.ad_id = ad.id
+        WHERE ci.tenant_id = %s
+        AND ci.timestamp >= %s AND ci.timestamp < %s
+        GROUP BY ad.campaign_id, DATE(ci.timestamp)
+        ON DUPLICATE KEY UPDATE
+            impressions = VALUES(impressions),
+            spend = VALUES(spend),
+            unique_users = VALUES(unique_users)
+    """, [tenant_id, tenant_id, to_db(day_start), to_db(day_end)])
+
+
+def _fold_rollup_window(cursor, tenant_id: int, start: datetime, end: datetime):
+    _rollup_window(cursor, tenant_id, start, end)
+    if end == floor_day(start) + timedelta(days=1):
+        _rollup_day(cursor, tenant_id, floor_day(start))
+
+
+def refresh_rollups(tenant_id: int, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None, progress=None) -> Dict[str, Any]:
+    """Fold closed hours after the watermark into the rollup tables.
+
+    Buckets are recomputed rather than incremented, which makes re-running a
+    window (e.g. `since` for late data) idempotent.
+    """
+    return advance_watermark(
+        tenant_id, ROLLUP_NAME, _fold_rollup_window,
+        since=since, until=until, progress=progress
+    )
+
+
+def reset_rollups(tenant_id: int):
+    with transaction.atomic():
+        ImpressionHourlyRollup.objects.filter(tenant_id=tenant_id).delete()
+        ImpressionDailyRollup.objects.filter(tenant_id=tenant_id).delete()
+        CampaignReach.objects.filter(tenant_id=tenant_id).delete()
+        RollupWatermark.objects.filter(tenant_id=tenant_id, name=ROLLUP_NAME).delete()
+
+
+def verify_rollups(tenant_id: int, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Diff hourly rollups against raw impressions for [start, end).
+
+    The window is clipped to the watermark, since hours after it are served
+    from raw rows anyway. Returns one entry per mismatching bucket.
+    """
+    watermark = get_watermark(tenant_id)
+    if watermark is None:
+        return []
+    start, end = floor_hour(start), min(floor_hour(end), watermark)
+    if start >= end:
+        return []
+
+    raw_sql = f"""
+        SELECT ad.campaign_id, ci.ad_id, {HOUR_BUCKET} as hour_bucket,
+               COUNT(*), SUM(ci.cost), COUNT(DISTINCT ci.user_id)
+        FROM campaigns_impression ci
+        JOIN campaigns_ad ad ON ci.ad_id = ad.id
+        WHERE ci.tenant_id = %s
+        AND ci.timestamp >= %s AND ci.timestamp < %s
+        GROUP BY ad.campaign_id, ci.ad_id, hour_bucket
+        UNION ALL
+        SELECT ad.campaign_id, {ALL_ADS}, {HOUR_BUCKET} as hour_bucket,
+               COUNT(*), SUM(ci.cost), COUNT(DISTINCT ci.user_id)
+        FROM campaigns_impression ci
+        JOIN campaigns_ad ad ON ci.ad_id = ad.id
+        WHERE ci.tenant_id = %s
+        AND ci.timestamp >= %s AND ci.timestamp < %s
+        GROUP BY ad.campaign_id, hour_bucket
+    """
+    rollup_sql = """
+        SELECT campaign_id, ad_id, DATE_FORMAT(hour, '%%Y-%%m-%%d %%H:00:00'),
+               impressions, spend, unique_users
+        FROM analytics_impressionhourlyrollup
+        WHERE tenant_id = %s AND hour >= %s AND hour < %s
+    """
+    window = [to_db(start), to_db(end)]
+    with optimized_analytics_cursor() as cursor:
+        cursor.execute(raw_sql, [tenant_id] + window + [tenant_id] + window)
+        raw = {tuple(row[:3]): row[3:] for row in cursor.fetchall()}
+        cursor.execute(rollup_sql, [tenant_id] + window)
+        rolled = {tuple(row[:3]): row[3:] for row in cursor.fetchall()}
+
+    empty = (0, Decimal('0'), 0)
+    mismatches = []
+    for key in sorted(set(raw) | set(rolled), key=str):
+        expected = raw.get(key, empty)
+        actual = rolled.get(key, empty)
+        if (expected[0], Decimal(expected[1] or 0), expected[2]) != \
+                (actual[0], Decimal(actual[1] or 0), actual[2]):
+            mismatches.append({
+                'campaign_id': key[0],
+                'ad_id': key[1],
+                'hour': key[2],
+                'expected': {'impressions': expected[0], 'spend': expected[1], 'unique_users': expected[2]},
+                'actual': {'impressions': actual[0], 'spend': actual[1], 'unique_users': actual[2]},
+            })
+    return mismatches
+
+
+class RollupRepository:
+    """Rollup-backed twins of the AnalyticsRepository queries.
+
+    Closed buckets come from the rollup tables; only impressions at or after
+    the watermark (the open hour plus any refresh lag) are scanned raw. Each
+    method returns rows in exactly the shape of its AnalyticsRepository
+    counterpart.
+    """
+
+    @staticmethod
+    def is_ready(tenant_id: int) -> bool:
+        return get_watermark(tenant_id) is not None
+
+    @staticmethod
+    def campaign_performance_window_query(tenant_id):
+        # Distinct users per day are not additive over hours, so the day the
+        # watermark falls in is aggregated from raw rows as a whole.
+        boundary = to_db(floor_day(get_watermark(tenant_id)))
+        sql = """
+        WITH daily AS (
+            SELECT campaign_id, date, impressions, spend, unique_users
+            FROM analytics_impressiondailyrollup
+            WHERE tenant_id = %s AND date < DATE(%s)
+            UNION ALL
+            SELECT
+                ad.campaign_id,
+                DATE(ci.timestamp),
+                COUNT(*),
+                SUM(ci.cost),
+                COUNT(DISTINCT ci.user_id)
+            FROM campaigns_impression ci
+            JOIN campaigns_ad ad ON ci.ad_id = ad.id
+            WHERE ci.tenant_id = %s AND ci.timestamp >= %s
+            GROUP BY ad.campaign_id, DATE(ci.timestamp)
+        )
+        SELECT
+            ca.id as campaign_id,
+            ca.name as campaign_name,
+            d.date as date,
+            d.impressions as impressions,
+            d.spend as total_cost,
+            d.spend / d.impressions as avg_cost,
+            d.unique_users as unique_users,
+            ROW_NUMBER() OVER (
+                PARTITION BY ca.id ORDER BY d.impressions DESC
+            ) as daily_rank,
+            LAG(d.impressions) OVER (
+                PARTITION BY ca.id ORDER BY d.date
+            ) as prev_day_impressions,
+            ROUND(
+                (d.impressions - LAG(d.impressions) OVER (
+                    PARTITION BY ca.id ORDER BY d.date
+                )) * 100.0 / NULLIF(LAG(d.impressions) OVER (
+                    PARTITION BY ca.id ORDER BY d.date
+                ), 0), 2
+            ) as growth_rate
+        FROM daily d
+        JOIN campaigns_campaign ca ON ca.id = d.campaign_id
+        WHERE ca.tenant_id = %s AND d.impressions > 0
+        ORDER BY ca.id, date DESC
+        """
+        return sql, [tenant_id, boundary, tenant_id, boundary, tenant_id]
+
+    @staticmethod
+    def campaign_performance_window(tenant_id):
+        sql, params = RollupRepository.campaign_performance_window_query(tenant_id)
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    @staticmethod
+    def _campaign_totals_sql(reach: Optional[Dict[int, int]] = None):
+        """CTEs with all-time impressions/spend and reach per campaign.
+
+        `reach` replaces the exact reach count with precomputed (e.g.
+        sketch-estimated) users per campaign. Takes the params built by
+        _totals_params with the same `reach`.
+        """
+        sql = """
+        totals AS (
+            SELECT campaign_id, CAST(SUM(impressions) AS SIGNED) as impressions, SUM(spend) as spend
+            FROM (
+                SELECT campaign_id, impressions, spend
+                FROM analytics_impressionhourlyrollup
+                WHERE tenant_id = %s AND ad_id = 0 AND hour < %s
+                UNION ALL
+                SELECT ad.campaign_id, COUNT(*), SUM(ci.cost)
+                FROM campaigns_impression ci
+                JOIN campaigns_ad ad ON ci.ad_id = ad.id
+                WHERE ci.tenant_id = %s AND ci.timestamp >= %s
+                GROUP BY ad.campaign_id
+            ) buckets
+            GROUP BY campaign_id
+        ),"""
+        if reach is not None:
+            estimates = ' UNION ALL '.join(['SELECT %s, %s'] * len(reach))
+            return sql + f"""
+        reach (campaign_id, users) AS (
+            {estimates or 'SELECT NULL, NULL FROM DUAL WHERE FALSE'}
+        )
+        """
+        return sql + """
+        reach AS (
+            SELECT campaign_id, CAST(SUM(users) AS SIGNED) as users
+            FROM (
+                SELECT campaign_id, COUNT(*) as users
+                FROM analytics_campaignreach
+                WHERE tenant_id = %s AND first_seen < %s
+                GROUP BY campaign_id
+                UNION ALL
+                SELECT ad.campaign_id, COUNT(DISTINCT ci.user_id)
+                FROM campaigns_impression ci
+                JOIN campaigns_ad ad ON ci.ad_id = ad.id
+                WHERE ci.tenant_id = %s AND ci.timestamp >= %s
+                AND NOT EXISTS (
+                    SELECT 1 FROM analytics_campaignreach r
+                    WHERE r.tenant_id = ci.tenant_id
+                    AND r.campaign_id = ad.campaign_id
+                    AND r.user_id = ci.user_id
+                    AND r.first_seen < %s
+                )
+                GROUP BY ad.campaign_id
+            ) seen
+            GROUP BY campaign_id
+        )
+        """
+
+    @staticmethod
+    def _totals_params(tenant_id, reach: Optional[Dict[int, int]] = None):
+        watermark = to_db(get_watermark(tenant_id))
+        if reach is not None:
+            return [tenant_id, watermark] * 2 + [v for item in reach.items() for v in item]
+        return [tenant_id, watermark] * 4 + [watermark]
+
+    @staticmethod
+    def top_performing_campaigns(tenant_id, limit=10, reach=None):
+        sql = "WITH " + RollupRepository._campaign_totals_sql(reach) + """,
+        campaign_metrics AS (
+            SELECT
+                ca.id,
+                ca.name,
+                t.impressions as total_impressions,
+                t.spend as total_spend,
+                COALESCE(r.users, 0) as unique_users,
+                ROUND(t.spend / t.impressions, 4) as avg_cpm
+            FROM campaigns_campaign ca
+            JOIN totals t ON t.campaign_id = ca.id
+            LEFT JOIN reach r ON r.campaign_id = ca.id
+            WHERE ca.tenant_id = %s AND t.impressions > 0
+        )
+        SELECT *,
+               RANK() OVER (ORDER BY total_impressions DESC) as impression_rank,
+               RANK() OVER (ORDER BY avg_cpm ASC) as efficiency_rank
+        FROM campaign_metrics
+        ORDER BY total_impressions DESC
+        LIMIT %s
+        """
+        params = RollupRepository._totals_params(tenant_id, reach) + [tenant_id, limit]
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    @staticmethod
+    def campaign_performance_ranking(tenant_id: int, limit: int = 20,
+                                     reach: Optional[Dict[int, int]] = None) -> List[Dict]:
+        sql = "WITH " + RollupRepository._campaign_totals_sql(reach) + """,
+        campaign_metrics AS (
+            SELECT
+                ca.id as campaign_id,
+                ca.name as campaign_name,
+                ca.budget,
+                t.impressions as total_impressions,
+                COALESCE(r.users, 0) as unique_users,
+                t.spend as total_spend,
+                t.spend / t.impressions as avg_cpm,
+                t.impressions / NULLIF(r.users, 0) as frequency,
+                DATEDIFF(NOW(), ca.start_date) as days_running
+            FROM campaigns_campaign ca
+            JOIN totals t ON t.campaign_id = ca.id
+            LEFT JOIN reach r ON r.campaign_id = ca.id
+            WHERE ca.tenant_id = %s AND ca.status = 'active' AND t.impressions > 0
+        ),
+        performance_scores AS (
+            SELECT *,
+                ROUND(total_spend / NULLIF(budget, 0) * 100, 2) as budget_utilization,
+                ROUND(total_impressions / NULLIF(days_running, 0), 0) as daily_impression_rate,
+                ROW_NUMBER() OVER (ORDER BY total_impressions DESC) as impression_rank,
+                ROW_NUMBER() OVER (ORDER BY avg_cpm ASC) as efficiency_rank,
+                ROW_NUMBER() OVER (ORDER BY unique_users DESC) as reach_rank
+            FROM campaign_metrics
+        )
+        SELECT *,
+            ROUND((impression_rank + efficiency_rank + reach_rank) / 3.0, 1) as overall_score
+        FROM performance_scores
+        ORDER BY overall_score ASC
+        LIMIT %s
+        """
+        params = RollupRepository._totals_params(tenant_id, reach) + [tenant_id, limit]
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    def hourly_performance_trend(tenant_id: int, campaign_id: int, hours_back: int = 24) -> List[Dict]:
+        now = timezone.now()
+        start = now - timedelta(hours=hours_back)
+        watermark = get_watermark(tenant_id)
+
+        # [start, first full hour) and [watermark, now) are partial or open
+        # buckets and come from raw rows; the closed hours between them come
+        # from the campaign-wide rollup rows.
+        rollup_start = floor_hour(start) + timedelta(hours=1) if start != floor_hour(start) else start
+        rollup_end = max(min(watermark, now), rollup_start)
+        segments, params = [], []
+        raw_segment = f"""
+            SELECT {HOUR_BUCKET} as hour_bucket, COUNT(*) as impressions,
+                   COUNT(DISTINCT ci.user_id) as unique_users, SUM(ci.cost) as spend
+            FROM campaigns_impression ci
+            JOIN campaigns_ad ad ON ci.ad_id = ad.id
+            WHERE ci.tenant_id = %s AND ad.campaign_id = %s
+            AND ci.timestamp >= %s AND ci.timestamp < %s
+            GROUP BY hour_bucket
+        """
+        if start < rollup_start:
+            segments.append(raw_segment)
+            params += [tenant_id, campaign_id, to_db(start), to_db(min(rollup_start, now))]
+        if rollup_start < rollup_end:
+            segments.append("""
+            SELECT DATE_FORMAT(hour, '%%Y-%%m-%%d %%H:00:00') as hour_bucket,
+                   impressions, unique_users, spend
+            FROM analytics_impressionhourlyrollup
+            WHERE tenant_id = %s AND campaign_id = %s AND ad_id = 0
+            AND hour >= %s AND hour < %s
+            """)
+            params += [tenant_id, campaign_id, to_db(rollup_start), to_db(rollup_end)]
+        if max(rollup_end, start) < now:
+            segments.append(raw_segment)
+            params += [tenant_id, campaign_id, to_db(max(rollup_end, start)), to_db(now)]
+
+        sql = f"""
+        WITH hours AS (
+            {' UNION ALL '.join(segments)}
+        )
+        SELECT
+            hour_bucket,
+            impressions,
+            unique_users,
+            spend,
+            spend / impressions as avg_cost,
+            LAG(impressions) OVER (ORDER BY hour_bucket) as prev_hour_impressions,
+            CASE
+                WHEN LAG(impressions) OVER (ORDER BY hour_bucket) IS NULL THEN 0
+                ELSE ROUND((impressions - LAG(impressions) OVER (ORDER BY hour_bucket)) * 100.0 /
+                     NULLIF(LAG(impressions) OVER (ORDER BY hour_bucket), 0), 2)
+            END as growth_rate
+        FROM hours
+        WHERE impressions > 0
+        ORDER BY hour_bucket DESC
+        """
+        with optimized_analytics_cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
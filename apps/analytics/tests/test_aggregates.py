@@ -0,0 +1,77 @@
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.analytics.aggregates import dump_state, load_state, latest_snapshot, verify_replay
+from apps.analytics.events import emit_event, replay_events
+from apps.analytics.models import AggregateSnapshot, CampaignMetrics
+from tasks.analytics import calculate_daily_metrics
+from .utils import create_campaign_with_ads, create_impressions
+
+
+@override_settings(ANALYTICS_SNAPSHOT_EVERY_EVENTS=5)
+class AggregateSnapshotTest(TestCase):
+    def setUp(self):
+        self.campaign, _ = create_campaign_with_ads()
+        for i in range(12):
+            emit_event('impression_created', self.campaign.id, {'user_id': i % 4, 'cost': '0.50'}, tenant_id=1)
+
+    def test_replay_writes_metrics_and_snapshots(self):
+        self.assertEqual(len(replay_events(self.campaign.id, 1)), 12)
+        metrics = CampaignMetrics.objects.get(campaign_id=self.campaign.id)
+        self.assertEqual((metrics.impressions, metrics.unique_users), (12, 4))
+        self.assertEqual(
+            list(AggregateSnapshot.objects.order_by('sequence_number').values_list('sequence_number', flat=True)),
+            [5, 10]
+        )
+
+    @override_settings(ANALYTICS_SNAPSHOTS_KEPT=1)
+    def test_older_snapshots_are_dropped(self):
+        replay_events(self.campaign.id, 1)
+        self.assertEqual(list(AggregateSnapshot.objects.values_list('sequence_number', flat=True)), [10])
+
+        replay_events(self.campaign.id, 1, use_snapshot=False)
+        self.assertEqual(list(AggregateSnapshot.objects.values_list('sequence_number', flat=True)), [10])
+
+    def test_replay_only_folds_events_after_the_newest_snapshot(self):
+        replay_events(self.campaign.id, 1)
+        emit_event('click_registered', self.campaign.id, {'user_id': 9}, tenant_id=1)
+        self.assertEqual(len(replay_events(self.campaign.id, 1)), 3)
+        metrics = CampaignMetrics.objects.get(campaign_id=self.campaign.id)
+        self.assertEqual((metrics.impressions, metrics.clicks, metrics.unique_users), (12, 1, 5))
+
+    def test_verify_detects_a_bad_snapshot(self):
+        replay_events(self.campaign.id, 1)
+        self.assertTrue(verify_replay(1, self.campaign.id)['match'])
+
+        snapshot = latest_snapshot(1, self.campaign.id)
+        aggregate = load_state(snapshot.state)
+        aggregate.total_impressions += 1
+        snapshot.state = dump_state(aggregate)
+        snapshot.save()
+        result = verify_replay(1, self.campaign.id)
+        self.assertFalse(result['match'])
+        self.assertEqual(result['differences'], ['total_impressions'])
+
+
+class DailyMetricsTaskTest(TestCase):
+    def setUp(self):
+        self.campaign, self.ads = create_campaign_with_ads()
+
+    def test_unique_users_has_a_database_default(self):
+        # Raw upserts that predate the column leave it out
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO analytics_campaignmetrics (tenant_id, campaign_id, date, impressions, clicks, "
+                "conversions, spend) VALUES (%s, %s, %s, 0, 0, 0, 0)",
+                [1, self.campaign.id, timezone.now().date()]
+            )
+        self.assertEqual(CampaignMetrics.objects.get(campaign_id=self.campaign.id).unique_users, 0)
+
+    @skipUnless(connection.vendor == 'mysql', 'The daily job upserts with ON DUPLICATE KEY UPDATE')
+    def test_daily_job_upserts_unique_users(self):
+        create_impressions(self.ads, 6, users=3, hours_apart=0)
+        calculate_daily_metrics(1)
+        calculate_daily_metrics(1)
+        metrics = CampaignMetrics.objects.get(campaign_id=self.campaign.id)
+        self.assertEqual((metrics.impressions, metrics.unique_users), (6, 3))
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.analytics import archive
+from apps.analytics.archive import archive_expired_events, archive_storage, archived_events, purge_segment
+from apps.analytics.events import emit_event, replay_events
+from apps.analytics.models import AdEvent, CampaignMetrics, EventArchiveAggregate, EventArchiveSegment
+from tasks.analytics import cleanup_old_events
+from .utils import create_campaign_with_ads
+
+
+class EventArchiveTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(ANALYTICS_ARCHIVE_DIR=directory.name, ANALYTICS_ARCHIVE_DELETE_CHUNK=2,
+                                     ANALYTICS_ARCHIVE_DELETE_PAUSE=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.campaign, _ = create_campaign_with_ads()
+        self.now = timezone.now()
+        for days_ago in (40, 40, 40, 35, 1):
+            event = emit_event('impression_created', self.campaign.id, {'user_id': days_ago, 'cost': '1.00'},
+                               tenant_id=1)
+            AdEvent.objects.filter(id=event.id).update(timestamp=self.now - timedelta(days=days_ago))
+
+    def archive(self, **kwargs):
+        return archive_expired_events(self.now - timedelta(days=30), **kwargs)
+
+    def test_expired_events_are_exported_per_day_then_deleted(self):
+        result = self.archive()
+        self.assertEqual((result['segments'], result['archived_events'], result['deleted_events']), (2, 4, 4))
+        self.assertEqual(AdEvent.objects.count(), 1)
+
+        segment = EventArchiveSegment.objects.order_by('first_id').first()
+        self.assertTrue(segment.purged)
+        self.assertEqual((segment.day, segment.events), ((self.now - timedelta(days=40)).date(), 3))
+        with archive_storage().open(segment.path, 'rb') as handle:
+            rows = [json.loads(line) for line in gzip.GzipFile(fileobj=handle)]
+        self.assertEqual([row['sequence_number'] for row in rows], [1, 2, 3])
+        self.assertEqual(rows[0]['payload'], {'user_id': 40, 'cost': '1.00'})
+
+        self.assertEqual(self.archive()['segments'], 0)
+
+    def test_other_tenants_are_left_alone(self):
+        self.archive(tenant_id=2)
+        self.assertEqual(AdEvent.objects.count(), 5)
+        self.assertFalse(EventArchiveSegment.objects.exists())
+
+    def test_interrupted_delete_is_finished_without_exporting_again(self):
+        self.archive()
+        segment = EventArchiveSegment.objects.order_by('first_id').first()
+        EventArchiveSegment.objects.filter(id=segment.id).update(purged=False)
+        event = emit_event('impression_created', self.campaign.id, {}, tenant_id=1)
+        AdEvent.objects.filter(id=event.id).update(id=segment.first_id, timestamp=self.now - timedelta(days=40))
+
+        result = self.archive()
+        self.assertEqual((result['segments'], result['deleted_events']), (0, 1))
+        self.assertTrue(EventArchiveSegment.objects.get(id=segment.id).purged)
+
+    def test_full_replay_reads_archived_history(self):
+        self.archive()
+        replayed = replay_events(self.campaign.id, 1, use_snapshot=False)
+        self.assertEqual(len(replayed), 5)
+        self.assertEqual(sum(CampaignMetrics.objects.filter(campaign=self.campaign).values_list(
+            'impressions', flat=True)), 5)
+
+    def test_replay_reads_only_segments_holding_the_aggregate(self):
+        self.archive()
+        ranges = EventArchiveAggregate.objects.order_by('first_sequence').values_list(
+            'aggregate_id', 'first_sequence', 'last_sequence', 'events'
+        )
+        self.assertEqual(list(ranges), [(str(self.campaign.id), 1, 3, 3), (str(self.campaign.id), 4, 4, 1)])
+
+        with mock.patch.object(archive, 'read_segment', wraps=archive.read_segment) as read:
+            self.assertEqual([event.sequence_number for event in archived_events(1, self.campaign.id, 3)], [4])
+            self.assertEqual(read.call_count, 1)
+            self.assertEqual(list(archived_events(1, 'other-aggregate')), [])
+            self.assertEqual(read.call_count, 1)
+
+    def test_segments_without_ranges_are_still_read(self):
+        self.archive()
+        EventArchiveSegment.objects.update(aggregates_recorded=False)
+        EventArchiveAggregate.objects.all().delete()
+        self.assertEqual(len(list(archived_events(1, self.campaign.id))), 4)
+
+    @override_settings(ANALYTICS_EVENT_ARCHIVE=False)
+    def test_cleanup_without_archive_only_deletes(self):
+        result = cleanup_old_events(30)
+        self.assertEqual((result['segments'], result['deleted_events']), (0, 4))
+        self.assertEqual(AdEvent.objects.count(), 1)
+        self.assertFalse(EventArchiveSegment.objects.exists())
+
+    def test_nothing_is_removed_without_a_durable_location(self):
+        with override_settings(ANALYTICS_ARCHIVE_DIR=None):
+            result = self.archive()
+        self.assertEqual((result['skipped'], result['deleted_events']), ('no archive storage configured', 0))
+        self.assertEqual(AdEvent.objects.count(), 5)
+        self.assertFalse(EventArchiveSegment.objects.exists())
+
+    def test_replay_survives_a_missing_segment_file(self):
+        self.archive()
+        segment = EventArchiveSegment.objects.order_by('first_id').first()
+        archive_storage().delete(segment.path)
+        with self.assertLogs('apps.analytics.archive', 'ERROR'):
+            replayed = replay_events(self.campaign.id, 1, use_snapshot=False)
+        self.assertEqual(len(replayed), 2)
+
+    def test_segment_files_outlive_the_rows(self):
+        self.archive(tenant_id=1)
+        segment = EventArchiveSegment.objects.order_by('first_id').first()
+        self.assertEqual(purge_segment(segment), 0)
+        self.assertTrue(os.path.exists(archive_storage().path(segment.path)))
+
+    def test_command_lists_the_manifest(self):
+        out = StringIO()
+        call_command('archive_events', '--days', '30', stdout=out)
+        call_command('archive_events', '--list', stdout=out)
+        self.assertIn('Archived 4 events in 2 segments', out.getvalue())
+        self.assertIn('purged', out.getvalue())
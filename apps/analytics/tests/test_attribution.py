@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.analytics.attribution import (
+    ATTRIBUTION_MODELS, AttributionRepository, _attribute_user, refresh_attribution
+)
+from apps.authentication.models import User
+from apps.events.models import ImpressionEvent, ClickEvent, ConversionEvent
+from .utils import create_campaign_with_ads, create_impressions
+
+CONVERSION = datetime(2024, 3, 10, 12)
+TOUCHES = [CONVERSION - timedelta(days=days) for days in (9, 6, 3, 1)]
+
+
+class AttributionModelTest(SimpleTestCase):
+    def test_weights_sum_to_one(self):
+        for name, model in ATTRIBUTION_MODELS.items():
+            for touches in (TOUCHES[:1], TOUCHES[:2], TOUCHES):
+                with self.subTest(model=name, touches=len(touches)):
+                    self.assertAlmostEqual(sum(model(touches, CONVERSION)), 1.0)
+
+    def test_model_shapes(self):
+        self.assertEqual(ATTRIBUTION_MODELS['first_touch'](TOUCHES, CONVERSION), [1.0, 0.0, 0.0, 0.0])
+        self.assertEqual(ATTRIBUTION_MODELS['last_touch'](TOUCHES, CONVERSION), [0.0, 0.0, 0.0, 1.0])
+        self.assertEqual(ATTRIBUTION_MODELS['linear'](TOUCHES, CONVERSION), [0.25] * 4)
+        self.assertEqual(ATTRIBUTION_MODELS['position_based'](TOUCHES, CONVERSION), [0.4, 0.1, 0.1, 0.4])
+        decay = ATTRIBUTION_MODELS['time_decay'](TOUCHES, CONVERSION)
+        self.assertEqual(decay, sorted(decay))
+
+    def test_lookback_window_drops_old_touches(self):
+        credits = defaultdict(lambda: [0.0, 0.0, 0, 0.0])
+        touches = [(TOUCHES[0], 1), (TOUCHES[3], 2), (CONVERSION + timedelta(hours=1), 3)]
+        _attribute_user(touches, [(CONVERSION, Decimal('50.00'))], timedelta(days=7), credits)
+
+        campaigns = {campaign for (name, campaign, _) in credits if name == 'linear'}
+        self.assertEqual(campaigns, {2})
+        self.assertEqual(credits[('linear', 2, CONVERSION.date())][:3], [1.0, 50.0, 1])
+
+    def test_conversion_without_touches_is_unattributed(self):
+        credits = defaultdict(lambda: [0.0, 0.0, 0, 0.0])
+        _attribute_user([], [(CONVERSION, Decimal('10.00'))], timedelta(days=30), credits)
+        self.assertEqual(dict(credits), {})
+
+
+@mock.patch.object(AttributionRepository, 'is_ready', return_value=True)
+@mock.patch.object(AttributionRepository, 'attribution_analysis', return_value=[])
+class AttributionReportViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            username='attribution', email='attribution@example.com', password='x', tenant_id=1
+        ))
+
+    def test_days_back_is_validated_and_clamped(self, analysis, _):
+        self.assertEqual(self.client.get('/api/v1/analytics/attribution/', {'days_back': 'abc'}).status_code, 400)
+        for days_back, used in (('-5', 1), ('100000', 366), ('0', None)):
+            response = self.client.get('/api/v1/analytics/attribution/', {'days_back': days_back})
+            self.assertEqual((response.status_code, response.data['days_back']), (200, used))
+            self.assertEqual(analysis.call_args.args[-1], used)
+
+
+@skipUnless(connection.vendor == 'mysql', 'Attribution refresh uses MySQL upserts')
+class AttributionRefreshTest(TransactionTestCase):
+    def setUp(self):
+        self.campaign, ads = create_campaign_with_ads()
+        # User 0 is touched every 2 hours; the conversion follows the latest touch
+        create_impressions(ads, 6, users=1, hours_apart=2, offset_hours=4)
+        impression = ImpressionEvent.objects.create(
+            tenant_id=1, campaign=self.campaign, ad=ads[0], user_id=0, cost=Decimal('0.5000')
+        )
+        click = ClickEvent.objects.create(tenant_id=1, impression=impression)
+        conversion = ConversionEvent.objects.create(tenant_id=1, click=click, conversion_value=Decimal('80.00'))
+        ConversionEvent.objects.filter(pk=conversion.pk).update(timestamp=timezone.now() - timedelta(hours=3))
+
+    def test_every_model_credits_the_whole_conversion(self):
+        refresh_attribution(1)
+        for model in ATTRIBUTION_MODELS:
+            with self.subTest(model=model):
+                rows = AttributionRepository.attribution_analysis(1, model=model)
+                self.assertEqual([row[0] for row in rows], [self.campaign.id])
+                self.assertAlmostEqual(float(rows[0][2]), 1.0, places=4)
+                self.assertAlmostEqual(float(rows[0][3]), 80.0, places=2)
+
+    def test_refresh_is_incremental(self):
+        refresh_attribution(1)
+        refresh_attribution(1)
+        rows = AttributionRepository.attribution_analysis(1, model='linear')
+        self.assertAlmostEqual(float(rows[0][3]), 80.0, places=2)
+
+    def test_overlapping_refresh_does_not_double_count(self):
+        refresh_attribution(1)
+        # A run that read the watermark before the first one committed
+        with mock.patch('apps.analytics.rollups.get_watermark', return_value=None):
+            refresh_attribution(1)
+        rows = AttributionRepository.attribution_analysis(1, model='linear')
+        self.assertAlmostEqual(float(rows[0][3]), 80.0, places=2)
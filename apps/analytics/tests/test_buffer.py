@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from apps.analytics.models import AdEvent
+from apps.authentication.models import User
+from apps.campaigns.models import Impression
+from apps.events import buffer
+from .utils import create_campaign_with_ads
+
+
+@mock.patch('apps.events.buffer._ensure_flusher')
+class WriteBehindBufferTest(TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            ANALYTICS_WRITE_BEHIND=True,
+            ANALYTICS_WRITE_BEHIND_MAX_EVENTS=3,
+            ANALYTICS_WRITE_BEHIND_SPILL_DIR=self.spill_dir,
+        )
+        self.settings_override.enable()
+        buffer.reset_buffer()
+        cache.clear()
+        self.campaign, self.ads = create_campaign_with_ads()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        buffer.reset_buffer()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def impression(self):
+        return {'type': 'impression', 'campaign_id': self.campaign.id, 'ad_id': self.ads[0].id,
+                'user_id': 3, 'cost': '0.5000'}
+
+    def test_events_are_written_on_flush(self, _):
+        self.assertEqual(buffer.buffer_event(1, self.impression())['status'], 'buffered')
+        self.assertEqual(AdEvent.objects.count(), 0)
+
+        self.assertEqual(buffer.flush()['events'], 1)
+        event = AdEvent.objects.get()
+        self.assertEqual((event.event_type, event.sequence_number), ('impression_created', 1))
+        self.assertEqual(Impression.objects.count(), 1)
+        stats = buffer.buffer_stats()
+        self.assertEqual((stats['depth'], stats['flushed'], stats['flushes']), (0, 1, 1))
+
+    def test_full_buffer_drops_and_counts(self, _):
+        statuses = [buffer.buffer_event(1, self.impression())['status'] for _ in range(4)]
+        self.assertEqual(statuses, ['buffered'] * 3 + ['dropped'])
+        self.assertEqual(buffer.buffer_stats()['dropped'], 1)
+        self.assertEqual(buffer.buffer_event(1, {'type': 'click'})['status'], 'rejected')
+
+    def test_failed_flush_spills_and_replays(self, _):
+        buffer.buffer_event(1, self.impression())
+        buffer.buffer_event(1, self.impression())
+        with mock.patch('apps.events.buffer.ingest_batch', side_effect=OperationalError('gone away')):
+            report = buffer.flush()
+        self.assertEqual(report['spilled'], 2)
+        self.assertEqual(len(os.listdir(self.spill_dir)), 1)
+        self.assertEqual(buffer.buffer_stats()['depth'], 0)
+
+        buffer.buffer_event(1, self.impression())
+        buffer.flush()
+        self.assertEqual(os.listdir(self.spill_dir), [])
+        # Spilled events keep their place ahead of newer ones
+        self.assertEqual(
+            list(AdEvent.objects.order_by('sequence_number').values_list('sequence_number', flat=True)),
+            [1, 2, 3]
+        )
+
+    def test_unexpected_error_spills_instead_of_dropping(self, _):
+        buffer.buffer_event(1, self.impression())
+        with mock.patch('apps.events.buffer.ingest_batch', side_effect=ValueError('bad payload')):
+            report = buffer.flush()
+        self.assertEqual(report['spilled'], 1)
+        self.assertEqual(len(os.listdir(self.spill_dir)), 1)
+
+        buffer.flush()
+        self.assertEqual(AdEvent.objects.count(), 1)
+
+    def test_flush_skips_while_another_process_holds_the_lock(self, _):
+        buffer.buffer_event(1, self.impression())
+        cache.add(buffer.FLUSH_LOCK_KEY, 'other-worker', 60)
+        report = buffer.flush()
+        self.assertTrue(report['locked'])
+        self.assertEqual((AdEvent.objects.count(), buffer.buffer_stats()['depth']), (0, 1))
+
+        cache.delete(buffer.FLUSH_LOCK_KEY)
+        self.assertEqual(buffer.flush()['events'], 1)
+        self.assertIsNone(cache.get(buffer.FLUSH_LOCK_KEY))
+
+    def test_replay_stops_once_the_lock_is_lost(self, _):
+        buffer.buffer_event(1, self.impression())
+        buffer.buffer_event(1, self.impression())
+        for entry in buffer.get_buffer().pop_batch(2):
+            buffer.spill([entry])
+
+        write = buffer._write
+
+        def write_then_expire(entries):
+            # The lock runs out while the first file is being written, and another flusher takes it
+            result = write(entries)
+            cache.set(buffer.FLUSH_LOCK_KEY, 'other-worker', 60)
+            return result
+
+        with mock.patch('apps.events.buffer._write', side_effect=write_then_expire):
+            report = buffer.flush()
+        self.assertTrue(report['locked'])
+        self.assertEqual((AdEvent.objects.count(), len(os.listdir(self.spill_dir))), (1, 1))
+
+    def test_endpoint_acknowledges_before_writing(self, _):
+        user = User.objects.create_user(username='buffered', email='b@test.com', password='x', tenant_id=1)
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/v1/events/impression/', self.impression(), format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(AdEvent.objects.count(), 0)
+        self.assertEqual(client.get('/api/v1/events/buffer/').json()['depth'], 1)
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.analytics.repositories.cached import (
+    bump_tenant_version,
+    cache_stats,
+    get_tenant_version,
+    make_cache_key,
+    tenant_cached_query,
+)
+
+calls = []
+
+
+@tenant_cached_query()
+def campaign_totals(tenant_id, campaign_id=None, limit=10):
+    calls.append((tenant_id, campaign_id, limit))
+    return [{'campaign_id': campaign_id, 'limit': limit}]
+
+
+class TenantCachedQueryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+
+    def test_keys_are_deterministic(self):
+        key = make_cache_key('campaign_totals', 1, 5, {'limit': 10, 'campaign_id': 3})
+        self.assertEqual(key, make_cache_key('campaign_totals', 1, 5, {'campaign_id': 3, 'limit': 10}))
+        self.assertNotEqual(key, make_cache_key('campaign_totals', 1, 6, {'campaign_id': 3, 'limit': 10}))
+        self.assertNotEqual(key, make_cache_key('campaign_totals', 2, 5, {'campaign_id': 3, 'limit': 10}))
+
+    def test_positional_and_keyword_calls_share_entries(self):
+        campaign_totals(1, 3)
+        campaign_totals(1, campaign_id=3, limit=10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache_stats(['campaign_totals'])['campaign_totals']['hit'], 1)
+
+    def test_ingestion_invalidates_tenant(self):
+        campaign_totals(1)
+        campaign_totals(2)
+        version = get_tenant_version(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_tenant_version(1)
+        self.assertGreater(get_tenant_version(1), version)
+
+        campaign_totals(1)
+        campaign_totals(2)
+        self.assertEqual(calls, [(1, None, 10), (2, None, 10), (1, None, 10)])
+
+    @override_settings(ANALYTICS_QUERY_CACHE_MAX_BYTES=1)
+    def test_oversized_results_are_not_cached(self):
+        campaign_totals(1)
+        campaign_totals(1)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache_stats(['campaign_totals'])['campaign_totals']['oversize'], 2)
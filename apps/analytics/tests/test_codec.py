@@ -0,0 +1,66 @@
+import json
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from apps.analytics.codec import JSON_TAG, LazyPayload, decode_payload, encode_payload, reencode_legacy_payloads
+from apps.analytics.events import emit_event
+from apps.analytics.models import AdEvent
+
+IMPRESSION = {'campaign_id': 12, 'ad_id': 34, 'user_id': 56789, 'cost': '0.5000',
+              'timestamp': '2026-10-18T05:10:00.123456+00:00'}
+CLICK = {'campaign_id': 12, 'ad_id': 34, 'user_id': 56789, 'impression_id': None,
+         'timestamp': '2026-10-18T07:10:00+02:00'}
+CONVERSION = {'campaign_id': 12, 'user_id': 56789, 'conversion_value': '-12.50',
+              'timestamp': '2026-10-18T05:10:00'}
+
+
+class PayloadCodecTest(SimpleTestCase):
+    def test_known_payloads_are_packed_losslessly(self):
+        for schema_id, payload in enumerate((IMPRESSION, CLICK, CONVERSION), start=1):
+            data = encode_payload(payload)
+            self.assertEqual(data[0], schema_id)
+            self.assertEqual(decode_payload(data), payload)
+            self.assertLess(len(data), len(json.dumps(payload)) / 2)
+
+    def test_payloads_that_would_not_round_trip_fall_back_to_json(self):
+        for payload in (
+            {**IMPRESSION, 'cost': '.5'},
+            {**IMPRESSION, 'user_id': '56789'},
+            {**IMPRESSION, 'user_id': 2 ** 70},
+            {**IMPRESSION, 'extra': True},
+            {'writer': 3},
+        ):
+            data = encode_payload(payload)
+            self.assertEqual(data[0], JSON_TAG)
+            self.assertEqual(decode_payload(data), payload)
+
+    def test_decoding_waits_for_first_access(self):
+        payload = LazyPayload(encode_payload(IMPRESSION))
+        self.assertIsNone(payload._payload)
+        self.assertEqual(payload.get('cost'), '0.5000')
+        self.assertEqual(payload, IMPRESSION)
+
+
+class EncodedPayloadStorageTest(TestCase):
+    def test_events_store_encoded_payloads(self):
+        emit_event('impression_created', 12, IMPRESSION, tenant_id=1)
+        event = AdEvent.objects.get()
+        self.assertIsInstance(event.payload, LazyPayload)
+        self.assertEqual(event.payload.data[0], 1)
+        self.assertEqual(dict(event.payload), IMPRESSION)
+
+    def test_legacy_json_rows_are_readable_and_reencoded(self):
+        event = emit_event('impression_created', 12, IMPRESSION, tenant_id=1)
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE analytics_adevent SET payload = %s WHERE id = %s",
+                           [json.dumps(IMPRESSION).encode(), event.id])
+        self.assertEqual(AdEvent.objects.get().payload, IMPRESSION)
+
+        self.assertEqual(reencode_legacy_payloads(batch_size=1), 1)
+        stored = AdEvent.objects.get().payload
+        self.assertEqual((stored.data[0], dict(stored)), (1, IMPRESSION))
+
+        out = StringIO()
+        call_command('encode_event_payloads', '--report-only', stdout=out)
+        self.assertIn('bytes/event', out.getvalue())
@@ -0,0 +1,25 @@
+from unittest import skipUnless
+from django.db import connection
+from django.test import TransactionTestCase
+from apps.analytics.cohorts import refresh_cohorts, CohortRepository
+from apps.analytics.repository import AnalyticsRepository
+from .utils import create_campaign_with_ads, create_impressions
+
+
+@skipUnless(connection.vendor == 'mysql', 'Cohort matrix uses MySQL upserts')
+class CohortMatrixTest(TransactionTestCase):
+    def setUp(self):
+        _, ads = create_campaign_with_ads()
+        # Keep every impression in closed hours so the matrix covers them all
+        create_impressions(ads, 120, users=11, hours_apart=5, offset_hours=2)
+
+    def test_matrix_matches_full_recompute(self):
+        expected = AnalyticsRepository.cohort_analysis(1)
+        refresh_cohorts(1)
+
+        self.assertTrue(CohortRepository.is_ready(1))
+        self.assertEqual(list(AnalyticsRepository.cohort_analysis(1)), list(expected))
+
+    def test_refresh_is_incremental(self):
+        refresh_cohorts(1)
+        self.assertEqual(refresh_cohorts(1)['windows'], 0)
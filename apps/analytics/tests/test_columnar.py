@@ -0,0 +1,70 @@
+import json
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from django.test import SimpleTestCase, override_settings
+from apps.analytics import columnar
+from apps.analytics.columnar import ColumnarEngine
+
+D0 = 20000  # days since the epoch
+
+
+def write_columns(directory, rows, campaigns):
+    path = Path(directory) / 'tenant_1'
+    path.mkdir(parents=True)
+    names = [name for name, _ in columnar.COLUMNS]
+    data = columnar.np.array(rows, dtype=columnar.np.int64).reshape(-1, len(names))
+    for i, name in enumerate(names):
+        columnar.np.save(path / f'{name}.npy', data[:, i])
+    with open(path / 'manifest.json', 'w') as f:
+        json.dump({'tenant_id': 1, 'rows': len(rows), 'version': 1, 'created_at': '',
+                   'campaigns': {str(k): v for k, v in campaigns.items()}}, f)
+
+
+class ColumnarEngineTest(SimpleTestCase):
+    def setUp(self):
+        if columnar.np is None:
+            self.skipTest('NumPy not installed')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        day = columnar.SECONDS_PER_DAY
+        # ts, campaign_id, ad_id, user_id, cost (1/10000)
+        write_columns(self.directory, [
+            (D0 * day, 1, 1, 10, 5000),
+            (D0 * day + 60, 1, 1, 11, 5000),
+            (D0 * day + 120, 2, 2, 10, 10000),
+            ((D0 + 1) * day, 1, 1, 10, 5000),
+            ((D0 + 1) * day + 60, 1, 1, 10, 5000),
+            ((D0 + 2) * day, 2, 2, 12, 2500),
+            (D0 * day, 3, 3, 13, 100),  # campaign no longer owned by the tenant
+        ], {1: 'A', 2: 'B'})
+        override = override_settings(ANALYTICS_SNAPSHOT_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.engine = ColumnarEngine.load(1)
+
+    def day(self, offset):
+        return date.fromordinal(date(1970, 1, 1).toordinal() + D0 + offset)
+
+    def test_cohort_analysis(self):
+        self.assertEqual(self.engine.cohort_analysis(), [
+            (self.day(0), 0, 3, 4, Decimal('100.00')),
+            (self.day(0), 1, 1, 2, Decimal('33.33')),
+            (self.day(2), 0, 1, 1, Decimal('100.00')),
+        ])
+
+    def test_campaign_performance_window(self):
+        self.assertEqual(self.engine.campaign_performance_window(), [
+            (1, 'A', self.day(1), 2, Decimal('1.0000'), Decimal('0.50000000'), 1, 2, 2, Decimal('0.00')),
+            (1, 'A', self.day(0), 2, Decimal('1.0000'), Decimal('0.50000000'), 2, 1, None, None),
+            (2, 'B', self.day(2), 1, Decimal('0.2500'), Decimal('0.25000000'), 1, 2, 1, Decimal('0.00')),
+            (2, 'B', self.day(0), 1, Decimal('1.0000'), Decimal('1.00000000'), 1, 1, None, None),
+        ])
+
+    def test_top_performing_campaigns(self):
+        self.assertEqual(self.engine.top_performing_campaigns(), [
+            (1, 'A', 4, Decimal('2.0000'), 2, Decimal('0.5000'), 1, 1),
+            (2, 'B', 2, Decimal('1.2500'), 2, Decimal('0.6250'), 2, 2),
+        ])
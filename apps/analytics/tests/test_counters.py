@@ -0,0 +1,81 @@
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.analytics.counters import compact_counters, count_events, discard_counters, event_totals, reconcile_counters
+from apps.analytics.events import emit_event
+from apps.analytics.models import AdEvent, EventCounter
+from apps.authentication.models import User
+from apps.events.ingest import ingest_batch
+from .utils import create_campaign_with_ads
+
+
+class EventCounterTest(TestCase):
+    def setUp(self):
+        self.campaign, self.ads = create_campaign_with_ads()
+
+    def emit(self, event_type, hours_ago=0):
+        event = emit_event(event_type, self.campaign.id, {}, tenant_id=1)
+        if hours_ago:
+            AdEvent.objects.filter(id=event.id).update(timestamp=timezone.now() - timedelta(hours=hours_ago))
+        return event
+
+    def test_writes_are_counted(self):
+        self.emit('impression_created')
+        self.emit('impression_created')
+        ingest_batch(1, [{'type': 'click', 'campaign_id': self.campaign.id, 'ad_id': self.ads[0].id, 'user_id': 1}])
+        totals = event_totals(1)
+        self.assertEqual(totals['by_type'], {'impression_created': 2, 'click_registered': 1})
+        self.assertEqual((totals['total'], totals['last_hour']), (3, 3))
+        self.assertEqual(event_totals(2)['total'], 0)
+
+    def test_closed_hours_are_compacted(self):
+        old = timezone.now().replace(minute=10) - timedelta(hours=3)
+        count_events([AdEvent(tenant_id=1, event_type='x', timestamp=old),
+                      AdEvent(tenant_id=1, event_type='x', timestamp=old + timedelta(minutes=1))])
+        count_events([AdEvent(tenant_id=1, event_type='x', timestamp=timezone.now())])
+
+        self.assertEqual(compact_counters(), 2)
+        self.assertEqual(EventCounter.objects.filter(granularity=EventCounter.HOUR).get().count, 2)
+        self.assertEqual((event_totals(1)['total'], event_totals(1)['last_hour']), (3, 1))
+
+    def test_reconcile_seeds_and_corrects_closed_hours(self):
+        for _ in range(3):
+            self.emit('impression_created', hours_ago=5)
+        EventCounter.objects.all().delete()
+        self.assertEqual(reconcile_counters(1)['drift'], 3)
+        self.assertEqual(event_totals(1)['total'], 3)
+        self.assertEqual(reconcile_counters(1)['drift'], 0)
+
+        EventCounter.objects.update(count=10)
+        self.assertEqual(reconcile_counters(1)['drift'], 7)
+
+    def test_retention_drops_expired_buckets(self):
+        for _ in range(2):
+            self.emit('impression_created', hours_ago=30)
+        self.emit('impression_created', hours_ago=5)
+        EventCounter.objects.all().delete()
+        reconcile_counters(1)
+        cutoff = timezone.now() - timedelta(hours=24)
+        AdEvent.objects.filter(timestamp__lt=cutoff).delete()
+        discard_counters(1, cutoff)
+        self.assertEqual(event_totals(1)['total'], 1)
+
+    def test_uncounted_tenant_falls_back_to_the_table(self):
+        self.emit('impression_created', hours_ago=5)
+        self.emit('click_registered')
+        EventCounter.objects.all().delete()
+        totals = event_totals(1)
+        self.assertEqual(totals['by_type'], {'impression_created': 1, 'click_registered': 1})
+        self.assertEqual((totals['total'], totals['last_hour']), (2, 1))
+
+    def test_event_stats_reads_counters(self):
+        self.emit('conversion_tracked')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            username='stats', email='stats@example.com', password='x', tenant_id=1
+        ))
+        with self.assertNumQueries(1):
+            response = client.get('/api/v1/events/stats/')
+        self.assertEqual(response.data['event_counts']['conversion_tracked'], 1)
+        self.assertEqual(response.data['total_events'], 1)
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.analytics.events import decode_cursor, emit_event, get_event_page
+from apps.analytics.models import AdEvent
+from apps.authentication.models import User
+
+
+class EventPageTest(TestCase):
+    def setUp(self):
+        for i in range(25):
+            emit_event('impression_created', 42, {'user_id': i}, tenant_id=1)
+        emit_event('impression_created', 42, {}, tenant_id=2)
+
+    def sequences(self, page):
+        return [event['sequence_number'] for event in page['events']]
+
+    def test_pages_walk_back_without_overlap(self):
+        seen, cursor = [], None
+        while True:
+            page = get_event_page(42, 1, limit=10, cursor=cursor)
+            seen.extend(self.sequences(page))
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, list(range(25, 0, -1)))
+        self.assertIsNone(cursor)
+
+    @override_settings(ANALYTICS_PROJECTION_SETTLE_SECONDS=0)
+    def test_since_sequence_tails_the_aggregate(self):
+        page = get_event_page(42, 1, limit=10, since_sequence=20)
+        self.assertEqual(self.sequences(page), [21, 22, 23, 24, 25])
+
+        # An exhausted tail still hands back a cursor to poll with
+        empty = get_event_page(42, 1, cursor=page['next_cursor'])
+        self.assertEqual(empty['events'], [])
+        emit_event('click_registered', 42, {}, tenant_id=1)
+        self.assertEqual(self.sequences(get_event_page(42, 1, cursor=empty['next_cursor'])), [26])
+
+    def test_tail_waits_for_unsettled_numbers(self):
+        AdEvent.objects.filter(tenant_id=1).update(timestamp=timezone.now() - timedelta(minutes=1))
+        # 26 was reserved first but committed last
+        late = emit_event('click_registered', 42, {}, tenant_id=1)
+        emit_event('click_registered', 42, {}, tenant_id=1)
+        AdEvent.objects.filter(sequence_number=27, tenant_id=1).update(timestamp=timezone.now() - timedelta(minutes=1))
+
+        page = get_event_page(42, 1, since_sequence=24)
+        self.assertEqual(self.sequences(page), [25])
+        AdEvent.objects.filter(id=late.id).update(timestamp=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.sequences(get_event_page(42, 1, cursor=page['next_cursor'])), [26, 27])
+
+    def test_bad_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+        user = User.objects.create_user(username='pager', email='p@test.com', password='x', tenant_id=1)
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/v1/events/stream/42/?cursor=garbage').status_code, 400)
+        response = client.get('/api/v1/analytics/audit/campaign/42/events/?limit=5')
+        self.assertEqual(len(response.json()['audit_events']), 5)
+        self.assertTrue(response.json()['has_more'])
+
+
+@skipUnless(connection.vendor == 'mysql', 'EXPLAIN FORMAT=JSON is MySQL specific')
+class EventPageIndexTest(TestCase):
+    def test_page_is_an_index_range_scan(self):
+        queryset = AdEvent.objects.filter(
+            tenant_id=1, aggregate_id='42', sequence_number__lt=1000
+        ).order_by('-sequence_number')[:100]
+        plan = queryset.explain(format='json')
+        self.assertIn('unique_event_sequence', plan)
+        self.assertNotIn('filesort', plan)
@@ -0,0 +1,58 @@
+import json
+import os
+import tracemalloc
+from io import StringIO
+from types import SimpleNamespace
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from apps.analytics.export import export_response
+from apps.analytics.renderers import CSVRenderer, NDJSONRenderer
+from .utils import create_campaign_with_ads, create_impressions
+
+EXPORT_SQL = "SELECT id, user_id, cost FROM campaigns_impression WHERE tenant_id = %s ORDER BY id"
+
+
+def export_request(renderer):
+    return SimpleNamespace(accepted_renderer=renderer())
+
+
+class ExportResponseTest(TestCase):
+    def setUp(self):
+        _, ads = create_campaign_with_ads()
+        self.impressions = create_impressions(ads, 5)
+
+    def test_ndjson_streams_one_object_per_line(self):
+        response = export_response(export_request(NDJSONRenderer), EXPORT_SQL, [1], 'impressions')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([json.loads(line)['id'] for line in lines], [i.pk for i in self.impressions])
+
+    def test_csv_has_header_and_rows(self):
+        response = export_response(export_request(CSVRenderer), EXPORT_SQL, [1], 'impressions')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="impressions.csv"')
+        self.assertEqual(lines[0], 'id,user_id,cost')
+        self.assertEqual(len(lines), 6)
+
+
+@skipUnless(connection.vendor == 'mysql', 'Server-side cursors need MySQL')
+@skipUnless(os.environ.get('ANALYTICS_MILLION_ROW_TESTS'), 'Loads a million impressions')
+class MillionRowExportTest(TransactionTestCase):
+    MEMORY_CEILING = 64 * 1024 * 1024
+
+    def setUp(self):
+        call_command('load_million_records', records=1000000, tenant_id=1, stdout=StringIO())
+
+    def test_export_memory_stays_flat(self):
+        tracemalloc.start()
+        response = export_response(export_request(NDJSONRenderer), EXPORT_SQL, [1], 'impressions')
+        rows = sum(chunk.count(b'\n') for chunk in response.streaming_content)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(rows, 1000000)
+        self.assertLess(peak, self.MEMORY_CEILING)
@@ -0,0 +1,34 @@
+import time
+from django.test import SimpleTestCase
+from apps.analytics.fanout import fan_out
+
+
+def slow(value, seconds):
+    def branch():
+        time.sleep(seconds)
+        return value
+    return branch
+
+
+def failing():
+    raise RuntimeError('boom')
+
+
+class FanOutTest(SimpleTestCase):
+    def test_branches_run_concurrently(self):
+        started = time.perf_counter()
+        fanout = fan_out({'a': slow(1, 0.2), 'b': slow(2, 0.2), 'c': slow(3, 0.2)})
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(fanout['results'], {'a': 1, 'b': 2, 'c': 3})
+        self.assertFalse(fanout['partial'])
+        self.assertGreaterEqual(fanout['timings_ms']['a'], 200)
+
+    def test_slow_and_failing_branches_yield_partial_results(self):
+        fanout = fan_out({'fast': slow('ok', 0), 'slow': slow('late', 1), 'broken': failing}, timeout=0.2)
+
+        self.assertEqual(fanout['results'], {'fast': 'ok', 'slow': None, 'broken': None})
+        self.assertEqual(fanout['errors'], {'slow': 'timeout', 'broken': 'boom'})
+        self.assertTrue(fanout['partial'])
+        self.assertIsNone(fanout['timings_ms']['slow'])
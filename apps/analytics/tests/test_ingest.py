@@ -0,0 +1,74 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from apps.analytics.events import validate_event_sequence
+from apps.analytics.models import AdEvent
+from apps.authentication.models import User
+from apps.campaigns.models import Impression
+from apps.events.ingest import ingest_batch
+from .utils import create_campaign_with_ads
+
+
+class BatchIngestTest(TestCase):
+    def setUp(self):
+        self.campaign, self.ads = create_campaign_with_ads()
+        other, self.foreign_ads = create_campaign_with_ads(tenant_id=2, ads=1, name='Other')
+
+    def item(self, kind, **fields):
+        item = {'type': kind, 'campaign_id': self.campaign.id, 'user_id': 5}
+        if kind != 'conversion':
+            item['ad_id'] = self.ads[0].id
+        item.update(fields)
+        return item
+
+    def test_mixed_batch_is_recorded_in_order(self):
+        items = [self.item('impression', cost='0.25'), self.item('click'), self.item('conversion', conversion_value='12.50')]
+        result = ingest_batch(1, items)
+
+        self.assertEqual((result['recorded'], result['rejected']), (3, 0))
+        self.assertEqual([r['sequence_number'] for r in result['results']], [1, 2, 3])
+        self.assertEqual(
+            list(AdEvent.objects.order_by('sequence_number').values_list('event_type', flat=True)),
+            ['impression_created', 'click_registered', 'conversion_tracked']
+        )
+        self.assertEqual(Impression.objects.filter(tenant_id=1).count(), 1)
+        self.assertTrue(validate_event_sequence(self.campaign.id, 1)['valid'])
+
+    def test_invalid_and_foreign_items_are_rejected_individually(self):
+        items = [
+            self.item('impression'),
+            self.item('impression', ad_id=self.foreign_ads[0].id),
+            self.item('click', user_id='abc'),
+            {'type': 'bounce'},
+            'not an object',
+            self.item('conversion', campaign_id=self.foreign_ads[0].campaign_id),
+        ]
+        result = ingest_batch(1, items)
+
+        self.assertEqual((result['recorded'], result['rejected']), (1, 5))
+        statuses = [r['status'] for r in result['results']]
+        self.assertEqual(statuses, ['recorded'] + ['rejected'] * 5)
+        self.assertIn('ad_id', result['results'][1]['errors'])
+        self.assertIn('user_id', result['results'][2]['errors'])
+        self.assertIn('campaign_id', result['results'][5]['errors'])
+        self.assertEqual(AdEvent.objects.count(), 1)
+
+    def test_batches_continue_the_aggregate_sequence(self):
+        ingest_batch(1, [self.item('click') for _ in range(3)])
+        result = ingest_batch(1, [self.item('click') for _ in range(2)])
+        self.assertEqual([r['sequence_number'] for r in result['results']], [4, 5])
+
+    def test_ndjson_endpoint(self):
+        user = User.objects.create_user(username='ingest', email='i@test.com', password='x', tenant_id=1)
+        client = APIClient()
+        client.force_authenticate(user)
+        body = '\n'.join([
+            '{"type": "impression", "campaign_id": %d, "ad_id": %d, "user_id": 1}' % (self.campaign.id, self.ads[0].id),
+            '',
+            '{"type": "click", "campaign_id": %d, "ad_id": 0, "user_id": 1}' % self.campaign.id,
+        ])
+        response = client.post('/api/v1/events/batch/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['recorded'], 1)
+
+        response = client.post('/api/v1/events/batch/', '{"type": ', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+from unittest import skipUnless
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+from apps.analytics.models import AdEvent
+from apps.analytics.partitions import (
+    _partition_clause, create_future_partitions, drop_expired_partitions,
+    list_partitions, next_period, period_start
+)
+
+
+class PartitionLayoutTest(SimpleTestCase):
+    def test_month_periods(self):
+        self.assertEqual(period_start(date(2024, 1, 31), 'month'), date(2024, 1, 1))
+        self.assertEqual(next_period(date(2024, 1, 31), 'month'), date(2024, 2, 1))
+        self.assertEqual(next_period(date(2024, 12, 1), 'month'), date(2025, 1, 1))
+
+    def test_partition_clause_is_named_after_its_first_day(self):
+        self.assertEqual(
+            _partition_clause(date(2024, 2, 28), 'day'),
+            "PARTITION p20240228 VALUES LESS THAN ('2024-02-29')"
+        )
+
+
+@skipUnless(connection.vendor == 'mysql', 'Native partitioning is MySQL specific')
+class PartitionLifecycleTest(TransactionTestCase):
+    def test_future_partitions_then_drop(self):
+        today = timezone.now().date()
+        create_future_partitions('analytics_adevent', today + timedelta(days=20))
+        bounds = [bound for _, bound, _ in list_partitions('analytics_adevent') if bound]
+        self.assertGreaterEqual(bounds[-1], today + timedelta(days=21))
+
+        AdEvent.objects.create(tenant_id=1, event_type='impression', aggregate_id='1', payload={}, sequence_number=1)
+        retired = drop_expired_partitions('analytics_adevent', timezone.now() + timedelta(days=1))
+        self.assertIn(f'p{today:%Y%m%d}', retired['dropped'])
+        self.assertFalse(AdEvent.objects.exists())
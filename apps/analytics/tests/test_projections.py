@@ -0,0 +1,135 @@
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.analytics.events import emit_event, validate_event_sequence
+from apps.analytics.models import (
+    AdEvent, CampaignMetrics, EventArchiveAggregate, EventArchiveSegment, ProjectionCheckpoint, SequenceIssue
+)
+from apps.analytics.projections import (
+    PROJECTIONS, CampaignConversionsProjection, projection_lag, reset_projection, run_projection, shard_tenants
+)
+from apps.analytics.rebuild import rebuild_campaign
+from apps.authentication.models import User
+from .utils import create_campaign_with_ads
+
+NAME = 'campaign_conversions'
+
+
+@override_settings(ANALYTICS_PROJECTION_SETTLE_SECONDS=0)
+class ProjectionRuntimeTest(TestCase):
+    def setUp(self):
+        self.campaign, _ = create_campaign_with_ads()
+        emit_event('impression_created', self.campaign.id, {'user_id': 1, 'cost': '1.00'}, tenant_id=1)
+        for _ in range(3):
+            emit_event('conversion_tracked', self.campaign.id, {'user_id': 1}, tenant_id=1)
+
+    def conversions(self):
+        return CampaignMetrics.objects.get(campaign=self.campaign).conversions
+
+    def test_handlers_are_registered_by_event_type(self):
+        self.assertEqual(CampaignConversionsProjection.handlers, {'conversion_tracked': 'on_conversion'})
+
+    def test_events_are_applied_once_from_the_checkpoint(self):
+        self.assertEqual(run_projection(NAME, 1)['events'], 4)
+        self.assertEqual(self.conversions(), 3)
+        self.assertEqual(run_projection(NAME, 1)['events'], 0)
+
+        last = emit_event('conversion_tracked', self.campaign.id, {'user_id': 2}, tenant_id=1)
+        run_projection(NAME, 1)
+        self.assertEqual(self.conversions(), 4)
+        self.assertEqual(ProjectionCheckpoint.objects.get(name=NAME, tenant_id=1).position, last.id)
+
+    def test_reset_rebuilds_the_read_model(self):
+        run_projection(NAME, 1)
+        self.assertEqual(reset_projection(NAME), 1)
+        self.assertEqual(self.conversions(), 0)
+        self.assertEqual(projection_lag(1)[0]['events_behind'], 4)
+
+        run_projection(NAME, 1)
+        self.assertEqual(self.conversions(), 3)
+        self.assertEqual(projection_lag(1)[0]['events_behind'], 0)
+
+    def test_metrics_rebuild_keeps_projected_conversions(self):
+        run_projection(NAME, 1)
+        rebuild_campaign(1, self.campaign.id)
+        metrics = CampaignMetrics.objects.get(campaign=self.campaign)
+        self.assertEqual((metrics.impressions, metrics.conversions), (1, 3))
+
+    @override_settings(ANALYTICS_PROJECTION_SETTLE_SECONDS=60)
+    def test_unsettled_events_wait(self):
+        self.assertEqual(run_projection(NAME, 1)['events'], 0)
+
+    def test_tenants_are_sharded_by_modulo(self):
+        emit_event('conversion_tracked', 99, {}, tenant_id=2)
+        emit_event('conversion_tracked', 99, {}, tenant_id=3)
+        self.assertEqual(shard_tenants(0, 2), [2])
+        self.assertEqual(shard_tenants(1, 2), [1, 3])
+
+
+@override_settings(ANALYTICS_PROJECTION_SETTLE_SECONDS=0)
+class SequenceIntegrityMonitorTest(TestCase):
+    def append(self, *sequences, aggregate_id='7'):
+        for sequence in sequences:
+            AdEvent.objects.create(tenant_id=1, event_type='x', aggregate_id=aggregate_id, payload={},
+                                   sequence_number=sequence)
+
+    def issues(self):
+        return list(SequenceIssue.objects.order_by('first_sequence').values_list(
+            'kind', 'first_sequence', 'last_sequence'
+        ))
+
+    def test_only_appended_events_are_checked(self):
+        self.append(1, 2, 5)
+        self.append(1, 2, aggregate_id='8')
+        run_projection('sequence_integrity', 1)
+        self.assertEqual(self.issues(), [('gap', 3, 4)])
+
+        self.append(6, 9)
+        run_projection('sequence_integrity', 1)
+        self.assertEqual(self.issues(), [('gap', 3, 4), ('gap', 7, 8)])
+
+    def test_late_numbers_close_their_gap(self):
+        self.append(1, 5)
+        run_projection('sequence_integrity', 1)
+        self.append(3)
+        run_projection('sequence_integrity', 1)
+        self.assertEqual(self.issues(), [('gap', 2, 2), ('gap', 4, 4)])
+
+    def test_repeated_numbers_are_duplicates(self):
+        self.append(1, 2)
+        event = AdEvent.objects.get(sequence_number=2)
+        repeat = AdEvent(id=event.id + 1, tenant_id=1, aggregate_id='7', sequence_number=2)
+        PROJECTIONS['sequence_integrity'].apply(1, [repeat])
+        self.assertEqual(self.issues(), [('duplicate', 2, 2)])
+
+    def test_only_archived_numbers_excuse_a_leading_gap(self):
+        segment = EventArchiveSegment.objects.create(
+            tenant_id=1, day=timezone.now().date(), path='events/tenant_1/segment.ndjson.gz', first_id=1, last_id=3,
+            events=3, size_bytes=1, cutoff=timezone.now(), purged=True, aggregates_recorded=True,
+        )
+        EventArchiveAggregate.objects.create(segment=segment, tenant_id=1, aggregate_id='7', first_sequence=1,
+                                             last_sequence=3, events=3)
+        self.append(4, 5)
+        self.append(3, 4, aggregate_id='8')
+        run_projection('sequence_integrity', 1)
+        self.assertEqual(self.issues(), [('gap', 1, 2)])
+        self.assertEqual(SequenceIssue.objects.get().aggregate_id, '8')
+
+        self.assertTrue(validate_event_sequence(7, 1)['valid'])
+        self.assertEqual(validate_event_sequence(8, 1)['gaps'][0]['expected'], 1)
+
+    def test_api_lists_issues(self):
+        self.append(2)
+        run_projection('sequence_integrity', 1)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            username='monitor', email='monitor@example.com', password='x', tenant_id=1
+        ))
+        response = client.get('/api/v1/events/integrity/', {'aggregate_id': '7'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_issues'], 1)
+        self.assertEqual(response.data['monitor'][0]['events_behind'], 0)
+
+        self.assertEqual(client.get('/api/v1/events/integrity/', {'limit': 'ten'}).status_code, 400)
+        response = client.get('/api/v1/events/integrity/', {'limit': '-5'})
+        self.assertEqual((response.status_code, len(response.data['issues'])), (200, 1))
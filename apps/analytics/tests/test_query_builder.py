@@ -0,0 +1,85 @@
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import skipUnless
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from apps.analytics.repositories.query_builder import SQLQueryBuilder, TimeWindow, bucket_expression
+from apps.analytics.views import get_total_impressions_today
+from apps.campaigns.models import Impression
+from .utils import create_campaign_with_ads, create_impressions
+
+NOW = datetime(2024, 3, 10, 15, 30, tzinfo=dt_timezone.utc)
+
+
+class TimeWindowTest(SimpleTestCase):
+    def test_today_is_half_open_utc_day(self):
+        window = TimeWindow.today(now=NOW)
+        self.assertEqual(window.params, [datetime(2024, 3, 10), datetime(2024, 3, 11)])
+
+    def test_trailing_windows_end_now(self):
+        self.assertEqual(TimeWindow.last_hour(NOW).params, [datetime(2024, 3, 10, 14, 30), datetime(2024, 3, 10, 15, 30)])
+        self.assertEqual(TimeWindow.last_n_days(7, NOW).first_date, date(2024, 3, 3))
+
+    @override_settings(ANALYTICS_TENANT_TIMEZONES={7: 'America/New_York'})
+    def test_tenant_day_follows_dst(self):
+        # US clocks sprang forward on 2024-03-10, so that local day is 23 hours long
+        window = TimeWindow.tenant_day(7, date(2024, 3, 10))
+        self.assertEqual(window.params, [datetime(2024, 3, 10, 5), datetime(2024, 3, 11, 4)])
+        self.assertEqual(window.bucket('ci.timestamp', 'day'), 'DATE((ci.timestamp + INTERVAL -18000 SECOND))')
+
+    def test_builder_compiles_half_open_range(self):
+        sql, params = (
+            SQLQueryBuilder("SELECT COUNT(*) FROM campaigns_impression")
+            .add_tenant_filter(1)
+            .add_time_window(TimeWindow.today(now=NOW))
+            .build()
+        )
+        self.assertEqual(sql, "SELECT COUNT(*) FROM campaigns_impression WHERE tenant_id = %s AND timestamp >= %s AND timestamp < %s")
+        self.assertEqual(params, [1, datetime(2024, 3, 10), datetime(2024, 3, 11)])
+
+    def test_bucket_expression(self):
+        self.assertEqual(bucket_expression('ci.timestamp'), "DATE_FORMAT(ci.timestamp, '%%Y-%%m-%%d %%H:00:00')")
+
+
+class TodayPredicateTest(TestCase):
+    def test_counts_only_todays_impressions(self):
+        _, ads = create_campaign_with_ads()
+        create_impressions(ads, 3, hours_apart=0)
+        # Exactly at midnight belongs to today, one microsecond before does not
+        midnight = TimeWindow.today().start
+        create_impressions(ads, 1, offset_hours=0)
+        Impression.objects.filter(pk=Impression.objects.latest('pk').pk).update(timestamp=midnight)
+        create_impressions(ads, 1)
+        Impression.objects.filter(pk=Impression.objects.latest('pk').pk).update(timestamp=midnight - timedelta(microseconds=1))
+        self.assertEqual(get_total_impressions_today(1), 4)
+
+
+@skipUnless(connection.vendor == 'mysql', 'EXPLAIN FORMAT=JSON is MySQL specific')
+class IndexRangeScanTest(TestCase):
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params)
+            return json.loads(cursor.fetchone()[0])
+
+    def assert_range_scan(self, plan):
+        table = plan['query_block'].get('table') or plan['query_block']['ordering_operation']['table']
+        self.assertEqual(table['access_type'], 'range')
+        self.assertIn('timestamp', table['used_key_parts'])
+
+    def test_today_uses_tenant_timestamp_index(self):
+        sql, params = (
+            SQLQueryBuilder("SELECT COUNT(*) FROM campaigns_impression")
+            .add_tenant_filter(1)
+            .add_time_window(TimeWindow.today())
+            .build()
+        )
+        self.assert_range_scan(self.explain(sql, params))
+
+    def test_last_hour_uses_tenant_timestamp_index(self):
+        sql, params = (
+            SQLQueryBuilder("SELECT COALESCE(SUM(cost), 0) FROM campaigns_impression")
+            .add_tenant_filter(1)
+            .add_time_window(TimeWindow.last_hour())
+            .build()
+        )
+        self.assert_range_scan(self.explain(sql, params))
@@ -0,0 +1,54 @@
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from apps.analytics.events import emit_event
+from apps.analytics.models import CampaignMetrics
+from apps.analytics.rebuild import campaign_ids_with_events, rebuild_campaigns, run_progress, start_run
+from .utils import create_campaign_with_ads
+
+
+class MetricsRebuildTest(TestCase):
+    def setUp(self):
+        self.first, _ = create_campaign_with_ads(name='First')
+        self.second, _ = create_campaign_with_ads(name='Second')
+        for campaign in (self.first, self.second):
+            for i in range(6):
+                emit_event('impression_created', campaign.id, {'user_id': i % 3, 'cost': '1.00'}, tenant_id=1)
+        emit_event('impression_created', 'not-a-campaign', {}, tenant_id=1)
+
+    def test_only_campaign_aggregates_are_rebuilt(self):
+        self.assertEqual(campaign_ids_with_events(1), sorted([self.first.id, self.second.id]))
+
+    def test_rebuild_upserts_and_keeps_conversions(self):
+        rebuild_campaigns(1, [self.first.id])
+        CampaignMetrics.objects.filter(campaign=self.first).update(conversions=4)
+        emit_event('click_registered', self.first.id, {'user_id': 7}, tenant_id=1)
+
+        rebuild_campaigns(1, [self.first.id])
+        metrics = CampaignMetrics.objects.get(campaign=self.first)
+        self.assertEqual(
+            (metrics.impressions, metrics.clicks, metrics.conversions, metrics.unique_users),
+            (6, 1, 4, 4)
+        )
+
+    def test_progress_counts_campaigns_and_failures(self):
+        run_id = start_run(1, 3)
+        result = rebuild_campaigns(1, [self.first.id, self.second.id, 'broken'], run_id)
+        self.assertEqual((result['rebuilt'], result['failed']), (2, ['broken']))
+        progress = run_progress(run_id)
+        self.assertEqual((progress['done'], progress['failed'], progress['events']), (2, 1, 12))
+        self.assertTrue(progress['finished'])
+
+    def test_command_rebuilds_inline(self):
+        out = StringIO()
+        call_command('rebuild_metrics', '--tenant', '1', '--inline', stdout=out)
+        self.assertIn('Rebuilt 2 campaigns', out.getvalue())
+        self.assertEqual(CampaignMetrics.objects.filter(tenant_id=1).count(), 2)
+
+    def test_expired_progress_does_not_abort_the_rebuild(self):
+        out = StringIO()
+        with mock.patch('apps.analytics.management.commands.rebuild_metrics.start_run', return_value='expired'):
+            call_command('rebuild_metrics', '--tenant', '1', '--inline', stdout=out)
+        self.assertIn('Rebuilt 2 campaigns (12 events)', out.getvalue())
+        self.assertEqual(CampaignMetrics.objects.filter(tenant_id=1).count(), 2)
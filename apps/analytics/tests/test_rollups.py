@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from apps.analytics.repository import AnalyticsRepository
+from apps.analytics.rollups import advance_watermark, day_windows, refresh_rollups, verify_rollups, get_watermark
+from .utils import create_campaign_with_ads, create_impressions
+
+
+class DayWindowsTest(SimpleTestCase):
+    def test_windows_split_at_midnight(self):
+        start = datetime(2025, 1, 1, 22, tzinfo=dt_timezone.utc)
+        end = datetime(2025, 1, 3, 2, tzinfo=dt_timezone.utc)
+        windows = list(day_windows(start, end))
+        self.assertEqual(windows, [
+            (start, datetime(2025, 1, 2, tzinfo=dt_timezone.utc)),
+            (datetime(2025, 1, 2, tzinfo=dt_timezone.utc), datetime(2025, 1, 3, tzinfo=dt_timezone.utc)),
+            (datetime(2025, 1, 3, tzinfo=dt_timezone.utc), end),
+        ])
+
+
+class WatermarkTest(TestCase):
+    start = datetime(2025, 1, 1, 6, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.folded = []
+
+    def fold(self, cursor, tenant_id, start, end):
+        self.folded.append((start, end))
+
+    def test_back_to_back_runs_fold_each_hour_once(self):
+        first_until = datetime(2025, 1, 2, 12, tzinfo=dt_timezone.utc)
+        with mock.patch('apps.analytics.rollups.first_impression_time', return_value=self.start):
+            self.assertEqual(advance_watermark(1, 'test', self.fold, until=first_until)['windows'], 2)
+            # Started from the same watermark as the first run, but only got the lock after it
+            with mock.patch('apps.analytics.rollups.get_watermark', return_value=None):
+                result = advance_watermark(1, 'test', self.fold, until=datetime(2025, 1, 3, 3, tzinfo=dt_timezone.utc))
+
+        self.assertEqual(result['windows'], 2)
+        self.assertEqual(self.folded[2:], [
+            (first_until, datetime(2025, 1, 3, tzinfo=dt_timezone.utc)),
+            (datetime(2025, 1, 3, tzinfo=dt_timezone.utc), datetime(2025, 1, 3, 3, tzinfo=dt_timezone.utc)),
+        ])
+        hours = [start + timedelta(hours=h) for start, end in self.folded
+                 for h in range(int((end - start).total_seconds() // 3600))]
+        self.assertEqual(len(hours), len(set(hours)))
+        self.assertEqual(get_watermark(1, 'test'), datetime(2025, 1, 3, 3, tzinfo=dt_timezone.utc))
+
+    def test_since_refolds_without_moving_the_watermark_back(self):
+        until = datetime(2025, 1, 2, 12, tzinfo=dt_timezone.utc)
+        with mock.patch('apps.analytics.rollups.first_impression_time', return_value=self.start):
+            advance_watermark(1, 'test', self.fold, until=until)
+        advance_watermark(1, 'test', self.fold, since=self.start, until=datetime(2025, 1, 2, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.folded[2], (self.start, datetime(2025, 1, 2, tzinfo=dt_timezone.utc)))
+        self.assertEqual(get_watermark(1, 'test'), until)
+
+
+@skipUnless(connection.vendor == 'mysql', 'Rollups use MySQL upserts')
+@override_settings(ANALYTICS_QUERY_CACHE_ENABLED=False)
+class RollupConsistencyTest(TransactionTestCase):
+    def setUp(self):
+        self.campaign, ads = create_campaign_with_ads()
+        create_impressions(ads, 60)
+
+    def test_rollups_match_raw_data(self):
+        expected = AnalyticsRepository.top_performing_campaigns(1)
+        refresh_rollups(1)
+        watermark = get_watermark(1)
+
+        self.assertIsNotNone(watermark)
+        self.assertEqual(verify_rollups(1, watermark - timedelta(days=3), watermark), [])
+        self.assertEqual(AnalyticsRepository.top_performing_campaigns(1), expected)
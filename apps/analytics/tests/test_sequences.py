@@ -0,0 +1,68 @@
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from apps.analytics.events import emit_event, validate_event_sequence
+from apps.analytics.models import AdEvent, EventSequence
+from apps.analytics.sequences import next_sequence, reserve, reset_blocks
+from .utils import create_campaign_with_ads
+
+
+class SequenceAllocatorTest(TestCase):
+    def test_numbers_are_per_aggregate(self):
+        self.assertEqual([next_sequence(1, 'a') for _ in range(3)], [1, 2, 3])
+        self.assertEqual(next_sequence(1, 'b'), 1)
+        self.assertEqual(next_sequence(2, 'a'), 1)
+
+    def test_reserve_hands_out_contiguous_ranges(self):
+        self.assertEqual(reserve(1, 'a', 10), 1)
+        self.assertEqual(reserve(1, 'a', 5), 11)
+        self.assertEqual(EventSequence.objects.get(tenant_id=1, aggregate_id='a').last_value, 15)
+
+    def test_emitted_events_have_no_gaps(self):
+        for _ in range(5):
+            emit_event('impression_created', 42, {}, tenant_id=1)
+        emit_event('impression_created', 43, {}, tenant_id=1)
+        self.assertTrue(validate_event_sequence(42, 1)['valid'])
+        self.assertEqual(validate_event_sequence(42, 1)['last_sequence'], 5)
+
+    def test_gaps_are_reported_as_ranges(self):
+        for sequence in (2, 3, 7):
+            AdEvent.objects.create(tenant_id=1, event_type='x', aggregate_id='7', payload={}, sequence_number=sequence)
+        validation = validate_event_sequence(7, 1)
+        self.assertFalse(validation['valid'])
+        self.assertEqual([(gap['expected'], gap['found'], gap['missing']) for gap in validation['gaps']],
+                         [(1, 2, 1), (4, 7, 3)])
+        self.assertEqual((validation['total_events'], validation['last_sequence']), (3, 7))
+        self.assertEqual(validate_event_sequence(8, 1), {
+            'valid': True, 'gaps': [], 'duplicates': [], 'total_events': 0, 'last_sequence': 0
+        })
+
+    def test_duplicate_sequence_is_rejected(self):
+        AdEvent.objects.create(tenant_id=1, event_type='x', aggregate_id='7', payload={}, sequence_number=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AdEvent.objects.create(tenant_id=1, event_type='x', aggregate_id='7', payload={}, sequence_number=1)
+
+
+class SequenceBenchmarkGuardTest(TestCase):
+    def test_refuses_without_debug_or_a_scratch_tenant(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_sequences')
+        with self.assertRaisesMessage(CommandError, 'DEBUG is off'):
+            call_command('benchmark_sequences', '--tenant_id', '999')
+
+        campaign, _ = create_campaign_with_ads(tenant_id=999)
+        emit_event('impression_created', campaign.id, {}, tenant_id=999)
+        with self.assertRaisesMessage(CommandError, 'real campaigns or events'):
+            call_command('benchmark_sequences', '--tenant_id', '999', '--force')
+        self.assertEqual(AdEvent.objects.filter(tenant_id=999).count(), 1)
+
+
+@override_settings(ANALYTICS_SEQUENCE_BLOCK_SIZE=4)
+class SequenceBlockTest(TransactionTestCase):
+    def tearDown(self):
+        reset_blocks()
+
+    def test_block_is_served_from_memory(self):
+        self.assertEqual([next_sequence(1, 'a') for _ in range(6)], [1, 2, 3, 4, 5, 6])
+        # Two blocks reserved for six numbers
+        self.assertEqual(EventSequence.objects.get(tenant_id=1, aggregate_id='a').last_value, 8)
@@ -0,0 +1,66 @@
+from unittest import mock, skipUnless
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from apps.analytics import hll
+from apps.analytics.hll import HyperLogLog, standard_error
+from apps.analytics.repository import AnalyticsRepository
+from apps.analytics.sketches import SketchRepository, refresh_sketches
+from .utils import create_campaign_with_ads, create_impressions
+
+
+class HyperLogLogTest(SimpleTestCase):
+    def test_estimate_within_error_bound(self):
+        sketch = HyperLogLog()
+        sketch.update(range(100000))
+        self.assertAlmostEqual(sketch.count() / 100000, 1, delta=3 * standard_error())
+
+    def test_small_cardinalities_are_close_to_exact(self):
+        sketch = HyperLogLog()
+        sketch.update([7, 7, 8, 9])
+        self.assertEqual(sketch.count(), 3)
+
+    def test_merge_is_union(self):
+        left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        left.update(range(0, 60000))
+        right.update(range(40000, 100000))
+        union.update(range(0, 100000))
+        self.assertEqual(left.merge(right).registers, union.registers)
+
+    def test_pure_python_matches_numpy(self):
+        if hll.np is None:
+            self.skipTest('NumPy not installed')
+        values = list(range(0, 5000000, 997))
+        fast = HyperLogLog()
+        fast.update(values)
+        with mock.patch.object(hll, 'np', None):
+            slow = HyperLogLog()
+            slow.update(values)
+            self.assertEqual(slow.count(), fast.count())
+        self.assertEqual(fast.registers, slow.registers)
+
+    def test_serialization_round_trip(self):
+        sketch = HyperLogLog()
+        sketch.update(range(1000))
+        self.assertEqual(HyperLogLog.from_bytes(sketch.to_bytes()).registers, sketch.registers)
+
+
+@skipUnless(connection.vendor == 'mysql', 'Sketch refresh uses MySQL upserts')
+class SketchRepositoryTest(TransactionTestCase):
+    def setUp(self):
+        self.campaign, ads = create_campaign_with_ads()
+        create_impressions(ads, 60, users=40)
+
+    def test_estimate_matches_exact_counts(self):
+        refresh_sketches(1)
+        estimates = SketchRepository.campaign_unique_users(1)
+        self.assertEqual(estimates, {self.campaign.id: 40})
+
+
+class UniqueUsersMethodTest(SimpleTestCase):
+    @mock.patch('apps.analytics.repository.RollupRepository.is_ready', return_value=True)
+    def test_reports_the_method_the_rankings_use(self, _):
+        with mock.patch.object(SketchRepository, 'is_ready', return_value=True):
+            self.assertEqual(AnalyticsRepository.unique_users_method(1, approx=True), 'hyperloglog')
+            self.assertEqual(AnalyticsRepository.unique_users_method(1, approx=False), 'exact')
+        with mock.patch.object(SketchRepository, 'is_ready', return_value=False):
+            self.assertEqual(AnalyticsRepository.unique_users_method(1, approx=True), 'exact')
@@ -0,0 +1,39 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.utils import timezone
+from apps.advertisers.models import Advertiser
+from apps.analytics.repositories.cached import bump_tenant_version
+from apps.audiences.models import AudienceSegment
+from apps.campaigns.models import Campaign, Ad, Impression
+from apps.creatives.models import Creative
+
+
+def create_campaign_with_ads(tenant_id=1, ads=2, name='Test Campaign'):
+    advertiser = Advertiser.objects.create(tenant_id=tenant_id, name='Test Advertiser', email='test@adtech.com')
+    creative = Creative.objects.create(tenant_id=tenant_id, name='Test Creative', asset_url='https://example.com/a.jpg', creative_type='banner')
+    audience = AudienceSegment.objects.create(tenant_id=tenant_id, name='Test Audience', description='', criteria={})
+    campaign = Campaign.objects.create(
+        tenant_id=tenant_id, name=name, budget=1000, status='active',
+        start_date='2024-01-01', end_date='2030-12-31', advertiser=advertiser
+    )
+    return campaign, [
+        Ad.objects.create(tenant_id=tenant_id, campaign=campaign, creative=creative, audience=audience,
+                          creative_url='https://example.com/ad.jpg', target_audience='all')
+        for _ in range(ads)
+    ]
+
+
+def create_impressions(ads, count, users=7, hours_apart=1, offset_hours=0, tenant_id=1):
+    """One impression per `hours_apart` going back from now, cycling ads and users"""
+    now = timezone.now()
+    impressions = Impression.objects.bulk_create([
+        Impression(tenant_id=tenant_id, ad=ads[i % len(ads)], user_id=i % users, cost=Decimal('0.5000'))
+        for i in range(count)
+    ])
+    # auto_now_add ignores explicit values, so spread timestamps afterwards
+    for i, impression in enumerate(impressions):
+        Impression.objects.filter(pk=impression.pk).update(
+            timestamp=now - timedelta(hours=offset_hours + i * hours_apart)
+        )
+    bump_tenant_version(tenant_id)
+    return impressions
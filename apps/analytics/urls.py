@@ -29,4 +29,5 @@ urlpatterns = [
     path('bigquery/', views.bigquery_analytics, name='bigquery_analytics'),
     path('sync-bigquery/', views.sync_to_bigquery, name='sync_bigquery'),
     path('bigquery/status/', views.bigquery_status, name='bigquery_status'),
+    path('projections/', views.projection_status, name='projection_status'),
 ]
@@ -1,26 +1,57 @@
 import time
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework import viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
 from django.db import connection
 from django.core.cache import cache
 from apps.analytics.tasks import aggregate_daily_metrics
-from apps.analytics.models import AdEvent
 from apps.campaigns.models import Campaign, Impression
 from apps.campaigns.circuit_breaker import CircuitBreaker
+from apps.realtime.windows import window_totals
 from .repository import AnalyticsRepository
+from .repositories.query_builder import SQLQueryBuilder, TimeWindow
+from .fanout import fan_out
+from .partitions import partition_status
+from .counters import event_totals
+from .export import EXPORT_RENDERERS, wants_export, export_response
+from .sketches import STANDARD_ERROR
+from .attribution import ATTRIBUTION_MODELS, DEFAULT_MODEL, AttributionRepository
 
 analytics_circuit = CircuitBreaker(failure_threshold=5, recovery_timeout=60)
 
+# `?format=ndjson|csv` streams the full result set instead of a JSON page
+EXPORTABLE_RENDERERS = api_settings.DEFAULT_RENDERER_CLASSES + EXPORT_RENDERERS
+MAX_DAYS_BACK = 366
+
+
+def wants_approx(request):
+    """`?approx=1` trades exact unique_users for HyperLogLog estimates"""
+    return request.GET.get('approx', '').lower() in ('1', 'true', 'yes')
+
+
+def approx_info(approx, method):
+    """Response metadata on how unique_users was counted, when `?approx=1` was asked for"""
+    if not approx:
+        return {}
+    if method != 'hyperloglog':
+        return {'unique_users_estimate': {'method': method}}
+    return {'unique_users_estimate': {'method': method, 'relative_std_error': round(STANDARD_ERROR, 4)}}
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated]) 
+@renderer_classes(EXPORTABLE_RENDERERS)
 @analytics_circuit
 def cohort_analysis(request):
     """Cohort analysis with repository connection"""
     tenant_id = request.user.tenant_id
+    if wants_export(request):
+        sql, params = AnalyticsRepository.cohort_analysis_query(tenant_id)
+        return export_response(request, sql, params, 'cohorts')
+
     data = AnalyticsRepository.cohort_analysis(tenant_id)
     
     formatted_data = [{
@@ -39,10 +70,15 @@ def cohort_analysis(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(EXPORTABLE_RENDERERS)
 @analytics_circuit
 def campaign_performance(request):
     """Campaign performance with window functions"""
     tenant_id = request.user.tenant_id
+    if wants_export(request):
+        sql, params = AnalyticsRepository.campaign_performance_window_query(tenant_id)
+        return export_response(request, sql, params, 'campaign_performance')
+
     data = AnalyticsRepository.campaign_performance_window(tenant_id)
     
     formatted_data = [{
@@ -68,15 +104,22 @@ def async_cohort_analysis(request):
     """Multi-query analytics"""
     tenant_id = request.user.tenant_id
     
-    # Ejecutar secuencialmente (sin async)
-    cohort_data = AnalyticsRepository.cohort_analysis(tenant_id)
-    performance_data = AnalyticsRepository.campaign_performance_window(tenant_id)
-    top_campaigns = AnalyticsRepository.top_performing_campaigns(tenant_id)
+    approx = wants_approx(request)
+    fanout = fan_out({
+        'cohort_analysis': lambda: AnalyticsRepository.cohort_analysis(tenant_id),
+        'performance_metrics': lambda: AnalyticsRepository.campaign_performance_window(tenant_id),
+        'top_campaigns': lambda: AnalyticsRepository.top_performing_campaigns(tenant_id, approx=approx),
+    })
+    results = fanout['results']
     
     return Response({
-        'cohort_analysis': cohort_data,
-        'performance_metrics': performance_data[:5],
-        'top_campaigns': top_campaigns
+        'cohort_analysis': results['cohort_analysis'],
+        'performance_metrics': (results['performance_metrics'] or [])[:5],
+        'top_campaigns': results['top_campaigns'],
+        'timings_ms': fanout['timings_ms'],
+        'partial': fanout['partial'],
+        'errors': fanout['errors'],
+        **approx_info(approx, AnalyticsRepository.unique_users_method(tenant_id, approx, columnar=True))
     })
 
 @api_view(['GET'])
@@ -84,21 +127,21 @@ def async_dashboard(request):
     """Real-time dashboard with concurrent queries"""
     tenant_id = request.user.tenant_id
     
-    # Execute sequentially since views aren't async
-    cohort_data = AnalyticsRepository.cohort_analysis(tenant_id)
-    top_campaigns = AnalyticsRepository.top_performing_campaigns(tenant_id, 5)
-    total_events = AdEvent.objects.filter(tenant_id=tenant_id).count()
-    total_impressions = AdEvent.objects.filter(
-        tenant_id=tenant_id, 
-        event_type='impression_created'
-    ).count()
+    approx = wants_approx(request)
+    fanout = fan_out({
+        'cohort_data': lambda: AnalyticsRepository.cohort_analysis(tenant_id),
+        'top_campaigns': lambda: AnalyticsRepository.top_performing_campaigns(tenant_id, 5, approx=approx),
+        'total_events': lambda: event_totals(tenant_id)['total'],
+        'total_impressions': lambda: event_totals(tenant_id)['by_type'].get('impression_created', 0),
+    })
     
     return Response({
-        'cohort_data': cohort_data,
-        'top_campaigns': top_campaigns, 
-        'total_events': total_events,
-        'total_impressions': total_impressions,
-        'performance_ms': 'sub_100ms'  # Real-time requirement
+        **fanout['results'],
+        'performance_ms': 'sub_100ms',  # Real-time requirement
+        'timings_ms': fanout['timings_ms'],
+        'partial': fanout['partial'],
+        'errors': fanout['errors'],
+        **approx_info(approx, AnalyticsRepository.unique_users_method(tenant_id, approx, columnar=True))
     })
 
 @api_view(['POST'])
@@ -119,24 +162,27 @@ def rebuild_metrics(request, campaign_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def audit_trail(request, campaign_id):
-    events = AdEvent.objects.filter(
-        aggregate_id=str(campaign_id),
-        tenant_id=request.user.tenant_id
-    ).order_by('-timestamp')[:100]  # Limit for performance
-    
-    data = [{
-        'event_id': event.id,
-        'event_type': event.event_type,
-        'timestamp': event.timestamp,
-        'payload': event.payload,
-        'sequence_number': event.sequence_number
-    } for event in events]
+    """Newest events first; follow ?cursor=<next_cursor> for older pages"""
+    from apps.analytics.events import get_event_page
+
+    try:
+        page = get_event_page(
+            campaign_id,
+            request.user.tenant_id,
+            limit=request.GET.get('limit', 100),
+            cursor=request.GET.get('cursor'),
+            since_sequence=request.GET.get('since_sequence')
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     
     return Response({
-        'audit_events': data,
+        'audit_events': page['events'],
         'campaign_id': campaign_id,
-        'total_events': len(data),
-        'limited_to': 100
+        'total_events': len(page['events']),
+        'limited_to': page['limit'],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
     })
 
 @api_view(['POST'])
@@ -146,13 +192,61 @@ def trigger_metrics(request):
     result = calculate_daily_metrics.delay(request.user.tenant_id)
     return Response({'task_id': result.id, 'status': 'queued'})
 
+def with_conversion_rate(row):
+    impressions = row['total_impressions']
+    row['conversion_rate'] = (row['total_conversions'] / impressions * 100) if impressions else 0.0
+    return row
+
+
+def attribution_report(request, tenant_id, campaign_id):
+    """Read precomputed attribution for one model (?model=, ?days_back=)"""
+    model = request.GET.get('model', DEFAULT_MODEL)
+    if model not in ATTRIBUTION_MODELS:
+        return Response({'error': f'Unknown attribution model, choose from {sorted(ATTRIBUTION_MODELS)}'}, status=400)
+    try:
+        days_back = int(request.GET.get('days_back', 0))
+    except ValueError:
+        return Response({'error': f"Invalid days_back: {request.GET['days_back']}"}, status=400)
+    # 0 (the default) reports the whole table; otherwise 1 to MAX_DAYS_BACK days
+    days_back = max(1, min(days_back, MAX_DAYS_BACK)) if days_back else None
+
+    if wants_export(request):
+        sql, params = AttributionRepository.attribution_analysis_query(tenant_id, campaign_id, model, days_back)
+        return export_response(request, sql, params, f'attribution_{model}')
+
+    data = AttributionRepository.attribution_analysis(tenant_id, campaign_id, model, days_back)
+    formatted_data = [{
+        'campaign_id': row[0],
+        'attributed_conversions': float(row[2]) if row[2] else 0.0,
+        'attributed_revenue': float(row[3]) if row[3] else 0.0,
+        'avg_journey_days': float(row[4]) if row[4] else 0.0,
+        'touches': row[5],
+    } for row in data]
+
+    return Response({
+        'attribution_data': formatted_data,
+        'model': model,
+        'days_back': days_back,
+        'campaign_filter': campaign_id,
+        'total_analyzed': len(formatted_data)
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(EXPORTABLE_RENDERERS)
 def attribution_analysis(request):
     """Attribution analysis with raw SQL"""
     campaign_id = request.GET.get('campaign_id')
     tenant_id = request.user.tenant_id
+
+    if AttributionRepository.is_ready(tenant_id):
+        return attribution_report(request, tenant_id, campaign_id)
     
+    if wants_export(request):
+        sql, params = AnalyticsRepository.attribution_analysis_query(tenant_id, campaign_id)
+        return export_response(request, sql, params, 'attribution', transform=with_conversion_rate)
+
     data = AnalyticsRepository.attribution_analysis(tenant_id, campaign_id)
     
     formatted_data = [{
@@ -237,6 +331,9 @@ def index_analysis(request):
         # Check slow query log
         cursor.execute("SHOW VARIABLES LIKE 'slow_query_log'")
         slow_log_status = cursor.fetchone()
+
+        partitions = partition_status()
+        impressions_partitioned = bool(partitions['campaigns_impression']['partitions'])
         
         return Response({
             'indexes': [{
@@ -247,9 +344,10 @@ def index_analysis(request):
                 'nullable': row[4]
             } for row in indexes],
             'slow_log_enabled': slow_log_status[1] if slow_log_status else False,
+            'partitions': partitions,
             'recommendations': [
                 'Add composite index on (tenant_id, timestamp) for time-series queries',
-                'Consider partitioning impressions table by date',
+                *([] if impressions_partitioned else ['Partition impressions by date: python manage.py migrate analytics']),
                 'Monitor query cache hit ratio'
             ]
         })
@@ -299,26 +397,31 @@ def real_time_dashboard(request):
     tenant_id = request.user.tenant_id
     start_time = time.time()
     
-    # Get real-time metrics
-    realtime_data = AnalyticsRepository.get_real_time_metrics(tenant_id)
-    cohort_data = AnalyticsRepository.cohort_analysis(tenant_id)
-    top_campaigns = AnalyticsRepository.top_performing_campaigns(tenant_id, 5)
-    
-    # Calculate totals
-    total_events = AdEvent.objects.filter(tenant_id=tenant_id).count()
-    total_impressions = Impression.objects.filter(tenant_id=tenant_id).count()
+    approx = wants_approx(request)
+    fanout = fan_out({
+        'realtime_metrics': lambda: AnalyticsRepository.get_real_time_metrics(tenant_id),
+        'cohort_data': lambda: AnalyticsRepository.cohort_analysis(tenant_id),
+        'top_campaigns': lambda: AnalyticsRepository.top_performing_campaigns(tenant_id, 5, approx=approx),
+        'total_events': lambda: event_totals(tenant_id)['total'],
+        'total_impressions': lambda: Impression.objects.filter(tenant_id=tenant_id).count(),
+    })
+    results = fanout['results']
     
     execution_time = (time.time() - start_time) * 1000
     
     return Response({
-        'realtime_metrics': realtime_data,
-        'cohort_data': cohort_data[:10],  # Limit for performance
-        'top_campaigns': top_campaigns, 
-        'total_events': total_events,
-        'total_impressions': total_impressions,
+        'realtime_metrics': results['realtime_metrics'],
+        'cohort_data': (results['cohort_data'] or [])[:10],  # Limit for performance
+        'top_campaigns': results['top_campaigns'], 
+        'total_events': results['total_events'],
+        'total_impressions': results['total_impressions'],
         'execution_time_ms': round(execution_time, 2),
+        'timings_ms': fanout['timings_ms'],
+        'partial': fanout['partial'],
+        'errors': fanout['errors'],
         'performance_target': 'sub_100ms',
-        'status': 'OK' if execution_time < 100 else 'SLOW'
+        'status': 'OK' if execution_time < 100 else 'SLOW',
+        **approx_info(approx, AnalyticsRepository.unique_users_method(tenant_id, approx, columnar=True))
     })
 
 def get_active_campaigns_count(tenant_id):
@@ -333,18 +436,21 @@ def get_active_campaigns_count(tenant_id):
 
 def get_total_impressions_today(tenant_id):
     """Fast count with date index"""
+    sql, params = (
+        SQLQueryBuilder("SELECT COUNT(*) FROM campaigns_impression")
+        .add_tenant_filter(tenant_id)
+        .add_time_window(TimeWindow.today())
+        .build()
+    )
     with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM campaigns_impression 
-            WHERE tenant_id = %s AND DATE(timestamp) = CURDATE()
-        """, [tenant_id])
+        cursor.execute(sql, params)
         return cursor.fetchone()[0]
 
 def get_top_performing_campaign(tenant_id):
     """Window function for ranking"""
+    today, today_params = TimeWindow.today().predicate('ci.timestamp')
     with connection.cursor() as cursor:
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 ca.id,
                 ca.name,
@@ -354,12 +460,12 @@ def get_top_performing_campaign(tenant_id):
             LEFT JOIN campaigns_ad ad ON ad.campaign_id = ca.id
             LEFT JOIN campaigns_impression ci ON ci.ad_id = ad.id 
                 AND ci.tenant_id = %s 
-                AND DATE(ci.timestamp) = CURDATE()
+                AND {today}
             WHERE ca.tenant_id = %s
             GROUP BY ca.id, ca.name
             ORDER BY impressions DESC
             LIMIT 1
-        """, [tenant_id, tenant_id])
+        """, [tenant_id, *today_params, tenant_id])
         row = cursor.fetchone()
         return {
             'id': row[0],
@@ -370,22 +476,26 @@ def get_top_performing_campaign(tenant_id):
 
 def get_real_time_spend(tenant_id):
     """Aggregation with SUM optimization"""
+    sql, params = (
+        SQLQueryBuilder("SELECT COALESCE(SUM(cost), 0) FROM campaigns_impression")
+        .add_tenant_filter(tenant_id)
+        .add_time_window(TimeWindow.last_hour())
+        .build()
+    )
     with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT COALESCE(SUM(cost), 0)
-            FROM campaigns_impression 
-            WHERE tenant_id = %s AND timestamp >= NOW() - INTERVAL 1 HOUR
-        """, [tenant_id])
+        cursor.execute(sql, params)
         return float(cursor.fetchone()[0])
 
 def get_unique_users_today(tenant_id):
     """COUNT DISTINCT optimization"""
+    sql, params = (
+        SQLQueryBuilder("SELECT COUNT(DISTINCT user_id) FROM campaigns_impression")
+        .add_tenant_filter(tenant_id)
+        .add_time_window(TimeWindow.today())
+        .build()
+    )
     with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT COUNT(DISTINCT user_id)
-            FROM campaigns_impression 
-            WHERE tenant_id = %s AND DATE(timestamp) = CURDATE()
-        """, [tenant_id])
+        cursor.execute(sql, params)
         return cursor.fetchone()[0]
 
 @api_view(['GET'])
@@ -408,30 +518,37 @@ def bid_processing_simulation(request):
         'status': 'success' if processing_time < 100 else 'too_slow'
     })
 
-def calculate_bid_price(tenant_id, bid_id):
-    """Fast bid calculation with minimal DB queries"""
+def recent_cost(tenant_id, minutes=15):
+    """Average impression cost and volume over the last minutes, from the live window when warm"""
+    live = window_totals(tenant_id, minutes=minutes)
+    if live is not None:
+        return (live['spend'] / live['impressions'] if live['impressions'] else None), live['impressions']
+
+    sql, params = (
+        SQLQueryBuilder("SELECT AVG(cost) as avg_cost, COUNT(*) as volume FROM campaigns_impression")
+        .add_tenant_filter(tenant_id)
+        .add_time_window(TimeWindow.last_minutes(minutes))
+        .build()
+    )
     with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT 
-                AVG(cost) as avg_cost,
-                COUNT(*) as volume
-            FROM campaigns_impression 
-            WHERE tenant_id = %s 
-            AND timestamp >= NOW() - INTERVAL 15 MINUTE
-            LIMIT 1
-        """, [tenant_id])
+        cursor.execute(sql, params)
         row = cursor.fetchone()
-        avg_cost = float(row[0] or 0.5)
-        volume = row[1] or 0
-        
-        # Simple bid algorithm
-        bid_price = avg_cost * (1.1 if volume > 100 else 0.9)
-        
-        return {
-            'bid_id': bid_id,
-            'bid_price': round(bid_price, 4),
-            'confidence': 'high' if volume > 50 else 'medium'
-        }
+        return row[0], row[1] or 0
+
+
+def calculate_bid_price(tenant_id, bid_id):
+    """Fast bid calculation without scanning impressions once the live window is warm"""
+    avg_cost, volume = recent_cost(tenant_id)
+    avg_cost = float(avg_cost or 0.5)
+
+    # Simple bid algorithm
+    bid_price = avg_cost * (1.1 if volume > 100 else 0.9)
+
+    return {
+        'bid_id': bid_id,
+        'bid_price': round(bid_price, 4),
+        'confidence': 'high' if volume > 50 else 'medium'
+    }
 
 
 @api_view(['GET'])
@@ -502,6 +619,18 @@ def bigquery_status(request):
     return Response(status)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def projection_status(request):
+    """Checkpoint position and lag of every projection for the tenant"""
+    from .projections import projection_lag
+
+    return Response({
+        'tenant_id': request.user.tenant_id,
+        'projections': projection_lag(request.user.tenant_id)
+    })
+
+
 @api_view(['GET'])
 def real_time_metrics(request):
     """Sub-100ms real-time metrics endpoint"""
@@ -552,7 +681,8 @@ def campaign_performance_ranking(request):
     limit = int(request.GET.get('limit', 20))
     tenant_id = request.user.tenant_id
     
-    data = AnalyticsRepository.campaign_performance_ranking(tenant_id, limit)
+    approx = wants_approx(request)
+    data = AnalyticsRepository.campaign_performance_ranking(tenant_id, limit, approx=approx)
     
     formatted_data = [{
         'campaign_id': row[0],
@@ -569,7 +699,8 @@ def campaign_performance_ranking(request):
     return Response({
         'campaign_rankings': formatted_data,
         'limit': limit,
-        'ranking_metric': 'efficiency_score'
+        'ranking_metric': 'efficiency_score',
+        **approx_info(approx, AnalyticsRepository.unique_users_method(tenant_id, approx))
     })
 
 @api_view(['GET'])
@@ -606,6 +737,7 @@ def query_performance_monitor(request):
     
     return Response({
         'performance_stats': data,
+        'query_cache': AnalyticsRepository.get_query_cache_stats(),
         'monitoring_active': True,
         'thresholds': {
             'fast_query_ms': 50,
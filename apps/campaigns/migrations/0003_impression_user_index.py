@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("campaigns", "0002_alter_campaign_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="impression",
+            index=models.Index(
+                fields=["tenant_id", "user_id", "timestamp"],
+                name="campaigns_i_tenant__e863eb_idx",
+            ),
+        ),
+    ]
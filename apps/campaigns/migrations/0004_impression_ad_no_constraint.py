@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("campaigns", "0003_impression_user_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="impression",
+            name="ad",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="impressions",
+                to="campaigns.ad",
+            ),
+        ),
+    ]
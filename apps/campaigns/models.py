@@ -74,10 +74,13 @@ class Impression(models.Model):
         app_label = 'campaigns'
         indexes = [
             models.Index(fields=['tenant_id', 'timestamp']),
+            # Per-user touch sequences for attribution
+            models.Index(fields=['tenant_id', 'user_id', 'timestamp']),
         ]
     
     tenant_id = models.IntegerField(db_index=True)
-    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='impressions')
+    # No FK constraint: MySQL can't partition a table that has one
+    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='impressions', db_constraint=False)
     user_id = models.BigIntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
     cost = models.DecimalField(max_digits=10, decimal_places=4)
\ No newline at end of file
@@ -0,0 +1,360 @@
+# apps/events/buffer.py
+"""Write-behind buffering for the single-event endpoints.
+
+With ANALYTICS_WRITE_BEHIND enabled, the impression, click and conversion
+endpoints validate the event, append it to a bounded buffer and answer 202
+without touching the database. A flusher drains the buffer through
+ingest_batch once ANALYTICS_WRITE_BEHIND_FLUSH_SIZE events are waiting or
+ANALYTICS_WRITE_BEHIND_FLUSH_INTERVAL seconds have passed. Sequence
+numbers are assigned at flush time; the payload keeps the time the event
+was received.
+
+A batch that fails to write, for whatever reason, is spilled to an
+fsynced NDJSON file under ANALYTICS_WRITE_BEHIND_SPILL_DIR, and spilled
+files are replayed, oldest first, before any new events on the next flush.
+Flushes hold a lock in the shared cache, so only one process at a time
+replays the spill directory; a flush that finds the lock taken does
+nothing and leaves the work to the next one.
+
+The 'local' backend keeps the buffer in process memory and flushes from a
+daemon thread; it is drained at interpreter exit, but events still in
+memory when a process is killed are lost (at a clean exit they are
+spilled if another process holds the flush lock). The 'redis' backend keeps it in
+a Redis list that survives web worker restarts and is drained by the
+flush_event_buffer Celery task.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+from .ingest import _validate, ingest_batch
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = 'ingest:buffer'
+STATS_PREFIX = 'ingest_buffer'
+FLUSH_LOCK_KEY = f'{STATS_PREFIX}:flush_lock'
+COUNTERS = ('flushed', 'rejected', 'dropped', 'spilled', 'flushes', 'flush_ms_total')
+
+_buffer = None
+_flusher = None
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def write_behind_enabled() -> bool:
+    return getattr(settings, 'ANALYTICS_WRITE_BEHIND', False)
+
+
+def backend_name() -> str:
+    return getattr(settings, 'ANALYTICS_WRITE_BEHIND_BACKEND', 'local')
+
+
+def max_events() -> int:
+    return getattr(settings, 'ANALYTICS_WRITE_BEHIND_MAX_EVENTS', 50000)
+
+
+def flush_size() -> int:
+    return getattr(settings, 'ANALYTICS_WRITE_BEHIND_FLUSH_SIZE', 1000)
+
+
+def flush_interval() -> float:
+    return getattr(settings, 'ANALYTICS_WRITE_BEHIND_FLUSH_INTERVAL', 1.0)
+
+
+def flush_lock_ttl() -> int:
+    return getattr(settings, 'ANALYTICS_WRITE_BEHIND_FLUSH_LOCK_TTL', 60)
+
+
+def spill_dir() -> str:
+    return str(getattr(settings, 'ANALYTICS_WRITE_BEHIND_SPILL_DIR', settings.BASE_DIR / 'var' / 'ingest-spill'))
+
+
+class LocalBuffer:
+    """In-process FIFO of encoded events"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items = deque()
+        self.lock = threading.Lock()
+
+    def push(self, entry: str) -> bool:
+        with self.lock:
+            if len(self.items) >= self.capacity:
+                return False
+            self.items.append(entry)
+            return True
+
+    def pop_batch(self, size: int) -> List[str]:
+        with self.lock:
+            return [self.items.popleft() for _ in range(min(size, len(self.items)))]
+
+    def depth(self) -> int:
+        return len(self.items)
+
+
+class RedisBuffer:
+    """Redis list shared by every web worker; the bound is checked atomically"""
+
+    PUSH_SCRIPT = """
+        if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[2]) then return 0 end
+        redis.call('RPUSH', KEYS[1], ARGV[1])
+        return 1
+    """
+
+    def __init__(self, capacity: int):
+        import redis
+        url = getattr(settings, 'ANALYTICS_WRITE_BEHIND_REDIS_URL', settings.CELERY_BROKER_URL)
+        self.capacity = capacity
+        self.client = redis.Redis.from_url(url)
+        self.push_script = self.client.register_script(self.PUSH_SCRIPT)
+
+    def push(self, entry: str) -> bool:
+        return bool(self.push_script(keys=[REDIS_KEY], args=[entry, self.capacity]))
+
+    def pop_batch(self, size: int) -> List[str]:
+        return [entry.decode() for entry in self.client.lpop(REDIS_KEY, size) or []]
+
+    def depth(self) -> int:
+        return self.client.llen(REDIS_KEY)
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _lock:
+            if _buffer is None:
+                backend = RedisBuffer if backend_name() == 'redis' else LocalBuffer
+                _buffer = backend(max_events())
+    return _buffer
+
+
+def reset_buffer():
+    """Forget the buffer instance, e.g. after the backend settings changed"""
+    global _buffer
+    with _lock:
+        _buffer = None
+
+
+def _incr(name: str, delta: int = 1):
+    key = f'{STATS_PREFIX}:{name}'
+    cache.add(key, 0, None)
+    cache.incr(key, delta)
+
+
+def _run_flusher():
+    while True:
+        _wake.wait(flush_interval())
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Error flushing ingest buffer: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            if _flusher is None:
+                atexit.register(_drain_at_exit)
+            _flusher = threading.Thread(target=_run_flusher, name='ingest-flusher', daemon=True)
+            _flusher.start()
+
+
+def _schedule_flush():
+    # At most one queued flush per interval, however many writers cross the threshold
+    if cache.add(f'{STATS_PREFIX}:flush_scheduled', 1, max(int(flush_interval()), 1)):
+        from tasks.analytics import flush_event_buffer
+        flush_event_buffer.delay()
+
+
+def buffer_event(tenant_id: int, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate and buffer one event; status is 'buffered', 'rejected' or 'dropped'"""
+    clean, errors = _validate(item)
+    if errors:
+        return {'status': 'rejected', 'errors': errors}
+
+    record = {key: str(value) if key in ('cost', 'conversion_value') else value for key, value in clean.items()}
+    record['tenant_id'] = tenant_id
+    record['received_at'] = timezone.now().isoformat()
+    buffer = get_buffer()
+    if not buffer.push(json.dumps(record)):
+        _incr('dropped')
+        logger.warning(f"Ingest buffer full, dropped {clean['type']} for tenant {tenant_id}")
+        return {'status': 'dropped'}
+
+    if backend_name() == 'redis':
+        if buffer.depth() >= flush_size():
+            _schedule_flush()
+    else:
+        _ensure_flusher()
+        if buffer.depth() >= flush_size():
+            _wake.set()
+    return {'status': 'buffered'}
+
+
+def _write(entries: List[str]) -> List[str]:
+    """Ingest encoded events per tenant; returns the entries that were not written"""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(json.loads(entry)['tenant_id'], []).append(entry)
+
+    pending = list(groups.items())
+    while pending:
+        tenant_id, group = pending[0]
+        records = [json.loads(entry) for entry in group]
+        started = time.monotonic()
+        try:
+            result = ingest_batch(tenant_id, records, received_at=[record['received_at'] for record in records])
+        except Exception as e:
+            # Whatever went wrong, the entries are already out of the buffer: hand them back for spilling
+            logger.error(f"Ingest buffer flush failed for tenant {tenant_id}: {str(e)}")
+            close_old_connections()
+            return [entry for _, group in pending for entry in group]
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        _incr('flushed', result['recorded'])
+        _incr('rejected', result['rejected'])
+        _incr('flushes')
+        _incr('flush_ms_total', elapsed_ms)
+        cache.set(f'{STATS_PREFIX}:last_flush_ms', elapsed_ms, None)
+        if result['rejected']:
+            logger.warning(f"Ingest buffer dropped {result['rejected']} invalid events of tenant {tenant_id}")
+        pending.pop(0)
+    return []
+
+
+def _spill_files() -> List[str]:
+    directory = spill_dir()
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.ndjson'))
+
+
+def _write_file(path: str, entries: List[str]):
+    """Atomically (re)write a spill file and fsync it before it becomes visible"""
+    temp = f'{path}.tmp'
+    with open(temp, 'w') as handle:
+        handle.write('\n'.join(entries) + '\n')
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temp, path)
+
+
+def spill(entries: List[str]):
+    os.makedirs(spill_dir(), exist_ok=True)
+    _write_file(os.path.join(spill_dir(), f'{time.time_ns()}-{uuid.uuid4().hex[:8]}.ndjson'), entries)
+    _incr('spilled', len(entries))
+    logger.warning(f"Spilled {len(entries)} buffered events to disk")
+
+
+def _replay_spilled(token: str) -> bool:
+    """Write back spilled files oldest first; False while writes still fail or once the lock is lost"""
+    for path in _spill_files():
+        if not _refresh_flush_lock(token):
+            logger.warning("Ingest buffer flush lock expired during spill replay; leaving the rest to its holder")
+            return False
+        with open(path) as handle:
+            entries = [line for line in handle.read().splitlines() if line]
+        remaining = _write(entries)
+        if remaining:
+            _write_file(path, remaining)
+            return False
+        os.remove(path)
+    return True
+
+
+def _acquire_flush_lock(wait: float = 0) -> Optional[str]:
+    """Take the cross-process flush lock; returns its token, or None if it stayed taken for `wait` seconds"""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not cache.add(FLUSH_LOCK_KEY, token, flush_lock_ttl()):
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.05)
+    return token
+
+
+def _refresh_flush_lock(token: str) -> bool:
+    """Extend the flush lock before the next write; False if it expired and another flusher may hold it"""
+    if cache.get(FLUSH_LOCK_KEY) != token:
+        return False
+    cache.touch(FLUSH_LOCK_KEY, flush_lock_ttl())
+    return True
+
+
+def _release_flush_lock(token: str):
+    if cache.get(FLUSH_LOCK_KEY) == token:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def flush(wait: float = 0) -> Dict[str, Any]:
+    """Replay spilled files, then drain the buffer in batches"""
+    with _flush_lock:
+        report = {'batches': 0, 'events': 0, 'spilled': 0, 'locked': False}
+        token = _acquire_flush_lock(wait)
+        if token is None:
+            report['locked'] = True
+            return report
+        try:
+            if not _replay_spilled(token):
+                report['locked'] = cache.get(FLUSH_LOCK_KEY) != token
+                return report
+            buffer = get_buffer()
+            while True:
+                if not _refresh_flush_lock(token):
+                    report['locked'] = True
+                    break
+                entries = buffer.pop_batch(flush_size())
+                if not entries:
+                    break
+                remaining = _write(entries)
+                report['batches'] += 1
+                report['events'] += len(entries) - len(remaining)
+                if remaining:
+                    spill(remaining)
+                    report['spilled'] += len(remaining)
+                    break
+            return report
+        finally:
+            _release_flush_lock(token)
+
+
+def _drain_at_exit():
+    """Flush the local buffer at interpreter exit, or spill it if another process holds the lock"""
+    report = flush(wait=5)
+    if report['locked']:
+        entries = get_buffer().pop_batch(max_events())
+        if entries:
+            spill(entries)
+
+
+def buffer_stats() -> Dict[str, Any]:
+    """Buffer depth and flush counters, for monitoring"""
+    counters = cache.get_many([f'{STATS_PREFIX}:{name}' for name in COUNTERS + ('last_flush_ms',)])
+    stats = {name: counters.get(f'{STATS_PREFIX}:{name}', 0) for name in COUNTERS + ('last_flush_ms',)}
+    flush_ms_total = stats.pop('flush_ms_total')
+    buffer = get_buffer()
+    return {
+        'enabled': write_behind_enabled(),
+        'backend': backend_name(),
+        'depth': buffer.depth(),
+        'capacity': buffer.capacity,
+        'spill_files': len(_spill_files()),
+        'avg_flush_ms': round(flush_ms_total / stats['flushes'], 1) if stats['flushes'] else 0,
+        **stats,
+    }
@@ -0,0 +1,199 @@
+# apps/events/ingest.py
+"""Batch ingestion of mixed impression, click and conversion events.
+
+A batch costs a fixed number of statements whatever its size: one IN
+query each for ad and campaign ownership, one counter reservation per
+campaign aggregate, and bulk inserts of the AdEvent and Impression rows,
+all in one transaction. Items that fail validation are reported and
+skipped; the valid rest of the batch is still recorded.
+"""
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from apps.analytics.counters import count_events
+from apps.analytics.models import AdEvent
+from apps.analytics.repositories.cached import bump_tenant_version
+from apps.analytics.sequences import reserve
+from apps.campaigns.models import Ad, Campaign, Impression
+from apps.realtime.pubsub import delta, publish_deltas
+
+MAX_BATCH_SIZE = getattr(settings, 'ANALYTICS_INGEST_MAX_BATCH', 10000)
+BULK_SIZE = 2000
+
+EVENT_TYPES = {
+    'impression': 'impression_created',
+    'click': 'click_registered',
+    'conversion': 'conversion_tracked',
+}
+REQUIRED_IDS = {
+    'impression': ('campaign_id', 'ad_id', 'user_id'),
+    'click': ('campaign_id', 'ad_id', 'user_id'),
+    'conversion': ('campaign_id', 'user_id'),
+}
+# field -> (upper bound, decimal places) matching the columns they land in
+AMOUNTS = {
+    'impression': ('cost', Decimal('1000000'), Decimal('0.0001')),
+    'conversion': ('conversion_value', Decimal('100000000'), Decimal('0.01')),
+}
+
+
+def _validate(item) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': 'Expected an object'}
+    kind = item.get('type')
+    if kind not in EVENT_TYPES:
+        return None, {'type': f'Expected one of {", ".join(EVENT_TYPES)}'}
+
+    clean, errors = {'type': kind}, {}
+    for field in REQUIRED_IDS[kind]:
+        value = item.get(field)
+        if value is None or value == '':
+            errors[field] = 'This field is required.'
+            continue
+        try:
+            clean[field] = int(value)
+        except (TypeError, ValueError):
+            errors[field] = 'A valid integer is required.'
+
+    if kind == 'click' and item.get('impression_id') is not None:
+        try:
+            clean['impression_id'] = int(item['impression_id'])
+        except (TypeError, ValueError):
+            errors['impression_id'] = 'A valid integer is required.'
+
+    if kind in AMOUNTS:
+        field, limit, places = AMOUNTS[kind]
+        try:
+            amount = Decimal(str(item.get(field, '0.00'))).quantize(places)
+            if not (0 <= amount < limit):
+                errors[field] = f'Must be between 0 and {limit}.'
+            clean[field] = amount
+        except InvalidOperation:
+            errors[field] = 'A valid number is required.'
+
+    return (None, errors) if errors else (clean, {})
+
+
+def _payload(clean: Dict[str, Any], timestamp: str) -> Dict[str, Any]:
+    """Same payload shapes as the single-event record_*_event helpers"""
+    payload = {key: value for key, value in clean.items() if key != 'type'}
+    for field in ('cost', 'conversion_value'):
+        if field in payload:
+            payload[field] = str(payload[field])
+    if clean['type'] == 'click':
+        payload.setdefault('impression_id', None)
+    payload['timestamp'] = timestamp
+    return payload
+
+
+def _deltas(accepted) -> List[Dict[str, Any]]:
+    """One live-metrics delta per campaign for the recorded items"""
+    changes = {}
+    for _, clean in accepted:
+        change = changes.setdefault(
+            clean['campaign_id'], {'impressions': 0, 'clicks': 0, 'spend': Decimal('0'), 'users': []}
+        )
+        if clean['type'] == 'impression':
+            change['impressions'] += 1
+            change['spend'] += clean['cost']
+            change['users'].append(clean['user_id'])
+        elif clean['type'] == 'click':
+            change['clicks'] += 1
+    return [
+        delta(campaign_id, **change)
+        for campaign_id, change in changes.items() if change['impressions'] or change['clicks']
+    ]
+
+
+def ingest_batch(tenant_id: int, items: List[Any],
+                 received_at: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Record every valid item; returns counts and one status per item, in order.
+
+    `received_at` holds ISO timestamps for the payloads of items that were
+    received earlier than they are written, e.g. from the write-behind buffer.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        clean, errors = _validate(item)
+        if errors:
+            results[index] = {'index': index, 'status': 'rejected', 'errors': errors}
+        else:
+            valid.append((index, clean))
+
+    # Ownership of every referenced ad and campaign in one query each
+    ad_ids = {clean['ad_id'] for _, clean in valid if 'ad_id' in clean}
+    campaign_ids = {clean['campaign_id'] for _, clean in valid}
+    ads = dict(
+        Ad.objects.filter(tenant_id=tenant_id, id__in=ad_ids).values_list('id', 'campaign_id')
+    ) if ad_ids else {}
+    campaigns = set(
+        Campaign.objects.filter(tenant_id=tenant_id, id__in=campaign_ids).values_list('id', flat=True)
+    ) if campaign_ids else set()
+
+    accepted = []
+    for index, clean in valid:
+        if clean['campaign_id'] not in campaigns:
+            results[index] = {'index': index, 'status': 'rejected', 'errors': {'campaign_id': 'Unknown campaign.'}}
+        elif 'ad_id' in clean and ads.get(clean['ad_id']) != clean['campaign_id']:
+            results[index] = {'index': index, 'status': 'rejected', 'errors': {'ad_id': 'Unknown ad for this campaign.'}}
+        else:
+            accepted.append((index, clean))
+
+    if accepted:
+        now = timezone.now()
+        timestamp = now.isoformat()
+        with transaction.atomic():
+            # One reservation per aggregate, in a fixed order so concurrent
+            # batches lock the counter rows without deadlocking
+            counts = Counter(clean['campaign_id'] for _, clean in accepted)
+            next_numbers = {
+                campaign_id: reserve(tenant_id, campaign_id, counts[campaign_id])
+                for campaign_id in sorted(counts)
+            }
+
+            events, impressions = [], []
+            for index, clean in accepted:
+                campaign_id = clean['campaign_id']
+                sequence_number = next_numbers[campaign_id]
+                next_numbers[campaign_id] += 1
+                event_type = EVENT_TYPES[clean['type']]
+                events.append(AdEvent(
+                    tenant_id=tenant_id,
+                    event_type=event_type,
+                    aggregate_id=str(campaign_id),
+                    payload=_payload(clean, received_at[index] if received_at else timestamp),
+                    sequence_number=sequence_number,
+                    timestamp=now
+                ))
+                if clean['type'] == 'impression':
+                    impressions.append(Impression(
+                        tenant_id=tenant_id,
+                        ad_id=clean['ad_id'],
+                        user_id=clean['user_id'],
+                        cost=clean['cost'],
+                        timestamp=now
+                    ))
+                results[index] = {
+                    'index': index,
+                    'status': 'recorded',
+                    'event_type': event_type,
+                    'sequence_number': sequence_number
+                }
+
+            AdEvent.objects.bulk_create(events, batch_size=BULK_SIZE)
+            Impression.objects.bulk_create(impressions, batch_size=BULK_SIZE)
+            count_events(events)
+            bump_tenant_version(tenant_id)
+            publish_deltas(tenant_id, _deltas(accepted))
+
+    recorded = len(accepted)
+    return {
+        'received': len(items),
+        'recorded': recorded,
+        'rejected': len(items) - recorded,
+        'results': results,
+    }
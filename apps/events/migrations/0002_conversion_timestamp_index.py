@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="conversionevent",
+            index=models.Index(
+                fields=["tenant_id", "timestamp"], name="events_conv_tenant__3c811b_idx"
+            ),
+        ),
+    ]
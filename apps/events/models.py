@@ -14,6 +14,11 @@ class ClickEvent(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
 class ConversionEvent(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant_id', 'timestamp']),
+        ]
+
     tenant_id = models.IntegerField(db_index=True)
     click = models.ForeignKey(ClickEvent, on_delete=models.CASCADE)
     conversion_value = models.DecimalField(max_digits=10, decimal_places=2)
@@ -6,6 +6,7 @@ urlpatterns = [
     path('impression/', views.record_impression, name='record_impression'),
     path('click/', views.record_click, name='record_click'), 
     path('conversion/', views.record_conversion, name='record_conversion'),
+    path('batch/', views.record_batch, name='record_batch'),
     
     # Event sourcing replay
     path('rebuild-metrics/<int:campaign_id>/', views.rebuild_campaign_metrics, name='rebuild_metrics'),
@@ -13,8 +14,10 @@ urlpatterns = [
     # Event streaming and monitoring
     path('stream/<int:campaign_id>/', views.event_stream, name='event_stream'),
     path('validate/<int:campaign_id>/', views.validate_events, name='validate_events'),
+    path('integrity/', views.sequence_integrity, name='sequence_integrity'),
     
     # Event statistics and management
     path('stats/', views.event_stats, name='event_stats'),
+    path('buffer/', views.buffer_status, name='buffer_status'),
     path('cleanup/', views.cleanup_events, name='cleanup_events'),
 ]
\ No newline at end of file
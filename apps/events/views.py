@@ -1,5 +1,6 @@
 # apps/events/views.py
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
@@ -10,18 +11,45 @@ from apps.analytics.events import (
     record_impression_event, 
     record_click_event, 
     record_conversion_event,
-    get_event_stream,
-    validate_event_sequence
+    get_event_page,
+    validate_event_sequence,
+    EVENT_PAGE_MAX
 )
+from apps.analytics.counters import count_events, event_totals
 from apps.analytics.models import AdEvent
+from apps.analytics.repositories.cached import bump_tenant_version
+from apps.analytics.sequences import next_sequence
+from apps.analytics.aggregates import verify_replay
 from decimal import Decimal
 import logging
 from django.conf import settings
 from .pubsub import EventPublisher
+from .parsers import NDJSONParser
+from .ingest import MAX_BATCH_SIZE, ingest_batch
+from .buffer import buffer_event, buffer_stats, write_behind_enabled
 
 logger = logging.getLogger(__name__)
 
 
+def _buffered_response(tenant_id, item):
+    """202 once the write-behind buffer holds the event"""
+    result = buffer_event(tenant_id, item)
+    if result['status'] == 'rejected':
+        return Response({
+            'error': 'Invalid event',
+            'errors': result['errors']
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if result['status'] == 'dropped':
+        return Response({
+            'error': 'Ingest buffer full, retry later'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({
+        'event_type': item['type'],
+        'campaign_id': item['campaign_id'],
+        'status': 'buffered'
+    }, status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def record_impression(request):
@@ -38,6 +66,12 @@ def record_impression(request):
                 'error': 'Missing required fields: campaign_id, ad_id, user_id'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if write_behind_enabled():
+            return _buffered_response(request.user.tenant_id, {
+                'type': 'impression', 'campaign_id': campaign_id, 'ad_id': ad_id,
+                'user_id': user_id, 'cost': cost
+            })
+        
         event = record_impression_event(
             campaign_id, ad_id, user_id, cost, request.user.tenant_id
         )
@@ -78,6 +112,12 @@ def record_click(request):
                 'error': 'Missing required fields: campaign_id, ad_id, user_id'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if write_behind_enabled():
+            return _buffered_response(request.user.tenant_id, {
+                'type': 'click', 'campaign_id': campaign_id, 'ad_id': ad_id,
+                'user_id': user_id, 'impression_id': impression_id
+            })
+        
         event = record_click_event(
             campaign_id, ad_id, user_id, request.user.tenant_id, impression_id
         )
@@ -117,6 +157,12 @@ def record_conversion(request):
                 'error': 'Missing required fields: campaign_id, user_id'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if write_behind_enabled():
+            return _buffered_response(request.user.tenant_id, {
+                'type': 'conversion', 'campaign_id': campaign_id,
+                'user_id': user_id, 'conversion_value': conversion_value
+            })
+        
         event = record_conversion_event(
             campaign_id, user_id, conversion_value, request.user.tenant_id
         )
@@ -142,12 +188,61 @@ def record_conversion(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+def record_batch(request):
+    """Record a batch of mixed events, sent as a JSON array or as NDJSON"""
+    # Parsed outside the try so malformed bodies still answer 400
+    items = request.data
+    try:
+        if isinstance(items, dict):
+            items = items.get('events')
+        if not isinstance(items, list):
+            return Response({
+                'error': 'Expected a list of events'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BATCH_SIZE:
+            return Response({
+                'error': f'Batch exceeds {MAX_BATCH_SIZE} events'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        result = ingest_batch(request.user.tenant_id, items)
+
+        if not result['rejected']:
+            code = status.HTTP_201_CREATED
+        elif result['recorded']:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response(result, status=code)
+
+    except Exception as e:
+        logger.error(f"Error recording event batch: {str(e)}")
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def rebuild_campaign_metrics(request, campaign_id):
-    """Rebuild metrics from events - Event Sourcing replay"""
+    """Rebuild metrics from events - Event Sourcing replay
+
+    ?verify=1 compares the snapshot-based fold with a full replay instead of
+    rebuilding; ?full=1 rebuilds while ignoring snapshots.
+    """
     try:
-        replayed_events = replay_events(campaign_id, request.user.tenant_id)
+        if request.query_params.get('verify'):
+            return Response({
+                'campaign_id': campaign_id,
+                'tenant_id': request.user.tenant_id,
+                **verify_replay(request.user.tenant_id, campaign_id)
+            })
+
+        replayed_events = replay_events(
+            campaign_id, request.user.tenant_id, use_snapshot=not request.query_params.get('full')
+        )
         
         return Response({
             'campaign_id': campaign_id,
@@ -169,18 +264,34 @@ def rebuild_campaign_metrics(request, campaign_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def event_stream(request, campaign_id):
-    """Get event stream for campaign"""
+    """Get event stream for campaign
+
+    Newest first, paged with ?cursor=<next_cursor>; ?since_sequence=N tails
+    the aggregate in sequence order from just after N.
+    """
     try:
-        limit = int(request.GET.get('limit', 100))
-        events = get_event_stream(campaign_id, request.user.tenant_id, limit)
+        page = get_event_page(
+            campaign_id,
+            request.user.tenant_id,
+            limit=request.GET.get('limit', 100),
+            cursor=request.GET.get('cursor'),
+            since_sequence=request.GET.get('since_sequence')
+        )
         
         return Response({
             'campaign_id': campaign_id,
-            'events': events,
-            'total_events': len(events),
-            'limit': limit
+            'events': page['events'],
+            'total_events': len(page['events']),
+            'limit': page['limit'],
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
         })
         
+    except ValueError as e:
+        return Response({
+            'error': str(e),
+            'campaign_id': campaign_id
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting event stream for campaign {campaign_id}: {str(e)}")
         return Response({
@@ -210,6 +321,46 @@ def validate_events(request, campaign_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sequence_integrity(request):
+    """Gaps and duplicates recorded by the integrity monitor (?aggregate_id=, ?kind=)"""
+    from apps.analytics.models import SequenceIssue
+    from apps.analytics.projections import projection_lag
+
+    tenant_id = request.user.tenant_id
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 100)), EVENT_PAGE_MAX))
+    except ValueError:
+        return Response({
+            'error': f"Invalid limit: {request.GET['limit']}",
+            'tenant_id': tenant_id
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        issues = SequenceIssue.objects.filter(tenant_id=tenant_id)
+        if request.GET.get('aggregate_id'):
+            issues = issues.filter(aggregate_id=request.GET['aggregate_id'])
+        if request.GET.get('kind'):
+            issues = issues.filter(kind=request.GET['kind'])
+
+        return Response({
+            'tenant_id': tenant_id,
+            'issues': list(issues.order_by('-id').values(
+                'aggregate_id', 'kind', 'first_sequence', 'last_sequence', 'event_id', 'detected_at'
+            )[:limit]),
+            'total_issues': issues.count(),
+            'monitor': projection_lag(tenant_id, ['sequence_integrity'])
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting sequence integrity for tenant {tenant_id}: {str(e)}")
+        return Response({
+            'error': str(e),
+            'tenant_id': tenant_id
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def event_stats(request):
@@ -217,28 +368,14 @@ def event_stats(request):
     try:
         tenant_id = request.user.tenant_id
         
-        # Get event counts by type
-        stats = {}
-        event_types = ['impression_created', 'click_registered', 'conversion_tracked']
-        
-        for event_type in event_types:
-            count = AdEvent.objects.filter(
-                tenant_id=tenant_id,
-                event_type=event_type
-            ).count()
-            stats[event_type] = count
-        
-        # Total events
-        total_events = AdEvent.objects.filter(tenant_id=tenant_id).count()
-        
-        # Recent events (last hour)
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        recent_events = AdEvent.objects.filter(
-            tenant_id=tenant_id,
-            timestamp__gte=timezone.now() - timedelta(hours=1)
-        ).count()
+        # Maintained at write time, so this reads a few hundred buckets, not the event table
+        totals = event_totals(tenant_id)
+        stats = {
+            event_type: totals['by_type'].get(event_type, 0)
+            for event_type in ['impression_created', 'click_registered', 'conversion_tracked']
+        }
+        total_events = totals['total']
+        recent_events = totals['last_hour']
         
         return Response({
             'tenant_id': tenant_id,
@@ -255,10 +392,23 @@ def event_stats(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def buffer_status(request):
+    """Write-behind buffer depth, flush latency and drop counters"""
+    try:
+        return Response(buffer_stats())
+    except Exception as e:
+        logger.error(f"Error reading buffer status: {str(e)}")
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def cleanup_events(request):
-    """Cleanup old events (admin only)"""
+    """Archive and cleanup old events (admin only)"""
     try:
         # Only allow admin users or superusers
         if not (request.user.is_staff or request.user.role == 'admin'):
@@ -267,22 +417,17 @@ def cleanup_events(request):
             }, status=status.HTTP_403_FORBIDDEN)
         
         days = int(request.GET.get('days', 30))
-        
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        cutoff_date = timezone.now() - timedelta(days=days)
-        
-        deleted_count = AdEvent.objects.filter(
-            tenant_id=request.user.tenant_id,
-            timestamp__lt=cutoff_date
-        ).delete()[0]
-        
+
+        # Archived to segment files and deleted in small chunks off the request path
+        from tasks.analytics import cleanup_old_events
+        result = cleanup_old_events.delay(days, request.user.tenant_id)
+
         return Response({
-            'deleted_events': deleted_count,
+            'task_id': result.id,
+            'status': 'queued',
             'cutoff_days': days,
             'tenant_id': request.user.tenant_id
-        })
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.error(f"Error cleaning up events: {str(e)}")
@@ -299,7 +444,7 @@ def create_conversion_event(request):
         conversion = serializer.save(tenant_id=request.user.tenant_id)
         
         # Event sourcing
-        AdEvent.objects.create(
+        event = AdEvent.objects.create(
             tenant_id=request.user.tenant_id,
             event_type='conversion_tracked',
             aggregate_id=str(conversion.click.impression.campaign.id),
@@ -308,8 +453,10 @@ def create_conversion_event(request):
                 'click_id': conversion.click.id,
                 'value': str(conversion.conversion_value)
             },
-            sequence_number=AdEvent.objects.count() + 1
+            sequence_number=next_sequence(request.user.tenant_id, conversion.click.impression.campaign.id)
         )
+        count_events([event])
+        bump_tenant_version(request.user.tenant_id)
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -322,7 +469,7 @@ def create_click_event(request):
         click = serializer.save(tenant_id=request.user.tenant_id)
         
         # Event sourcing
-        AdEvent.objects.create(
+        event = AdEvent.objects.create(
             tenant_id=request.user.tenant_id,
             event_type='click_registered',
             aggregate_id=str(click.impression.campaign.id),
@@ -330,8 +477,10 @@ def create_click_event(request):
                 'click_id': click.id,
                 'impression_id': click.impression.id
             },
-            sequence_number=AdEvent.objects.count() + 1
+            sequence_number=next_sequence(request.user.tenant_id, click.impression.campaign.id)
         )
+        count_events([event])
+        bump_tenant_version(request.user.tenant_id)
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -345,7 +494,7 @@ def create_impression_event(request):
         impression = serializer.save(tenant_id=request.user.tenant_id)
         
         # Event sourcing
-        AdEvent.objects.create(
+        event = AdEvent.objects.create(
             tenant_id=request.user.tenant_id,
             event_type='impression_created',
             aggregate_id=str(impression.campaign.id),
@@ -355,8 +504,10 @@ def create_impression_event(request):
                 'user_id': impression.user_id,
                 'cost': str(impression.cost)
             },
-            sequence_number=AdEvent.objects.count() + 1
+            sequence_number=next_sequence(request.user.tenant_id, impression.campaign.id)
         )
+        count_events([event])
+        bump_tenant_version(request.user.tenant_id)
 
         if settings.DEBUG is False:  # Solo en production
             publisher = EventPublisher()
@@ -1,15 +1,117 @@
 import json
-import asyncio
+import time
+from functools import partial
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken
 from django.contrib.auth import get_user_model
+from apps.analytics.models import AdEvent
 from apps.campaigns.models import Campaign
+from django.core.cache import cache
 from django.db import connection
+from apps.analytics.repositories.query_builder import TimeWindow
+from .producer import producers
+from .pubsub import SNAPSHOT_PREFIX, campaign_group, push_enabled
+from .windows import window_totals
 
 User = get_user_model()
 
+CAMPAIGN_METRICS_INTERVAL = 3  # Seconds
+DASHBOARD_METRICS_INTERVAL = 5
+
+
+def window_metrics(live):
+    """campaign_metrics fields from live window totals"""
+    impressions, users = live['impressions'], live['unique_users']
+    return {
+        'impressions_last_hour': impressions,
+        'unique_users': users,
+        'total_spend': live['spend'],
+        'avg_cpm': live['spend'] / impressions if impressions else 0.0,
+        'frequency': impressions / users if users else 0.0,
+        'status': 'active' if impressions > 0 else 'idle'
+    }
+
+
+def campaign_metrics(campaign_id, tenant_id):
+    """Last-hour delivery of one campaign"""
+    live = window_totals(tenant_id, campaign_id)
+    if live is not None:
+        return window_metrics(live)
+
+    last_hour, window_params = TimeWindow.last_hour().predicate('ci.timestamp')
+    sql = f"""
+    SELECT 
+        COUNT(*) as impressions_last_hour,
+        COUNT(DISTINCT ci.user_id) as unique_users,
+        COALESCE(SUM(ci.cost), 0) as spend,
+        COALESCE(AVG(ci.cost), 0) as avg_cpm,
+        COUNT(*) / NULLIF(COUNT(DISTINCT ci.user_id), 0) as frequency
+    FROM campaigns_impression ci
+    JOIN campaigns_ad ad ON ci.ad_id = ad.id
+    WHERE ad.campaign_id = %s 
+    AND ci.tenant_id = %s
+    AND {last_hour}
+    """
+    
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [campaign_id, tenant_id, *window_params])
+        row = cursor.fetchone()
+        
+        return {
+            'impressions_last_hour': row[0] or 0,
+            'unique_users': row[1] or 0,
+            'total_spend': float(row[2] or 0),
+            'avg_cpm': float(row[3] or 0),
+            'frequency': float(row[4] or 0),
+            'status': 'active' if (row[0] or 0) > 0 else 'idle'
+        }
+
+
+def live_campaign_metrics(campaign_id, tenant_id):
+    """campaign_metrics plus last-hour clicks, as pushed by RealTimeProcessor"""
+    live = window_totals(tenant_id, campaign_id)
+    if live is not None:
+        return {**window_metrics(live), 'clicks_last_hour': live['clicks']}
+
+    metrics = campaign_metrics(campaign_id, tenant_id)
+    metrics['clicks_last_hour'] = AdEvent.objects.filter(
+        tenant_id=tenant_id, aggregate_id=str(campaign_id), event_type='click_registered',
+        timestamp__gte=TimeWindow.last_hour().start
+    ).count()
+    return metrics
+
+
+def dashboard_metrics(tenant_id):
+    """Today's totals across the tenant's active campaigns"""
+    today, today_params = TimeWindow.today().predicate('ci.timestamp')
+    sql = f"""
+    SELECT 
+        COUNT(DISTINCT ca.id) as active_campaigns,
+        COUNT(ci.id) as total_impressions_today,
+        COALESCE(SUM(ci.cost), 0) as total_spend_today,
+        COUNT(DISTINCT ci.user_id) as unique_users_today
+    FROM campaigns_campaign ca
+    LEFT JOIN campaigns_ad ad ON ad.campaign_id = ca.id AND ad.tenant_id = %s
+    LEFT JOIN campaigns_impression ci ON ci.ad_id = ad.id 
+        AND ci.tenant_id = %s 
+        AND {today}
+    WHERE ca.tenant_id = %s AND ca.status = 'active'
+    """
+    
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tenant_id, tenant_id, *today_params, tenant_id])
+        row = cursor.fetchone()
+        
+        return {
+            'active_campaigns': row[0] or 0,
+            'impressions_today': row[1] or 0,
+            'spend_today': float(row[2] or 0),
+            'unique_users_today': row[3] or 0
+        }
+
+
 class CampaignMetricsConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.campaign_id = self.scope['url_route']['kwargs']['campaign_id']
@@ -23,18 +125,54 @@ class CampaignMetricsConsumer(AsyncWebsocketConsumer):
             return
             
         self.tenant_id = self.user.tenant_id
-        self.room_group_name = f'campaign_{self.campaign_id}_tenant_{self.tenant_id}'
+        self.room_group_name = campaign_group(self.campaign_id, self.tenant_id)
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
         
-        # Start real-time metrics
-        self.metrics_task = asyncio.create_task(self.send_metrics_loop())
+        if push_enabled():
+            # A snapshot now, then only the deltas RealTimeProcessor pushes
+            await self.send_snapshot()
+            return
+
+        # Otherwise metrics come from the group's shared producer
+        self.subscribed = True
+        latest = await producers.subscribe(
+            self.room_group_name,
+            partial(campaign_metrics, self.campaign_id, self.tenant_id),
+            'metrics_update',
+            CAMPAIGN_METRICS_INTERVAL,
+            {'campaign_id': self.campaign_id}
+        )
+        if latest:
+            await self.metrics_update(latest)
 
     async def disconnect(self, close_code):
-        if hasattr(self, 'metrics_task'):
-            self.metrics_task.cancel()
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if getattr(self, 'subscribed', False):
+            await producers.unsubscribe(self.room_group_name)
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def metrics_update(self, event):
+        await self.send(text_data=json.dumps(event))
+
+    async def metrics_delta(self, event):
+        await self.send(text_data=json.dumps(event))
+
+    async def send_snapshot(self):
+        snapshot = await cache.aget(f'{SNAPSHOT_PREFIX}:{self.room_group_name}')
+        if snapshot is None:
+            # Nothing pushed for this campaign within the window yet
+            snapshot = await database_sync_to_async(live_campaign_metrics)(self.campaign_id, self.tenant_id)
+        await self.send(text_data=json.dumps({
+            'type': 'metrics_snapshot',
+            'campaign_id': self.campaign_id,
+            'data': snapshot,
+            'timestamp': time.time()
+        }))
+
+    async def producer_error(self, event):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': event['message']}))
 
     def get_token_from_scope(self):
         query_string = self.scope.get('query_string', b'').decode()
@@ -56,55 +194,6 @@ class CampaignMetricsConsumer(AsyncWebsocketConsumer):
         except (InvalidToken, Exception):
             return None
 
-    async def send_metrics_loop(self):
-        while True:
-            try:
-                metrics = await self.get_real_time_metrics()
-                await self.send(text_data=json.dumps({
-                    'type': 'metrics_update',
-                    'campaign_id': self.campaign_id,
-                    'data': metrics,
-                    'timestamp': asyncio.get_event_loop().time()
-                }))
-                await asyncio.sleep(3)
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': f'Metrics error: {str(e)}'
-                }))
-                break
-
-    @database_sync_to_async
-    def get_real_time_metrics(self):
-        sql = """
-        SELECT 
-            COUNT(*) as impressions_last_hour,
-            COUNT(DISTINCT ci.user_id) as unique_users,
-            COALESCE(SUM(ci.cost), 0) as spend,
-            COALESCE(AVG(ci.cost), 0) as avg_cpm,
-            COUNT(*) / NULLIF(COUNT(DISTINCT ci.user_id), 0) as frequency
-        FROM campaigns_impression ci
-        JOIN campaigns_ad ad ON ci.ad_id = ad.id
-        WHERE ad.campaign_id = %s 
-        AND ci.tenant_id = %s
-        AND ci.timestamp >= NOW() - INTERVAL 1 HOUR
-        """
-        
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [self.campaign_id, self.tenant_id])
-            row = cursor.fetchone()
-            
-            return {
-                'impressions_last_hour': row[0] or 0,
-                'unique_users': row[1] or 0,
-                'total_spend': float(row[2] or 0),
-                'avg_cpm': float(row[3] or 0),
-                'frequency': float(row[4] or 0),
-                'status': 'active' if (row[0] or 0) > 0 else 'idle'
-            }
-
 class DashboardConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         token = self.get_token_from_scope()
@@ -120,12 +209,27 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
         
-        self.dashboard_task = asyncio.create_task(self.send_dashboard_loop())
+        self.subscribed = True
+        latest = await producers.subscribe(
+            self.room_group_name,
+            partial(dashboard_metrics, self.tenant_id),
+            'dashboard_update',
+            DASHBOARD_METRICS_INTERVAL
+        )
+        if latest:
+            await self.dashboard_update(latest)
 
     async def disconnect(self, close_code):
-        if hasattr(self, 'dashboard_task'):
-            self.dashboard_task.cancel()
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if getattr(self, 'subscribed', False):
+            await producers.unsubscribe(self.room_group_name)
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def dashboard_update(self, event):
+        await self.send(text_data=json.dumps(event))
+
+    async def producer_error(self, event):
+        pass  # The dashboard keeps showing its last update
 
     def get_token_from_scope(self):
         query_string = self.scope.get('query_string', b'').decode()
@@ -146,45 +250,3 @@ class DashboardConsumer(AsyncWebsocketConsumer):
             return jwt_auth.get_user(validated_token)
         except (InvalidToken, Exception):
             return None
-
-    async def send_dashboard_loop(self):
-        while True:
-            try:
-                dashboard_data = await self.get_dashboard_metrics()
-                await self.send(text_data=json.dumps({
-                    'type': 'dashboard_update',
-                    'data': dashboard_data,
-                    'timestamp': asyncio.get_event_loop().time()
-                }))
-                await asyncio.sleep(5)
-            except asyncio.CancelledError:
-                break
-            except Exception:
-                break
-
-    @database_sync_to_async
-    def get_dashboard_metrics(self):
-        sql = """
-        SELECT 
-            COUNT(DISTINCT ca.id) as active_campaigns,
-            COUNT(ci.id) as total_impressions_today,
-            COALESCE(SUM(ci.cost), 0) as total_spend_today,
-            COUNT(DISTINCT ci.user_id) as unique_users_today
-        FROM campaigns_campaign ca
-        LEFT JOIN campaigns_ad ad ON ad.campaign_id = ca.id AND ad.tenant_id = %s
-        LEFT JOIN campaigns_impression ci ON ci.ad_id = ad.id 
-            AND ci.tenant_id = %s 
-            AND DATE(ci.timestamp) = CURDATE()
-        WHERE ca.tenant_id = %s AND ca.status = 'active'
-        """
-        
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [self.tenant_id, self.tenant_id, self.tenant_id])
-            row = cursor.fetchone()
-            
-            return {
-                'active_campaigns': row[0] or 0,
-                'impressions_today': row[1] or 0,
-                'spend_today': float(row[2] or 0),
-                'unique_users_today': row[3] or 0
-            }
\ No newline at end of file
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+import uuid
+import redis
+from django.core.management.base import BaseCommand, CommandError
+from apps.realtime.pubsub import STREAMS_KEY, EventStreamer, async_client, redis_url
+
+
+class Command(BaseCommand):
+    help = 'Measure publish and consume throughput of the Redis event streams at REALTIME_REDIS_URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20000, help='Events per run')
+        parser.add_argument('--concurrency', type=int, default=50, help='Publishes in flight at once')
+        parser.add_argument('--consumers', type=int, default=4, help='Consumers sharing the stream')
+        parser.add_argument('--batch', type=int, default=100, help='Entries per XREADGROUP')
+
+    def handle(self, *args, **options):
+        if min(options['events'], options['concurrency'], options['consumers'], options['batch']) < 1:
+            raise CommandError('All options must be at least 1')
+        try:
+            redis.Redis.from_url(redis_url()).ping()
+        except redis.RedisError as e:
+            raise CommandError(f'Redis is not reachable at {redis_url()}: {str(e)}')
+
+        self.stdout.write(f'🚀 {options["events"]:,} events against {redis_url()}')
+        self.stdout.write(f'{"mode":>18} {"events":>9} {"seconds":>8} {"events/s":>10}')
+        stream = f'benchmark.{uuid.uuid4().hex[:8]}'
+        try:
+            self.report('sync PUBLISH', options['events'], self.publish_sync(stream, options['events']))
+            results = asyncio.run(self.run(stream, **options))
+        finally:
+            client = redis.Redis.from_url(redis_url())
+            client.delete(stream)
+            client.srem(STREAMS_KEY, stream)
+        for mode, events, seconds in results:
+            self.report(mode, events, seconds)
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
+
+    def report(self, mode, events, seconds):
+        self.stdout.write(f'{mode:>18} {events:>9,} {seconds:>8.2f} {events / seconds:>10,.0f}')
+
+    def event(self, index):
+        return {'event_type': 'impression_created', 'tenant_id': 0, 'campaign_id': index % 10,
+                'timestamp': time.time(), 'data': {'user_id': index, 'cost': 0.5}}
+
+    def publish_sync(self, stream, events):
+        # What EventStreamer used to do: a blocking round trip per event
+        client = redis.Redis.from_url(redis_url())
+        started = time.perf_counter()
+        for index in range(events):
+            client.publish(stream, json.dumps(self.event(index)))
+        return time.perf_counter() - started
+
+    async def run(self, stream, events, concurrency, consumers, batch, **options):
+        streamer = EventStreamer()
+        results = []
+
+        started = time.perf_counter()
+        for index in range(events // 10):
+            await streamer.publish(stream, self.event(index))
+        results.append(('XADD serial', events // 10, time.perf_counter() - started))
+
+        started = time.perf_counter()
+        for first in range(0, events, concurrency):
+            await asyncio.gather(*(
+                streamer.publish(stream, self.event(index)) for index in range(first, min(first + concurrency, events))
+            ))
+        results.append(('XADD concurrent', events, time.perf_counter() - started))
+
+        group, handled = 'benchmark', []
+        await streamer.ensure_group(stream, group)
+        total = events + events // 10
+
+        async def handler(event):
+            handled.append(event['data']['user_id'])
+
+        async def consume(name):
+            own = EventStreamer(async_client())
+            while len(handled) < total:
+                await own.process([stream], group, name, handler, count=batch, block_ms=100)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(consume(f'consumer-{index}') for index in range(consumers)))
+        results.append((f'XREADGROUP x{consumers}', len(handled), time.perf_counter() - started))
+        await streamer.redis_client.connection_pool.disconnect()
+        return results
@@ -0,0 +1,98 @@
+import asyncio
+import statistics
+import time
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+from apps.realtime.producer import GroupProducers
+
+
+class Command(BaseCommand):
+    help = 'Simulate WebSocket subscribers on the in-memory channel layer: per-socket loops vs shared producers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=3000, help='Simulated sockets')
+        parser.add_argument('--groups', type=int, default=1, help='Campaign groups the sockets are spread over')
+        parser.add_argument('--ticks', type=int, default=3, help='Updates each socket waits for')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds between updates')
+        parser.add_argument('--query_ms', type=float, default=2.0, help='Simulated cost of one metrics query')
+
+    def handle(self, *args, **options):
+        if options['sockets'] < 1 or options['groups'] < 1:
+            raise CommandError('--sockets and --groups must be at least 1')
+
+        self.stdout.write(
+            f'🚀 {options["sockets"]:,} sockets over {options["groups"]} groups, '
+            f'{options["ticks"]} updates every {options["interval"]}s, {options["query_ms"]}ms per query'
+        )
+        self.stdout.write(f'{"mode":>10} {"queries":>9} {"per tick":>9} {"messages":>9} {"p50 ms":>8} {"p95 ms":>8} {"wall s":>7}')
+        for mode in ('per-socket', 'shared'):
+            result = async_to_sync(self.run)(mode, **{key: options[key] for key in (
+                'sockets', 'groups', 'ticks', 'interval', 'query_ms'
+            )})
+            self.stdout.write(
+                f'{mode:>10} {result["queries"]:>9,} {result["queries"] / options["ticks"]:>9,.0f} '
+                f'{result["messages"]:>9,} {result["p50_ms"]:>8.1f} {result["p95_ms"]:>8.1f} {result["wall_s"]:>7.2f}'
+            )
+        # InMemoryChannelLayer sweeps every channel on each receive(), so
+        # fan-out latency here grows with the square of the socket count
+        self.stdout.write('ℹ️  Latency includes the in-memory layer sweeping all channels on every receive')
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
+
+    async def run(self, mode, sockets, groups, ticks, interval, query_ms):
+        layer = InMemoryChannelLayer(capacity=ticks + 10)
+        queries = 0
+
+        def compute():
+            nonlocal queries
+            queries += 1
+            time.sleep(query_ms / 1000)
+            return {'impressions_last_hour': queries}
+
+        subscribers = []
+        for index in range(sockets):
+            channel = await layer.new_channel()
+            group = f'campaign_{index % groups}_tenant_0'
+            await layer.group_add(group, channel)
+            subscribers.append((channel, group))
+
+        latencies = []
+
+        async def receive(channel):
+            for _ in range(ticks):
+                message = await layer.receive(channel)
+                latencies.append(time.time() - message['timestamp'])
+
+        async def legacy_loop(channel):
+            # What every CampaignMetricsConsumer used to do on its own
+            for _ in range(ticks):
+                data = await database_sync_to_async(compute)()
+                await layer.send(channel, {'type': 'metrics_update', 'data': data, 'timestamp': time.time()})
+                await asyncio.sleep(interval)
+
+        started = time.perf_counter()
+        receivers = [asyncio.ensure_future(receive(channel)) for channel, _ in subscribers]
+        producers, loops = GroupProducers(layer), []
+        if mode == 'shared':
+            for _, group in subscribers:
+                await producers.subscribe(group, compute, 'metrics_update', interval)
+        else:
+            loops = [asyncio.ensure_future(legacy_loop(channel)) for channel, _ in subscribers]
+
+        await asyncio.gather(*receivers)
+        wall = time.perf_counter() - started
+        for _, group in subscribers:
+            await producers.unsubscribe(group)
+        for loop in loops:
+            loop.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+
+        ordered = sorted(latencies)
+        return {
+            'queries': queries,
+            'messages': len(latencies),
+            'p50_ms': statistics.median(ordered) * 1000,
+            'p95_ms': ordered[int(len(ordered) * 0.95) - 1] * 1000,
+            'wall_s': wall,
+        }
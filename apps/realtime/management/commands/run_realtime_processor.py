@@ -0,0 +1,14 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from apps.realtime.pubsub import RealTimeProcessor, frame_ms, redis_url
+
+
+class Command(BaseCommand):
+    help = 'Fold published metric deltas into live campaign windows and push them to WebSocket groups'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'📡 Consuming metric delta streams at {redis_url()}, one frame per {frame_ms()}ms at most')
+        try:
+            asyncio.run(RealTimeProcessor().process_event_stream())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('⚠️  Stopped'))
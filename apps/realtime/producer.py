@@ -0,0 +1,120 @@
+# apps/realtime/producer.py
+"""One metrics producer per channel-layer group, shared by all its sockets.
+
+A consumer joining a group calls subscribe(); the first subscriber in a
+process starts a producer task for the group, later ones only join. The
+producer computes the group's metrics every `interval` seconds and
+group_sends them, so the query runs once per group per tick instead of
+once per socket.
+
+Across processes, only the holder of the group's lease (a cache key set
+with add(), i.e. SET NX on Redis) computes; producers in other processes
+stand by and take over when the lease is not renewed within
+REALTIME_LEASE_SECONDS. A producer stops, and releases its lease, when
+its process has no subscribers left in the group.
+
+The latest message of each group is kept in the cache so a new socket
+gets data right away instead of waiting for the next tick.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import suppress
+from typing import Any, Callable, Dict
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+LEASE_PREFIX = 'realtime:producer'
+LATEST_PREFIX = 'realtime:latest'
+
+
+def lease_seconds() -> int:
+    return getattr(settings, 'REALTIME_LEASE_SECONDS', 10)
+
+
+class GroupProducers:
+    """The producer tasks of one process, keyed by group name"""
+
+    def __init__(self, channel_layer=None):
+        self.channel_layer = channel_layer
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.subscribers: Dict[str, int] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.ticks: Dict[str, int] = {}
+
+    @property
+    def layer(self):
+        return self.channel_layer or get_channel_layer()
+
+    async def subscribe(self, group: str, compute: Callable[[], Dict[str, Any]], message_type: str,
+                        interval: float, extra: Dict[str, Any] = None):
+        """Count a local subscriber and start the group's producer if it is the first.
+
+        `compute` is a synchronous function returning the metrics; it is
+        run in a worker thread. Returns the group's latest message, if any.
+        """
+        self.subscribers[group] = self.subscribers.get(group, 0) + 1
+        if group not in self.tasks:
+            self.tasks[group] = asyncio.create_task(
+                self._produce(group, database_sync_to_async(compute), message_type, interval, extra or {})
+            )
+        return await cache.aget(f'{LATEST_PREFIX}:{group}')
+
+    async def unsubscribe(self, group: str):
+        remaining = self.subscribers.get(group, 0) - 1
+        if remaining > 0:
+            self.subscribers[group] = remaining
+            return
+        self.subscribers.pop(group, None)
+        task = self.tasks.pop(group, None)
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _hold_lease(self, key: str) -> bool:
+        ttl = lease_seconds()
+        if await cache.aadd(key, self.owner, ttl):
+            return True
+        if await cache.aget(key) == self.owner:
+            return await cache.atouch(key, ttl)
+        return False
+
+    async def _produce(self, group, compute, message_type, interval, extra):
+        key = f'{LEASE_PREFIX}:{group}'
+        try:
+            while True:
+                if await self._hold_lease(key):
+                    try:
+                        message = {
+                            'type': message_type,
+                            **extra,
+                            'data': await compute(),
+                            'timestamp': time.time(),
+                        }
+                        await cache.aset(f'{LATEST_PREFIX}:{group}', message, max(int(interval * 2), 1))
+                        await self.layer.group_send(group, message)
+                        self.ticks[group] = self.ticks.get(group, 0) + 1
+                    except Exception as e:
+                        logger.error(f"Metrics producer for {group} failed: {str(e)}")
+                        with suppress(Exception):
+                            await self.layer.group_send(group, {
+                                'type': 'producer_error',
+                                'message': f'Metrics error: {str(e)}'
+                            })
+                await asyncio.sleep(interval)
+        finally:
+            if await cache.aget(key) == self.owner:
+                await cache.adelete(key)
+
+
+producers = GroupProducers()
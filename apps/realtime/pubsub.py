@@ -1,102 +1,396 @@
+# apps/realtime/pubsub.py
+"""Tenant event streams on Redis Streams, and push-based campaign metrics.
+
+Every tenant has an event stream (events.tenant.<id>) and a metrics delta
+stream (metrics.tenant.<id>). Entries are added with XADD, capped at about
+REALTIME_STREAM_MAXLEN, and read through consumer groups: each entry goes
+to one consumer of a group and stays pending until it is acknowledged, so
+several workers can share a stream and an entry whose worker died is
+claimed by another after REALTIME_STREAM_CLAIM_IDLE_MS. Delivery is at
+least once; handlers must tolerate seeing an entry twice.
+
+The ingest path adds a compact per-campaign delta (publish_deltas) once
+its transaction commits, in the same round trip that adds it to the live
+windows (see windows.py). RealTimeProcessor, a long-running process
+(manage.py run_realtime_processor, as many as needed), turns them into
+the changed last-hour totals of each campaign and broadcasts those to the
+consumers' group, coalesced to at most one frame per REALTIME_FRAME_MS.
+A delta only marks its campaign as changed and the totals are re-read
+(from the live windows once they are warm), so
+a redelivered delta, or one handled by another worker, changes nothing.
+The latest totals are kept in the cache as the snapshot a newly connected
+socket starts from. Pushing is off unless REALTIME_PUSH_METRICS is set,
+which should only be done where the processor runs; without it, campaign
+sockets poll through the shared producers instead.
+"""
 import asyncio
 import json
+import logging
+import os
+import socket
+import time
+import weakref
+from collections import defaultdict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
 import redis
+import redis.asyncio
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
 from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+STREAMS_KEY = 'realtime:streams'
+DELTA_PREFIX = 'metrics.tenant.'
+EVENT_PREFIX = 'events.tenant.'
+PROCESSOR_GROUP = 'realtime_processor'
+SNAPSHOT_PREFIX = 'realtime:window'
+WINDOW_MINUTES = 60
+STREAM_REFRESH = 5  # Seconds between looking for new tenant streams
+
+
+def push_enabled() -> bool:
+    # Off unless run_realtime_processor is deployed: sockets would get a snapshot and then nothing
+    return getattr(settings, 'REALTIME_PUSH_METRICS', False)
+
+
+def frame_ms() -> int:
+    return getattr(settings, 'REALTIME_FRAME_MS', 250)
+
+
+def redis_url() -> str:
+    return getattr(settings, 'REALTIME_REDIS_URL', 'redis://127.0.0.1:6379/3')
+
+
+def stream_maxlen() -> int:
+    return getattr(settings, 'REALTIME_STREAM_MAXLEN', 100000)
+
+
+def claim_idle_ms() -> int:
+    return getattr(settings, 'REALTIME_STREAM_CLAIM_IDLE_MS', 30000)
+
+
+def campaign_group(campaign_id, tenant_id) -> str:
+    """The group CampaignMetricsConsumer sockets join"""
+    return f'campaign_{campaign_id}_tenant_{tenant_id}'
+
+
+def current_minute() -> int:
+    return int(time.time() // 60)
+
+
+def consumer_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def async_client() -> redis.asyncio.Redis:
+    """A client on the running event loop's shared connection pool"""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = redis.asyncio.ConnectionPool.from_url(redis_url(), decode_responses=True)
+    return redis.asyncio.Redis(connection_pool=pool)
+
+
+def _encode(event: Dict[str, Any]) -> Dict[str, str]:
+    return {'e': json.dumps(event, cls=DjangoJSONEncoder, separators=(',', ':'))}
+
 
 class EventStreamer:
-    def __init__(self):
-        self.redis_client = redis.Redis(host='127.0.0.1', port=6379, db=3)
-        
+    """Publishing to and consuming from tenant streams, without blocking the event loop"""
+
+    def __init__(self, client=None):
+        self._client = client
+        self.next_claim = 0.0
+
+    @property
+    def redis_client(self) -> redis.asyncio.Redis:
+        if self._client is None:
+            self._client = async_client()
+        return self._client
+
+    async def publish(self, stream: str, event: Dict[str, Any]) -> str:
+        """Append an event to a stream; returns its entry id"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.xadd(stream, _encode(event), maxlen=stream_maxlen(), approximate=True)
+            pipe.sadd(STREAMS_KEY, stream)
+            entry_id, _ = await pipe.execute()
+        return entry_id
+
     async def publish_impression_event(self, tenant_id, campaign_id, event_data):
-        """Simulate Pub/Sub impression event publishing"""
-        topic = f"impressions.tenant.{tenant_id}"
-        
+        """Add an impression to the tenant's event stream"""
         event = {
             'event_type': 'impression_created',
             'tenant_id': tenant_id,
             'campaign_id': campaign_id,
-            'timestamp': asyncio.get_event_loop().time(),
+            'timestamp': time.time(),
             'data': event_data
         }
-        
-        # Publish to Redis (simulating Google Pub/Sub)
-        self.redis_client.publish(topic, json.dumps(event))
+        event['entry_id'] = await self.publish(f'{EVENT_PREFIX}{tenant_id}', event)
         return event
-    
+
     async def publish_click_event(self, tenant_id, campaign_id, impression_id):
-        """Simulate click event streaming"""
-        topic = f"clicks.tenant.{tenant_id}"
-        
+        """Add a click to the tenant's event stream"""
         event = {
             'event_type': 'click_registered',
             'tenant_id': tenant_id,
             'campaign_id': campaign_id,
             'impression_id': impression_id,
-            'timestamp': asyncio.get_event_loop().time()
+            'timestamp': time.time()
         }
-        
-        self.redis_client.publish(topic, json.dumps(event))
+        event['entry_id'] = await self.publish(f'{EVENT_PREFIX}{tenant_id}', event)
         return event
-    
-    async def subscribe_to_events(self, tenant_id, callback):
-        """Subscribe to tenant events stream"""
-        topics = [f"impressions.tenant.{tenant_id}", f"clicks.tenant.{tenant_id}"]
-        pubsub = self.redis_client.pubsub()
-        
-        for topic in topics:
-            pubsub.subscribe(topic)
-        
-        async for message in pubsub.listen():
-            if message['type'] == 'message':
-                event_data = json.loads(message['data'])
-                await callback(event_data)
-
-# Event processor for real-time analytics
+
+    async def streams(self, prefix: str) -> List[str]:
+        """Streams published to so far whose key starts with `prefix`"""
+        return sorted(stream for stream in await self.redis_client.smembers(STREAMS_KEY)
+                      if stream.startswith(prefix))
+
+    async def ensure_group(self, stream: str, group: str):
+        """Create the consumer group (and the stream) unless it exists; it starts at the oldest entry"""
+        try:
+            await self.redis_client.xgroup_create(stream, group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def claim_stale(self, streams: Iterable[str], group: str, consumer: str,
+                          count: int = 100) -> List[Tuple[str, str, Any]]:
+        """Take over entries other consumers left pending for longer than the claim timeout"""
+        claimed = []
+        for stream in streams:
+            response = await self.redis_client.xautoclaim(stream, group, consumer, claim_idle_ms(), count=count)
+            claimed += [(stream, entry_id, fields) for entry_id, fields in response[1]]
+        return claimed
+
+    async def read_group(self, streams: Iterable[str], group: str, consumer: str, count: int = 100,
+                         block_ms: int = 1000) -> List[Tuple[str, str, Any]]:
+        """New entries for this consumer, waiting up to `block_ms` for some"""
+        response = await self.redis_client.xreadgroup(
+            group, consumer, {stream: '>' for stream in streams}, count=count, block=block_ms
+        )
+        return [(stream, entry_id, fields) for stream, entries in response or [] for entry_id, fields in entries]
+
+    async def ack(self, group: str, entries: Iterable[Tuple[str, str]]) -> int:
+        by_stream = defaultdict(list)
+        for stream, entry_id in entries:
+            by_stream[stream].append(entry_id)
+        if not by_stream:
+            return 0
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for stream, entry_ids in by_stream.items():
+                pipe.xack(stream, group, *entry_ids)
+            return sum(await pipe.execute())
+
+    async def process(self, streams: List[str], group: str, consumer: str,
+                      handler: Callable[[Dict[str, Any]], Awaitable[Any]], count: int = 100,
+                      block_ms: int = 1000, ack: bool = True) -> List[Tuple[str, str]]:
+        """Hand one batch of entries to `handler`; returns (stream, entry id) of those it handled.
+
+        Stale pending entries are reclaimed first, at most every half claim
+        timeout. An entry whose handler raises is left pending and retried
+        once it is reclaimed. With ack=False the caller acknowledges the
+        returned entries itself, e.g. after the work they caused is done.
+        """
+        entries = []
+        if time.monotonic() >= self.next_claim:
+            self.next_claim = time.monotonic() + claim_idle_ms() / 2000
+            entries = await self.claim_stale(streams, group, consumer, count)
+        if not entries:
+            entries = await self.read_group(streams, group, consumer, count, block_ms)
+
+        handled = []
+        for stream, entry_id, fields in entries:
+            if fields:  # Trimmed away while pending otherwise
+                try:
+                    await handler(json.loads(fields['e']))
+                except Exception as e:
+                    logger.error(f"Handling {stream} entry {entry_id} failed: {str(e)}")
+                    continue
+            handled.append((stream, entry_id))
+        if ack:
+            await self.ack(group, handled)
+        return handled
+
+    async def consume(self, streams: List[str], group: str, consumer: str,
+                      handler: Callable[[Dict[str, Any]], Awaitable[Any]], **options):
+        """Process `streams` as one consumer of `group` until cancelled"""
+        for stream in streams:
+            await self.ensure_group(stream, group)
+        while True:
+            await self.process(streams, group, consumer, handler, **options)
+
+    async def subscribe_to_events(self, tenant_id, callback, group='subscribers', consumer=None):
+        """Feed the tenant's event stream to `callback`, sharing it with the group's other consumers"""
+        await self.consume([f'{EVENT_PREFIX}{tenant_id}'], group, consumer or consumer_name(), callback)
+
+
+def delta(campaign_id, impressions=0, clicks=0, spend=0, users=()) -> Dict[str, Any]:
+    """One campaign's change in the current minute, in the compact wire format"""
+    return {'c': int(campaign_id), 'm': current_minute(), 'i': impressions, 'k': clicks,
+            's': str(spend), 'u': [int(user_id) for user_id in users]}
+
+
+_client = None
+_failed_tenants = set()  # Whose last publish failed, so their live windows missed writes
+
+
+def redis_client() -> redis.Redis:
+    """The process's sync client, with short timeouts for the request path"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(redis_url(), socket_timeout=0.1, socket_connect_timeout=0.1)
+    return _client
+
+
+def _publish(tenant_id, deltas):
+    from .windows import add_counts, windows_enabled
+
+    stream = f'{DELTA_PREFIX}{tenant_id}'
+    try:
+        pipe = redis_client().pipeline(transaction=False)
+        if push_enabled():
+            pipe.xadd(stream, _encode({'t': tenant_id, 'd': deltas}), maxlen=stream_maxlen(), approximate=True)
+            pipe.sadd(STREAMS_KEY, stream)
+        if windows_enabled():
+            add_counts(pipe, tenant_id, deltas, restart=tenant_id in _failed_tenants)
+        pipe.execute()
+    except redis.RedisError as e:
+        # Dashboards fall behind; the write itself must not fail
+        _failed_tenants.add(tenant_id)
+        logger.warning(f"Could not publish metric deltas for tenant {tenant_id}: {str(e)}")
+    else:
+        _failed_tenants.discard(tenant_id)
+
+
+def publish_deltas(tenant_id: int, deltas: List[Dict[str, Any]]):
+    """Publish deltas and add them to the live windows after the surrounding transaction commits"""
+    from .windows import windows_enabled
+
+    if deltas and (push_enabled() or windows_enabled()):
+        transaction.on_commit(partial(_publish, tenant_id, deltas))
+
+
+def stream_status(tenant_id: int) -> Dict[str, Any]:
+    """Length and consumer groups of the tenant's streams"""
+    client = redis_client()
+    try:
+        streams = {}
+        for stream in (f'{EVENT_PREFIX}{tenant_id}', f'{DELTA_PREFIX}{tenant_id}'):
+            groups = client.xinfo_groups(stream) if client.exists(stream) else []
+            streams[stream] = {
+                'length': client.xlen(stream),
+                'groups': [{
+                    'name': group['name'].decode(),
+                    'consumers': group['consumers'],
+                    'pending': group['pending'],
+                    'lag': group.get('lag'),
+                } for group in groups],
+            }
+    except redis.RedisError as e:
+        return {'redis_connected': False, 'error': str(e)}
+    return {'redis_connected': True, 'streams': streams}
+
+
 class RealTimeProcessor:
-    def __init__(self):
+    """Broadcasts the changed totals of campaigns named in the delta streams.
+
+    Entries are acknowledged only after the frame they led to was sent, so
+    a worker that dies in between leaves them to be reclaimed.
+    """
+
+    def __init__(self, channel_layer=None, consumer=None):
         self.streamer = EventStreamer()
-        self.metrics_cache = {}
-    
-    async def process_event_stream(self, tenant_id):
-        """Process incoming events and update metrics"""
-        await self.streamer.subscribe_to_events(tenant_id, self.handle_event)
-    
+        self.channel_layer = channel_layer
+        self.consumer = consumer or consumer_name()
+        self.metrics_cache: Dict[str, Dict[str, Any]] = {}  # group -> totals last broadcast
+        self.active = set()  # (tenant_id, campaign_id) with impressions in the window
+        self.dirty = set()
+        self.unacked: List[Tuple[str, str]] = []
+        self.minute = current_minute()
+
+    @property
+    def layer(self):
+        return self.channel_layer or get_channel_layer()
+
+    async def process_event_stream(self):
+        """Consume every tenant's delta stream until cancelled"""
+        flusher = asyncio.create_task(self.flush_loop())
+        streams, refreshed = [], 0.0
+        try:
+            while True:
+                if time.monotonic() - refreshed > STREAM_REFRESH:
+                    refreshed = time.monotonic()
+                    streams = await self.streamer.streams(DELTA_PREFIX)
+                    for stream in streams:
+                        await self.streamer.ensure_group(stream, PROCESSOR_GROUP)
+                if not streams:
+                    await asyncio.sleep(STREAM_REFRESH)
+                    continue
+                self.unacked += await self.streamer.process(
+                    streams, PROCESSOR_GROUP, self.consumer, self.handle_event,
+                    block_ms=frame_ms(), ack=False
+                )
+        finally:
+            flusher.cancel()
+
     async def handle_event(self, event_data):
-        """Handle individual events and update real-time metrics"""
-        tenant_id = event_data['tenant_id']
-        campaign_id = event_data['campaign_id']
-        
-        # Update in-memory metrics cache
-        cache_key = f"{tenant_id}:{campaign_id}"
-        if cache_key not in self.metrics_cache:
-            self.metrics_cache[cache_key] = {
-                'impressions': 0,
-                'clicks': 0,
-                'last_update': asyncio.get_event_loop().time()
-            }
-        
-        if event_data['event_type'] == 'impression_created':
-            self.metrics_cache[cache_key]['impressions'] += 1
-        elif event_data['event_type'] == 'click_registered':
-            self.metrics_cache[cache_key]['clicks'] += 1
-            
-        self.metrics_cache[cache_key]['last_update'] = asyncio.get_event_loop().time()
-        
-        # Broadcast to WebSocket clients
-        await self.broadcast_to_websockets(tenant_id, campaign_id, self.metrics_cache[cache_key])
-    
-    async def broadcast_to_websockets(self, tenant_id, campaign_id, metrics):
-        """Send updated metrics to WebSocket connections"""
-        from channels.layers import get_channel_layer
-        
-        channel_layer = get_channel_layer()
-        group_name = f'campaign_{campaign_id}_metrics'
-        
-        await channel_layer.group_send(
-            group_name,
-            {
-                'type': 'metrics_update',
-                'campaign_id': campaign_id,
-                'data': metrics
-            }
-        )
+        """Mark the campaigns of one delta entry ({'t': tenant_id, 'd': [delta, ...]}) as changed"""
+        for change in event_data['d']:
+            self.dirty.add((event_data['t'], change['c']))
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(frame_ms() / 1000)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Metric delta broadcast failed: {str(e)}")
+
+    async def flush(self) -> int:
+        """Broadcast the changed fields of every changed campaign; returns frames sent"""
+        from .consumer import live_campaign_metrics
+
+        minute = current_minute()
+        if minute != self.minute:
+            # Minutes left the window; every active total may have moved
+            self.minute = minute
+            self.dirty.update(self.active)
+
+        dirty, self.dirty = self.dirty, set()
+        handled, self.unacked = self.unacked, []
+        frames = 0
+        for tenant_id, campaign_id in sorted(dirty):
+            totals = await database_sync_to_async(live_campaign_metrics)(campaign_id, tenant_id)
+            if totals['impressions_last_hour']:
+                self.active.add((tenant_id, campaign_id))
+            else:
+                self.active.discard((tenant_id, campaign_id))
+            frames += await self.broadcast_to_websockets(tenant_id, campaign_id, totals)
+        if handled:
+            await self.streamer.ack(PROCESSOR_GROUP, handled)
+        return frames
+
+    async def broadcast_to_websockets(self, tenant_id, campaign_id, metrics) -> int:
+        """Send the fields that changed since the last frame to the campaign's sockets"""
+        group = campaign_group(campaign_id, tenant_id)
+        previous = self.metrics_cache.get(group, {})
+        changed = {field: value for field, value in metrics.items() if previous.get(field) != value}
+        if not changed:
+            return 0
+        self.metrics_cache[group] = metrics
+        await cache.aset(f'{SNAPSHOT_PREFIX}:{group}', metrics, (WINDOW_MINUTES + 1) * 60)
+        await self.layer.group_send(group, {
+            'type': 'metrics_delta',
+            'campaign_id': str(campaign_id),
+            'data': changed,
+            'timestamp': time.time()
+        })
+        return 1
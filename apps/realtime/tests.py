@@ -1,3 +1,291 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import uuid
+from decimal import Decimal
+from unittest import mock, skipUnless
+import redis
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from apps.analytics.tests.utils import create_campaign_with_ads
+from apps.events.ingest import ingest_batch
+from apps.realtime.producer import LEASE_PREFIX, GroupProducers
+from apps.analytics.repository import AnalyticsRepository
+from apps.analytics.views import calculate_bid_price
+from apps.realtime.consumer import campaign_metrics
+from apps.realtime.pubsub import (
+    SNAPSHOT_PREFIX, WINDOW_MINUTES, EventStreamer, RealTimeProcessor, _publish, campaign_group, current_minute,
+    delta, publish_deltas, redis_client, redis_url
+)
+from apps.realtime.windows import since_key, window_totals
 
-# Create your tests here.
+GROUP = 'campaign_1_tenant_1'
+
+
+class GroupProducerTest(SimpleTestCase):
+    databases = {'default'}  # Producers run compute() through database_sync_to_async
+
+    def setUp(self):
+        cache.clear()
+        self.layer = InMemoryChannelLayer()
+        self.queries = 0
+
+    def compute(self):
+        self.queries += 1
+        return {'impressions_last_hour': self.queries}
+
+    async def join(self, producers, sockets):
+        channels = []
+        for _ in range(sockets):
+            channel = await self.layer.new_channel()
+            await self.layer.group_add(GROUP, channel)
+            await producers.subscribe(GROUP, self.compute, 'metrics_update', 0.05, {'campaign_id': '1'})
+            channels.append(channel)
+        return channels
+
+    async def test_one_query_per_tick_for_the_whole_group(self):
+        producers = GroupProducers(self.layer)
+        channels = await self.join(producers, 300)
+        for channel in channels:
+            for _ in range(2):
+                message = await asyncio.wait_for(self.layer.receive(channel), 5)
+                self.assertEqual((message['type'], message['campaign_id']), ('metrics_update', '1'))
+        # One tick may still be between its query and its send
+        self.assertLessEqual(self.queries - producers.ticks[GROUP], 1)
+        self.assertLess(self.queries, len(channels))
+
+        for _ in channels:
+            await producers.unsubscribe(GROUP)
+        self.assertEqual(producers.tasks, {})
+        self.assertIsNone(await cache.aget(f'{LEASE_PREFIX}:{GROUP}'))
+
+    async def test_late_subscribers_get_the_latest_update(self):
+        producers = GroupProducers(self.layer)
+        await self.join(producers, 1)
+        await asyncio.sleep(0.1)
+        latest = await producers.subscribe(GROUP, self.compute, 'metrics_update', 0.05)
+        self.assertEqual(latest['type'], 'metrics_update')
+        await producers.unsubscribe(GROUP)
+        await producers.unsubscribe(GROUP)
+
+    @override_settings(REALTIME_LEASE_SECONDS=1)
+    async def test_one_process_holds_the_lease(self):
+        first, second = GroupProducers(self.layer), GroupProducers(self.layer)
+        await self.join(first, 1)
+        await asyncio.sleep(0.05)
+        await self.join(second, 1)
+        await asyncio.sleep(0.2)
+        self.assertNotIn(GROUP, second.ticks)
+
+        # The standby takes over once the holder leaves
+        await first.unsubscribe(GROUP)
+        await asyncio.sleep(0.2)
+        self.assertGreater(second.ticks.get(GROUP, 0), 0)
+        await second.unsubscribe(GROUP)
+
+
+class RealTimeProcessorTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.campaign, self.ads = create_campaign_with_ads()
+        self.layer = InMemoryChannelLayer()
+        self.group = campaign_group(self.campaign.id, 1)
+
+    async def record(self, kind):
+        await database_sync_to_async(ingest_batch)(1, [{
+            'type': kind, 'campaign_id': self.campaign.id, 'ad_id': self.ads[0].id, 'user_id': 7, 'cost': '0.5'
+        }])
+
+    async def test_only_changed_fields_are_pushed_once_per_frame(self):
+        processor = RealTimeProcessor(self.layer)
+        channel = await self.layer.new_channel()
+        await self.layer.group_add(self.group, channel)
+
+        await self.record('impression')
+        await processor.handle_event({'t': 1, 'd': [delta(self.campaign.id, impressions=1, users=[7])]})
+        self.assertEqual(await processor.flush(), 1)
+        message = await asyncio.wait_for(self.layer.receive(channel), 1)
+        self.assertEqual(message['type'], 'metrics_delta')
+        self.assertEqual(message['data']['impressions_last_hour'], 1)
+
+        # Two clicks in one frame
+        for _ in range(2):
+            await self.record('click')
+            await processor.handle_event({'t': 1, 'd': [delta(self.campaign.id, clicks=1)]})
+        self.assertEqual(await processor.flush(), 1)
+        message = await asyncio.wait_for(self.layer.receive(channel), 1)
+        self.assertEqual(message['data'], {'clicks_last_hour': 2})
+        self.assertEqual(await processor.flush(), 0)
+
+        snapshot = await cache.aget(f'{SNAPSHOT_PREFIX}:{self.group}')
+        self.assertEqual((snapshot['impressions_last_hour'], snapshot['clicks_last_hour']), (1, 2))
+
+    async def test_redelivered_deltas_change_nothing(self):
+        processor = RealTimeProcessor(self.layer)
+        await self.record('impression')
+        change = {'t': 1, 'd': [delta(self.campaign.id, impressions=1, users=[7])]}
+        await processor.handle_event(change)
+        self.assertEqual(await processor.flush(), 1)
+        await processor.handle_event(change)
+        self.assertEqual(await processor.flush(), 0)
+        self.assertEqual(processor.active, {(1, self.campaign.id)})
+
+    async def test_minute_change_refreshes_active_campaigns(self):
+        processor = RealTimeProcessor(self.layer)
+        processor.active.add((1, self.campaign.id))
+        processor.metrics_cache[self.group] = {'impressions_last_hour': 5}
+        processor.minute -= 1
+        self.assertEqual(await processor.flush(), 1)
+        self.assertEqual(processor.active, set())
+
+
+@override_settings(REALTIME_PUSH_METRICS=True)
+class PublishDeltasTest(TransactionTestCase):
+    def setUp(self):
+        self.campaign, self.ads = create_campaign_with_ads()
+
+    def test_ingest_adds_one_delta_per_campaign_after_commit(self):
+        client = mock.Mock()
+        with mock.patch('apps.realtime.pubsub.redis_client', return_value=client):
+            ingest_batch(1, [
+                {'type': 'impression', 'campaign_id': self.campaign.id, 'ad_id': self.ads[0].id,
+                 'user_id': 1, 'cost': '0.25'},
+                {'type': 'impression', 'campaign_id': self.campaign.id, 'ad_id': self.ads[1].id,
+                 'user_id': 2, 'cost': '0.25'},
+                {'type': 'click', 'campaign_id': self.campaign.id, 'ad_id': self.ads[0].id, 'user_id': 1},
+            ])
+        pipe = client.pipeline.return_value
+        stream, fields = pipe.xadd.call_args.args
+        self.assertEqual(stream, 'metrics.tenant.1')
+        [change] = json.loads(fields['e'])['d']
+        self.assertEqual((change['c'], change['i'], change['k'], change['u']), (self.campaign.id, 2, 1, [1, 2]))
+        self.assertEqual(Decimal(change['s']), Decimal('0.5'))
+        pipe.execute.assert_called_once()
+
+    def test_redis_outage_does_not_fail_writes(self):
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = redis.ConnectionError('down')
+        with mock.patch('apps.realtime.pubsub.redis_client', return_value=client):
+            publish_deltas(1, [delta(self.campaign.id, clicks=1)])
+        client.pipeline.return_value.execute.assert_called_once()
+
+    @override_settings(REALTIME_PUSH_METRICS=False)
+    def test_push_off_still_counts(self):
+        client = mock.Mock()
+        with mock.patch('apps.realtime.pubsub.redis_client', return_value=client):
+            publish_deltas(1, [delta(self.campaign.id, clicks=1)])
+            with override_settings(REALTIME_LIVE_WINDOWS=False):
+                publish_deltas(1, [delta(self.campaign.id, clicks=1)])
+        pipe = client.pipeline.return_value
+        pipe.xadd.assert_not_called()
+        self.assertEqual(pipe.execute.call_count, 1)
+        self.assertEqual(pipe.hincrby.call_args_list[0].args[1:], ('k', 1))
+
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(redis_url(), socket_connect_timeout=0.2).ping()
+    except redis.RedisError:
+        return False
+
+
+@skipUnless(redis_available(), 'needs the Redis at REALTIME_REDIS_URL')
+class EventStreamTest(SimpleTestCase):
+    def setUp(self):
+        self.stream = f'test.{uuid.uuid4().hex[:8]}'
+        self.handled = []
+
+    def tearDown(self):
+        redis.Redis.from_url(redis_url()).delete(self.stream)
+
+    async def handler(self, event):
+        self.handled.append(event['n'])
+
+    async def test_consumers_of_a_group_share_the_stream(self):
+        first, second = EventStreamer(), EventStreamer()
+        for n in range(10):
+            await first.publish(self.stream, {'n': n})
+        await first.ensure_group(self.stream, 'g')
+        await first.ensure_group(self.stream, 'g')
+
+        a = await first.process([self.stream], 'g', 'a', self.handler, count=4, block_ms=10)
+        b = await second.process([self.stream], 'g', 'b', self.handler, block_ms=10)
+        self.assertEqual((len(a), len(b)), (4, 6))
+        self.assertEqual(sorted(self.handled), list(range(10)))
+        self.assertEqual((await first.redis_client.xpending(self.stream, 'g'))['pending'], 0)
+        await first.redis_client.connection_pool.disconnect()
+
+    @override_settings(REALTIME_STREAM_CLAIM_IDLE_MS=20)
+    async def test_unacknowledged_entries_are_reclaimed(self):
+        streamer = EventStreamer()
+        for n in range(3):
+            await streamer.publish(self.stream, {'n': n})
+        await streamer.ensure_group(self.stream, 'g')
+        await streamer.process([self.stream], 'g', 'dead', self.handler, block_ms=10, ack=False)
+
+        await asyncio.sleep(0.05)
+        self.handled.clear()
+        streamer.next_claim = 0
+        await streamer.process([self.stream], 'g', 'alive', self.handler, block_ms=10)
+        self.assertEqual(sorted(self.handled), [0, 1, 2])
+        self.assertEqual((await streamer.redis_client.xpending(self.stream, 'g'))['pending'], 0)
+        await streamer.redis_client.connection_pool.disconnect()
+
+
+@skipUnless(redis_available(), 'needs the Redis at REALTIME_REDIS_URL')
+@override_settings(REALTIME_PUSH_METRICS=False)
+class LiveWindowTest(TestCase):
+    def setUp(self):
+        self.tenant_id = random.randrange(10 ** 6, 10 ** 7)
+        self.campaign, self.ads = create_campaign_with_ads(tenant_id=self.tenant_id)
+        self.other, _ = create_campaign_with_ads(tenant_id=self.tenant_id, name='Other')
+
+    def tearDown(self):
+        client = redis_client()
+        client.delete(*client.keys(f'live:{self.tenant_id}:*'))
+
+    def warm(self):
+        redis_client().set(since_key(self.tenant_id), current_minute() - WINDOW_MINUTES)
+
+    def test_cold_until_counting_covers_the_window(self):
+        _publish(self.tenant_id, [delta(self.campaign.id, impressions=2, spend='0.5', users=[1, 2])])
+        self.assertIsNone(window_totals(self.tenant_id, self.campaign.id))
+        self.warm()
+        self.assertEqual(window_totals(self.tenant_id, self.campaign.id), {
+            'impressions': 2, 'clicks': 0, 'spend': 0.5, 'unique_users': 2, 'minutes': WINDOW_MINUTES
+        })
+
+    def test_buckets_sum_per_campaign_and_tenant(self):
+        self.warm()
+        old = delta(self.campaign.id, impressions=4, spend='0.000001', users=[1])
+        old['m'] -= 20
+        _publish(self.tenant_id, [
+            old,
+            delta(self.campaign.id, impressions=1, clicks=1, spend='0.25', users=[1]),
+            delta(self.other.id, impressions=1, spend='0.25', users=[2]),
+        ])
+        campaign = window_totals(self.tenant_id, self.campaign.id)
+        self.assertEqual((campaign['impressions'], campaign['clicks'], campaign['unique_users']), (5, 1, 1))
+        self.assertAlmostEqual(campaign['spend'], 0.250001)
+        tenant = window_totals(self.tenant_id, minutes=15)
+        self.assertEqual((tenant['impressions'], tenant['unique_users'], tenant['spend']), (2, 2, 0.5))
+
+    def test_failed_publish_restarts_counting(self):
+        self.warm()
+        with mock.patch('redis.client.Pipeline.execute', side_effect=redis.ConnectionError('down')):
+            _publish(self.tenant_id, [delta(self.campaign.id, impressions=1)])
+        _publish(self.tenant_id, [delta(self.campaign.id, impressions=1)])
+        self.assertIsNone(window_totals(self.tenant_id, self.campaign.id))
+
+    def test_readers_skip_sql_once_warm(self):
+        self.warm()
+        _publish(self.tenant_id, [delta(self.campaign.id, impressions=4, spend='2', users=[1, 2])])
+        with self.assertNumQueries(0):
+            metrics = AnalyticsRepository.get_real_time_metrics(self.tenant_id, self.campaign.id)
+            bid = calculate_bid_price(self.tenant_id, 0)
+            live = campaign_metrics(self.campaign.id, self.tenant_id)
+        self.assertEqual((metrics['impressions_last_hour'], metrics['avg_cpm'], metrics['frequency']), (4, 0.5, 2.0))
+        self.assertEqual(bid['bid_price'], 0.45)
+        self.assertEqual((live['total_spend'], live['status']), (2.0, 'active'))
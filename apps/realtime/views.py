@@ -2,7 +2,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from asgiref.sync import sync_to_async
-from .pubsub import EventStreamer, RealTimeProcessor
+from .pubsub import EventStreamer, stream_status as tenant_stream_status
 
 @api_view(['POST'])
 def publish_test_events(request):  # ← Quitar async
@@ -25,6 +25,8 @@ def publish_test_events(request):  # ← Quitar async
                 'placement': 'homepage_banner'
             }
         )
+        # The pool belongs to this request's short-lived event loop
+        await streamer.redis_client.connection_pool.disconnect()
         
         return {
             'impression_published': impression_event,
@@ -37,15 +39,8 @@ def publish_test_events(request):  # ← Quitar async
 
 @api_view(['GET'])
 def stream_status(request):  # ← Quitar async
-    """Check streaming status and metrics"""
-    processor = RealTimeProcessor()
-    
-    return Response({
-        'active_streams': len(processor.metrics_cache),
-        'cached_metrics': processor.metrics_cache,
-        'redis_connected': processor.streamer.redis_client.ping(),
-        'pubsub_simulation': 'active'
-    })
+    """Check the tenant's streams: length, consumer groups, pending entries"""
+    return Response(tenant_stream_status(request.user.tenant_id))
 
 
 @api_view(['GET'])
@@ -0,0 +1,96 @@
+# apps/realtime/windows.py
+"""Sliding-window delivery counters in Redis.
+
+Each committed metric delta (see pubsub.delta) is added to per-minute
+buckets, one set per campaign and one for the whole tenant:
+
+    live:<tenant>:<campaign|all>:<minute>      hash of i (impressions),
+                                               k (clicks), s (spend in micros)
+    live:<tenant>:<campaign|all>:<minute>:u    HyperLogLog of user ids
+
+The commands ride in the publisher's pipeline, so a write costs one round
+trip for the stream and the counters together. Buckets expire shortly
+after they leave the longest window. window_totals() sums the last N
+buckets and merges their HyperLogLogs (unique users are approximate,
+within about 1%).
+
+live:<tenant>:since holds the minute counting started. A window is warm
+once that minute is before its first bucket; until then, and whenever
+Redis cannot be reached, window_totals() returns None and callers query
+SQL instead. A failed publish restarts the tenant's counting, since its
+writes are missing from the buckets.
+"""
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+import redis
+from django.conf import settings
+from .pubsub import WINDOW_MINUTES, current_minute, redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'live'
+TENANT_SCOPE = 'all'
+MICROS = 1000000
+
+
+def windows_enabled() -> bool:
+    return getattr(settings, 'REALTIME_LIVE_WINDOWS', True)
+
+
+def bucket_key(tenant_id, scope, minute: int) -> str:
+    return f'{KEY_PREFIX}:{tenant_id}:{scope}:{minute}'
+
+
+def since_key(tenant_id) -> str:
+    return f'{KEY_PREFIX}:{tenant_id}:since'
+
+
+def add_counts(pipe, tenant_id: int, deltas: Iterable[Dict[str, Any]], restart: bool = False):
+    """Queue the bucket updates for `deltas` on a pipeline"""
+    ttl = (WINDOW_MINUTES + 2) * 60
+    pipe.set(since_key(tenant_id), current_minute(), nx=not restart)
+    for change in deltas:
+        spend = int(Decimal(change['s']) * MICROS)
+        for scope in (change['c'], TENANT_SCOPE):
+            key = bucket_key(tenant_id, scope, change['m'])
+            for field, amount in (('i', change['i']), ('k', change['k']), ('s', spend)):
+                if amount:
+                    pipe.hincrby(key, field, amount)
+            pipe.expire(key, ttl)
+            if change['u']:
+                pipe.pfadd(f'{key}:u', *change['u'])
+                pipe.expire(f'{key}:u', ttl)
+
+
+def window_totals(tenant_id: int, campaign_id=None, minutes: int = WINDOW_MINUTES) -> Optional[Dict[str, Any]]:
+    """Impressions, clicks, spend and unique users of the last `minutes` minutes, this one included.
+
+    Covers the tenant, or one campaign. None while the window is not warm.
+    """
+    if not windows_enabled() or minutes > WINDOW_MINUTES:
+        return None
+    minute = current_minute()
+    first = minute - minutes + 1
+    keys = [bucket_key(tenant_id, campaign_id or TENANT_SCOPE, bucket) for bucket in range(first, minute + 1)]
+    try:
+        pipe = redis_client().pipeline(transaction=False)
+        pipe.get(since_key(tenant_id))
+        for key in keys:
+            pipe.hmget(key, 'i', 'k', 's')
+        pipe.pfcount(*[f'{key}:u' for key in keys])
+        since, *buckets, users = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Live windows unavailable for tenant {tenant_id}: {str(e)}")
+        return None
+    if since is None or int(since) >= first:
+        return None
+
+    impressions, clicks, micros = (sum(int(bucket[field] or 0) for bucket in buckets) for field in range(3))
+    return {
+        'impressions': impressions,
+        'clicks': clicks,
+        'spend': micros / MICROS,
+        'unique_users': users,
+        'minutes': minutes,
+    }
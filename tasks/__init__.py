@@ -3,7 +3,7 @@ from core.celery import app as celery_app
 __all__ = ('celery_app',)
 
 # Register tasks explicitly
-from .analytics import calculate_daily_metrics, process_events_batch, cleanup_old_events, generate_campaign_report
+from .analytics import calculate_daily_metrics, process_events_batch, cleanup_old_events, maintain_table_partitions, generate_campaign_report, refresh_impression_rollups, refresh_cohort_matrix, refresh_user_sketches, refresh_attribution_table, snapshot_campaign_aggregates, rebuild_metrics_batch, run_projections, dispatch_projections, flush_event_buffer, compact_event_counters, reconcile_event_counters
 
 # Register periodic tasks
 from celery.schedules import crontab
@@ -16,6 +16,51 @@ if hasattr(settings, 'CELERY_BEAT_SCHEDULE'):
             'schedule': crontab(hour=1, minute=0),  # Daily at 1 AM
             'args': (1,)  # Default tenant_id
         },
+        'refresh-impression-rollups': {
+            'task': 'tasks.analytics.refresh_impression_rollups',
+            'schedule': crontab(minute='*/10'),
+            'args': (1,)  # Default tenant_id
+        },
+        'refresh-cohort-matrix': {
+            'task': 'tasks.analytics.refresh_cohort_matrix',
+            'schedule': crontab(minute='5-59/10'),
+            'args': (1,)  # Default tenant_id
+        },
+        'refresh-user-sketches': {
+            'task': 'tasks.analytics.refresh_user_sketches',
+            'schedule': crontab(minute='2-59/10'),
+            'args': (1,)  # Default tenant_id
+        },
+        'refresh-attribution-table': {
+            'task': 'tasks.analytics.refresh_attribution_table',
+            'schedule': crontab(minute='7-59/10'),
+            'args': (1,)  # Default tenant_id
+        },
+        'snapshot-campaign-aggregates': {
+            'task': 'tasks.analytics.snapshot_campaign_aggregates',
+            'schedule': crontab(minute=15),  # Hourly
+            'args': (1,)  # Default tenant_id
+        },
+        'dispatch-projections': {
+            'task': 'tasks.analytics.dispatch_projections',
+            'schedule': crontab(minute='*'),
+        },
+        'flush-event-buffer': {
+            'task': 'tasks.analytics.flush_event_buffer',
+            'schedule': 5.0,  # Seconds; a no-op unless ANALYTICS_WRITE_BEHIND is set
+        },
+        'compact-event-counters': {
+            'task': 'tasks.analytics.compact_event_counters',
+            'schedule': crontab(minute='*/5'),
+        },
+        'reconcile-event-counters': {
+            'task': 'tasks.analytics.reconcile_event_counters',
+            'schedule': crontab(hour=1, minute=15),  # Daily, every tenant
+        },
+        'maintain-table-partitions': {
+            'task': 'tasks.analytics.maintain_table_partitions',
+            'schedule': crontab(hour=0, minute=30),  # Daily, ahead of the weekly cleanup
+        },
         'cleanup-old-events': {
             'task': 'tasks.analytics.cleanup_old_events',
             'schedule': crontab(hour=2, minute=0, day_of_week=0),  # Weekly
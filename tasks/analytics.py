@@ -9,29 +9,35 @@ logger = logging.getLogger(__name__)
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def calculate_daily_metrics(tenant_id):
     """Heavy aggregation job"""
-    sql = """
-    INSERT INTO analytics_campaignmetrics (tenant_id, campaign_id, date, impressions, clicks, conversions, spend)
+    from apps.analytics.repositories.query_builder import TimeWindow
+
+    window = TimeWindow.today()
+    today, today_params = window.predicate('ci.timestamp')
+    sql = f"""
+    INSERT INTO analytics_campaignmetrics (tenant_id, campaign_id, date, impressions, clicks, conversions, spend, unique_users)
     SELECT 
         %s as tenant_id,
         ca.id as campaign_id,
-        CURDATE() as date,
+        %s as date,
         COALESCE(COUNT(ci.id), 0) as impressions,
         0 as clicks,  -- Will be updated when click events exist
         0 as conversions,
-        COALESCE(SUM(ci.cost), 0) as spend
+        COALESCE(SUM(ci.cost), 0) as spend,
+        COUNT(DISTINCT ci.user_id) as unique_users
     FROM campaigns_campaign ca
     LEFT JOIN campaigns_ad ad ON ad.campaign_id = ca.id AND ad.tenant_id = %s
     LEFT JOIN campaigns_impression ci ON ci.ad_id = ad.id AND ci.tenant_id = %s 
-        AND DATE(ci.timestamp) = CURDATE()
+        AND {today}
     WHERE ca.tenant_id = %s
     GROUP BY ca.id
     ON DUPLICATE KEY UPDATE
         impressions = VALUES(impressions),
-        spend = VALUES(spend)
+        spend = VALUES(spend),
+        unique_users = VALUES(unique_users)
     """
     
     with connection.cursor() as cursor:
-        cursor.execute(sql, [tenant_id, tenant_id, tenant_id, tenant_id])
+        cursor.execute(sql, [tenant_id, window.first_date, tenant_id, tenant_id, *today_params, tenant_id])
         affected_rows = cursor.rowcount
     
     logger.info(f"Daily metrics calculated for tenant {tenant_id}: {affected_rows} campaigns")
@@ -68,17 +74,158 @@ def process_events_batch(tenant_id, event_ids):
     }
 
 @shared_task
-def cleanup_old_events(days=30):
-    """Cleanup task for old events"""
+def refresh_impression_rollups(tenant_id):
+    """Fold newly closed hours into the impression rollup tables"""
+    from apps.analytics.rollups import refresh_rollups
+
+    result = refresh_rollups(tenant_id)
+    logger.info(f"Rollups refreshed for tenant {tenant_id}: {result['windows']} windows")
+    return {
+        'tenant_id': tenant_id,
+        'windows': result['windows'],
+        'position': result['position'].isoformat() if result['position'] else None
+    }
+
+@shared_task
+def refresh_cohort_matrix(tenant_id):
+    """Fold newly closed hours into the cohort retention matrix"""
+    from apps.analytics.cohorts import refresh_cohorts
+
+    result = refresh_cohorts(tenant_id)
+    logger.info(f"Cohort matrix refreshed for tenant {tenant_id}: {result['windows']} windows")
+    return {
+        'tenant_id': tenant_id,
+        'windows': result['windows'],
+        'position': result['position'].isoformat() if result['position'] else None
+    }
+
+@shared_task
+def refresh_user_sketches(tenant_id):
+    """Sketch the unique users of newly closed hours"""
+    from apps.analytics.sketches import refresh_sketches
+
+    result = refresh_sketches(tenant_id)
+    logger.info(f"User sketches refreshed for tenant {tenant_id}: {result['windows']} windows")
+    return {
+        'tenant_id': tenant_id,
+        'windows': result['windows'],
+        'position': result['position'].isoformat() if result['position'] else None
+    }
+
+@shared_task
+def refresh_attribution_table(tenant_id):
+    """Attribute conversions of newly closed hours to their touches"""
+    from apps.analytics.attribution import refresh_attribution
+
+    result = refresh_attribution(tenant_id)
+    logger.info(f"Attribution refreshed for tenant {tenant_id}: {result['windows']} windows")
+    return {
+        'tenant_id': tenant_id,
+        'windows': result['windows'],
+        'position': result['position'].isoformat() if result['position'] else None
+    }
+
+@shared_task
+def snapshot_campaign_aggregates(tenant_id):
+    """Fold new events of every campaign aggregate, snapshotting every N events"""
+    from apps.analytics.aggregates import fold_events
+    from apps.analytics.models import AdEvent
+
+    aggregate_ids = list(
+        AdEvent.objects.filter(tenant_id=tenant_id).values_list('aggregate_id', flat=True).distinct()
+    )
+    folded = 0
+    for aggregate_id in aggregate_ids:
+        aggregate, _ = fold_events(tenant_id, aggregate_id)
+        folded += aggregate.events
+    logger.info(f"Aggregate snapshots refreshed for tenant {tenant_id}: {len(aggregate_ids)} aggregates")
+    return {'tenant_id': tenant_id, 'aggregates': len(aggregate_ids), 'events': folded}
+
+@shared_task
+def run_projections(shard=0, shards=1):
+    """Apply new events to every projection for the tenants of one shard"""
+    from apps.analytics.projections import run_projections as run
+
+    report = run(shard, shards)
+    if report['events']:
+        logger.info(f"Projections advanced on shard {shard}/{shards}: {report['events']} events")
+    return report
+
+@shared_task
+def dispatch_projections():
+    """Fan projections out over ANALYTICS_PROJECTION_SHARDS workers"""
+    from celery import group
+    from django.conf import settings
+
+    shards = getattr(settings, 'ANALYTICS_PROJECTION_SHARDS', 1)
+    group(run_projections.s(shard, shards) for shard in range(shards)).apply_async()
+    return {'shards': shards}
+
+@shared_task
+def rebuild_metrics_batch(tenant_id, campaign_ids, run_id=None, use_snapshot=True):
+    """Rebuild CampaignMetrics of a chunk of campaigns; one member of a rebuild group"""
+    from apps.analytics.rebuild import rebuild_campaigns
+
+    result = rebuild_campaigns(tenant_id, campaign_ids, run_id, use_snapshot)
+    logger.info(f"Metrics rebuilt for tenant {tenant_id}: {result['rebuilt']} campaigns, {result['events']} events")
+    return result
+
+@shared_task
+def flush_event_buffer():
+    """Drain the write-behind ingest buffer and replay spilled batches"""
+    from apps.events.buffer import flush, write_behind_enabled
+
+    if not write_behind_enabled():
+        return {'enabled': False}
+    report = flush()
+    if report['events'] or report['spilled']:
+        logger.info(f"Ingest buffer flushed: {report}")
+    return report
+
+@shared_task
+def compact_event_counters():
+    """Fold minute event counters of closed hours into hourly buckets"""
+    from apps.analytics.counters import compact_counters
+
+    return {'compacted': compact_counters()}
+
+@shared_task
+def reconcile_event_counters(tenant_id=None, hours=48):
+    """Recount the last `hours` closed hours of event counters from AdEvent, for one tenant or all"""
     from django.utils import timezone
+    from apps.analytics.counters import reconcile_counters
     from apps.analytics.models import AdEvent
     from datetime import timedelta
-    
+
+    start = timezone.now() - timedelta(hours=hours)
+    if tenant_id is not None:
+        return reconcile_counters(tenant_id, start)
+    tenants = sorted(set(AdEvent.objects.values_list('tenant_id', flat=True).distinct()))
+    return [reconcile_counters(tenant, start) for tenant in tenants]
+
+@shared_task
+def cleanup_old_events(days=30, tenant_id=None):
+    """Archive events older than `days` to segment files (unless ANALYTICS_EVENT_ARCHIVE is off), then remove them"""
+    from django.utils import timezone
+    from apps.analytics.archive import archive_enabled, archive_expired_events
+    from datetime import timedelta
+
     cutoff_date = timezone.now() - timedelta(days=days)
-    deleted_count = AdEvent.objects.filter(timestamp__lt=cutoff_date).delete()[0]
-    
-    logger.info(f"Cleaned up {deleted_count} old events older than {days} days")
-    return {'deleted_events': deleted_count}
+    result = archive_expired_events(cutoff_date, tenant_id, export=archive_enabled())
+    logger.info(
+        f"Archived {result['archived_events']} events in {result['segments']} segments "
+        f"and cleaned up {result['deleted_events']} events older than {days} days"
+    )
+    return result
+
+@shared_task
+def maintain_table_partitions(archive=False):
+    """Pre-create upcoming partitions and retire expired ones"""
+    from apps.analytics.partitions import maintain_partitions
+
+    report = maintain_partitions(archive=archive)
+    logger.info(f"Partition maintenance: {report}")
+    return report
 
 @shared_task
 @retry(stop=stop_after_attempt(2))